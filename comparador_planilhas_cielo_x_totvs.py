@@ -1,17 +1,52 @@
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
-import pandas as pd
+import multiprocessing
 import os
-from datetime import datetime
-from openpyxl.styles import PatternFill
+import queue
+import threading
 import warnings
 
+from conciliacao import dinheiro, leitura, normalizacao, pipeline
+from conciliacao.execucao import Cancelado
+
 warnings.filterwarnings("ignore")
 
 # Configurações de aparência
 ctk.set_appearance_mode("dark")  # Modes: "System", "Dark", "Light"
 ctk.set_default_color_theme("blue")  # Themes: "blue", "green", "dark-blue"
 
+# Texto do log para cada etapa avisada pelo pipeline
+MENSAGENS_ETAPAS = {
+    'cache_encontrado': "♻️  Resultado encontrado no cache (mesmos arquivos e parâmetros)",
+    'cache_ausente': "🆕 Resultado não encontrado no cache, processando...",
+    'lendo': "📂 Processando arquivo da operadora...\n📂 Processando arquivo do TOTVS...",
+    'operadora_lida': "✅ Operadora processada: {registros} registros{origem}",
+    'operadora_erro': "❌ Erro ao processar operadora: {erro}",
+    'totvs_lida': "✅ TOTVS processado: {registros} registros{origem}",
+    'totvs_erro': "❌ Erro ao processar TOTVS: {erro}",
+    'falha_leitura': "\n❌ Erro: Não foi possível processar os arquivos.",
+    'detalhada_inicio': "🔍 Gerando comparação detalhada...",
+    'detalhada': "✅ Comparação concluída: {diferencas} diferenças",
+    'resumida_inicio': "📑 Gerando comparação resumida por grupo...",
+    'resumida': "✅ Comparação resumida: {combinacoes} combinações",
+    'resumo_inicio': "📊 Gerando resumo...",
+    'resumo': "✅ Resumo gerado: {combinacoes} combinações",
+    'organizado_inicio': "📋 Criando resumo organizado...",
+    'organizado': "✅ Resumo organizado: {diferencas} diferenças listadas",
+    'aba_dividida': "✂️  Aba '{aba}' com {linhas} linhas dividida em {partes} partes (limite do Excel)",
+    'somas': "➕ Pareamento por soma: {somas} lançamentos somados, {pulados} grupos pulados, {diferencas} diferenças restantes",
+    'incremental': "🗂️  Base incremental: {recomparados} grupos recomparados, {reaproveitados} reaproveitados",
+    'aproximados': "🤝 Pareamento aproximado: {pares} pares, {diferencas} diferenças restantes",
+}
+
+# Onde gravar as abas que repetem as entradas (Operadora/TOTVS Processado)
+OPCOES_ENTRADAS = {
+    "Na planilha": 'planilha',
+    "Não gravar": 'omitir',
+    "Parquet à parte (mais rápido)": 'parquet',
+    "CSV à parte": 'csv',
+}
+
 class PlanilhaComparatorApp:
     def __init__(self, root):
         self.root = root
@@ -25,26 +60,14 @@ class PlanilhaComparatorApp:
         self.nome_arquivo = ctk.StringVar(value="resultado_final")
         
         # Dicionário de códigos
-        self.codigo_bandeira_map = {
-            '481': {'bandeira': 'PAGSEGURO VISA', 'tipo': 'debito'},
-            '482': {'bandeira': 'PAGSEGURO VISA', 'tipo': 'credito'},
-            '483': {'bandeira': 'PAGSEGURO MASTERCARD', 'tipo': 'debito'},
-            '484': {'bandeira': 'PAGSEGURO MASTERCARD', 'tipo': 'credito'},
-            '485': {'bandeira': 'PAGSEGURO ELO', 'tipo': 'debito'},
-            '486': {'bandeira': 'PAGSEGURO ELO', 'tipo': 'credito'},
-            '487': {'bandeira': 'PAGSEGURO HIPERCARD', 'tipo': 'credito'},
-            '488': {'bandeira': 'PAGSEGURO AMEX', 'tipo': 'credito'},
-            '489': {'bandeira': 'PAGSEGURO PIX', 'tipo': 'pix'},
-            '389': {'bandeira': 'ELO', 'tipo': 'debito'},
-            '388': {'bandeira': 'ELO', 'tipo': 'credito'},
-            '397': {'bandeira': 'VISA', 'tipo': 'debito'},
-            '396': {'bandeira': 'VISA', 'tipo': 'credito'},
-            '393': {'bandeira': 'MASTERCARD', 'tipo': 'debito'},
-            '394': {'bandeira': 'MASTERCARD', 'tipo': 'credito'},
-            '461': {'bandeira': 'PIX', 'tipo': 'pix'}
-        }
+        self.codigo_bandeira_map = dict(normalizacao.MAPA_CODIGOS_CIELO)
+        
+        # O processamento roda numa thread separada e fala com a interface por esta fila
+        self.fila_interface = queue.Queue()
+        self.cancelar = threading.Event()
         
         self.create_widgets()
+        self.root.after(100, self.atualizar_interface)
         
     def create_widgets(self):
         # Container principal com padding
@@ -173,6 +196,93 @@ class PlanilhaComparatorApp:
             font=ctk.CTkFont(size=12)
         ).pack(side="left")
         
+        ctk.CTkLabel(
+            config_frame,
+            text="Leitura dos Arquivos:",
+            font=ctk.CTkFont(size=13)
+        ).grid(row=2, column=0, sticky="w", padx=20, pady=(0, 10))
+        
+        self.leitura_em_blocos = ctk.BooleanVar(value=False)
+        
+        ctk.CTkCheckBox(
+            config_frame,
+            text="📦 Em blocos (arquivos muito grandes, menos memória)",
+            variable=self.leitura_em_blocos,
+            font=ctk.CTkFont(size=12)
+        ).grid(row=2, column=1, sticky="w", padx=10, pady=(0, 10))
+        
+        self.usar_cache = ctk.BooleanVar(value=True)
+        
+        ctk.CTkCheckBox(
+            config_frame,
+            text="♻️ Reaproveitar arquivos já lidos (cache)",
+            variable=self.usar_cache,
+            font=ctk.CTkFont(size=12)
+        ).grid(row=3, column=1, sticky="w", padx=10, pady=(0, 10))
+        
+        ctk.CTkLabel(
+            config_frame,
+            text="Abas das Entradas:",
+            font=ctk.CTkFont(size=13)
+        ).grid(row=4, column=0, sticky="w", padx=20, pady=(0, 10))
+        
+        self.entradas = ctk.StringVar(value="Na planilha")
+        
+        ctk.CTkOptionMenu(
+            config_frame,
+            values=list(OPCOES_ENTRADAS),
+            variable=self.entradas,
+            font=ctk.CTkFont(size=12)
+        ).grid(row=4, column=1, sticky="w", padx=10, pady=(0, 10))
+        
+        ctk.CTkLabel(
+            config_frame,
+            text="Pareamento Aproximado:",
+            font=ctk.CTkFont(size=13)
+        ).grid(row=5, column=0, sticky="w", padx=20, pady=(0, 10))
+        
+        # Só na detalhada: sobras que diferem em até N centavos e até N dias viram par
+        self.tolerancia_centavos = ctk.StringVar(value="0")
+        self.janela_dias = ctk.StringVar(value="0")
+        
+        aproximado_frame = ctk.CTkFrame(config_frame, fg_color="transparent")
+        aproximado_frame.grid(row=5, column=1, sticky="w", padx=10, pady=(0, 10))
+        
+        ctk.CTkEntry(aproximado_frame, textvariable=self.tolerancia_centavos, width=50).pack(side="left")
+        ctk.CTkLabel(aproximado_frame, text="centavos", font=ctk.CTkFont(size=12)).pack(side="left", padx=(5, 15))
+        ctk.CTkEntry(aproximado_frame, textvariable=self.janela_dias, width=50).pack(side="left")
+        ctk.CTkLabel(aproximado_frame, text="dias (0 desliga)", font=ctk.CTkFont(size=12)).pack(side="left", padx=(5, 0))
+        
+        # Só na detalhada: um lançamento do TOTVS que soma várias vendas da operadora
+        self.parear_somas = ctk.BooleanVar(value=False)
+        
+        ctk.CTkCheckBox(
+            config_frame,
+            text="➕ Lançamentos somados no TOTVS (soma de várias vendas)",
+            variable=self.parear_somas,
+            font=ctk.CTkFont(size=12)
+        ).grid(row=6, column=1, sticky="w", padx=10, pady=(0, 10))
+        
+        # Extratos acumulados do mês: só os dias que mudaram são comparados de novo
+        self.incremental = ctk.BooleanVar(value=False)
+        
+        ctk.CTkCheckBox(
+            config_frame,
+            text="🗂️ Incremental (só recompara os dias que mudaram)",
+            variable=self.incremental,
+            font=ctk.CTkFont(size=12)
+        ).grid(row=7, column=1, sticky="w", padx=10, pady=(0, 10))
+        
+        # Entradas maiores que a memória: a comparação roda num banco DuckDB em disco
+        self.motor_duckdb = ctk.BooleanVar(value=False)
+        
+        ctk.CTkCheckBox(
+            config_frame,
+            text="💽 Arquivos maiores que a memória (banco em disco)",
+            variable=self.motor_duckdb,
+            font=ctk.CTkFont(size=12)
+        ).grid(row=8, column=1, sticky="w", padx=10, pady=(0, 10))
+        
         # Botão de processar
         self.process_button = ctk.CTkButton(
             main_container,
@@ -184,6 +294,20 @@ class PlanilhaComparatorApp:
         )
         self.process_button.pack(fill="x", pady=(0, 8))
         
+        # Botão de cancelar
+        self.cancel_button = ctk.CTkButton(
+            main_container,
+            text="⛔ Cancelar",
+            command=self.cancelar_processamento,
+            height=32,
+            font=ctk.CTkFont(size=12),
+            corner_radius=8,
+            fg_color="#B22222",
+            hover_color="#8B1A1A",
+            state="disabled"
+        )
+        self.cancel_button.pack(fill="x", pady=(0, 8))
+        
         # Progress bar
         self.progress_bar = ctk.CTkProgressBar(main_container)
         self.progress_bar.pack(fill="x", pady=(0, 8))
@@ -254,7 +378,7 @@ class PlanilhaComparatorApp:
     def select_operadora_file(self):
         file_path = filedialog.askopenfilename(
             title="Selecione a planilha da Operadora",
-            filetypes=[("Arquivos Excel", "*.xlsx *.xls"), ("Todos os arquivos", "*.*")]
+            filetypes=leitura.TIPOS_ARQUIVO
         )
         if file_path:
             self.arquivo_operadora.set(file_path)
@@ -265,7 +389,7 @@ class PlanilhaComparatorApp:
     def select_totvs_file(self):
         file_path = filedialog.askopenfilename(
             title="Selecione a planilha do Sistema (TOTVS)",
-            filetypes=[("Arquivos Excel", "*.xlsx *.xls"), ("Todos os arquivos", "*.*")]
+            filetypes=leitura.TIPOS_ARQUIVO
         )
         if file_path:
             self.arquivo_totvs.set(file_path)
@@ -280,9 +404,38 @@ class PlanilhaComparatorApp:
             self.log_message(f"✅ Pasta de saída definida")
     
     def log_message(self, message):
-        self.log_text.insert("end", message + "\n")
-        self.log_text.see("end")
-        self.root.update_idletasks()
+        # Pode ser chamado pela thread de processamento: quem escreve no log é atualizar_interface
+        self.fila_interface.put(('log', message))
+    
+    def definir_progresso(self, valor):
+        self.fila_interface.put(('progresso', valor))
+    
+    def atualizar_interface(self):
+        while True:
+            try:
+                evento, valor = self.fila_interface.get_nowait()
+            except queue.Empty:
+                break
+            
+            if evento == 'log':
+                self.log_text.insert("end", valor + "\n")
+                self.log_text.see("end")
+            elif evento == 'progresso':
+                self.progress_bar.set(valor)
+            elif evento == 'sucesso':
+                messagebox.showinfo("✅ Sucesso", f"Processamento concluído com sucesso!\n\nArquivo salvo como:\n{valor}.xlsx")
+            elif evento == 'erro':
+                messagebox.showerror("Erro", f"Ocorreu um erro durante o processamento:\n{valor}")
+            elif evento == 'fim':
+                self.process_button.configure(state="normal", text="🚀 Processar Planilhas")
+                self.cancel_button.configure(state="disabled")
+        
+        self.root.after(100, self.atualizar_interface)
+    
+    def cancelar_processamento(self):
+        self.cancelar.set()
+        self.cancel_button.configure(state="disabled")
+        self.log_message("⛔ Cancelando... o processamento para na próxima etapa")
     
     def validar_nome_arquivo(self, nome):
         caracteres_invalidos = ['<', '>', ':', '"', '/', '\\', '|', '?', '*']
@@ -308,360 +461,109 @@ class PlanilhaComparatorApp:
         nome_arquivo = self.validar_nome_arquivo(nome_arquivo)
         
         try:
-            self.process_button.configure(state="disabled", text="⏳ Processando...")
-            self.progress_bar.set(0.1)
+            tolerancia_centavos = int(self.tolerancia_centavos.get() or 0)
+            janela_dias = int(self.janela_dias.get() or 0)
+        except ValueError:
+            tolerancia_centavos = janela_dias = -1
+        if tolerancia_centavos < 0 or janela_dias < 0:
+            messagebox.showerror("Erro", "A tolerância e a janela de dias devem ser números inteiros (0 desliga).")
+            return
+        if self.incremental.get() and self.motor_duckdb.get():
+            messagebox.showerror("Erro", "O modo incremental não funciona com arquivos maiores que a memória.")
+            return
+        
+        # As variáveis do Tk só são lidas aqui, na thread da interface
+        opcoes = {
+            'arquivo_operadora': self.arquivo_operadora.get(),
+            'arquivo_totvs': self.arquivo_totvs.get(),
+            'nome_arquivo': nome_arquivo,
+            'resultado_path': os.path.join(self.pasta_saida.get(), f'{nome_arquivo}.xlsx'),
+            'modo': self.comparison_type.get(),
+            'em_blocos': self.leitura_em_blocos.get(),
+            'usar_cache': self.usar_cache.get(),
+            'entradas': OPCOES_ENTRADAS[self.entradas.get()],
+            'tolerancia_centavos': tolerancia_centavos,
+            'janela_dias': janela_dias,
+            'somas': self.parear_somas.get(),
+            'incremental': self.incremental.get(),
+            'motor': 'duckdb' if self.motor_duckdb.get() else 'pandas',
+        }
+        
+        self.cancelar.clear()
+        self.process_button.configure(state="disabled", text="⏳ Processando...")
+        self.cancel_button.configure(state="normal")
+        self.progress_bar.set(0.1)
+        threading.Thread(target=self.executar, args=(opcoes,), daemon=True).start()
+    
+    def executar(self, opcoes):
+        try:
             self.log_message("\n" + "="*60)
             self.log_message("🚀 Iniciando processamento...")
             self.log_message("="*60)
             
-            # Processa os arquivos
-            df_operadora = self.processar_operadora(self.arquivo_operadora.get())
-            self.progress_bar.set(0.3)
-            
-            df_totvs = self.processar_totvs(self.arquivo_totvs.get())
-            self.progress_bar.set(0.5)
-            
-            if df_operadora is None or df_totvs is None:
-                self.log_message("\n❌ Erro: Não foi possível processar os arquivos.")
+            estatisticas = pipeline.executar(
+                opcoes,
+                'cielo',
+                mapa=self.codigo_bandeira_map,
+                avisar=self.avisar,
+                cancelar=self.cancelar
+            )
+            if estatisticas is None:
                 return
             
-            # Gera relatório detalhado
-            resultado_detalhado = self.gerar_comparacao_detalhada(df_totvs, df_operadora)
-            self.progress_bar.set(0.7)
-            
-            resultado_detalhado['Data'] = pd.to_datetime(resultado_detalhado['Data']).dt.strftime('%d/%m/%Y')
-            
-            # Gera o resumo
-            df_resumo = self.gerar_resumo(df_totvs, df_operadora, resultado_detalhado)
-            df_resumo_organizado = self.criar_resumo_organizado(df_resumo, resultado_detalhado)
-            self.progress_bar.set(0.85)
-            
-            # Salva os resultados
-            resultado_path = os.path.join(self.pasta_saida.get(), f'{nome_arquivo}.xlsx')
-            
-            with pd.ExcelWriter(resultado_path, engine='openpyxl') as writer:
-                df_operadora.to_excel(writer, sheet_name='Operadora Processada', index=False)
-                df_totvs.to_excel(writer, sheet_name='TOTVS Processado', index=False)
-                resultado_detalhado.to_excel(writer, sheet_name='Comparação Detalhada', index=False)
-                df_resumo.to_excel(writer, sheet_name='Resumo', index=False)
-                
-                if not df_resumo_organizado.empty:
-                    df_resumo_organizado.to_excel(writer, sheet_name='Resumo Filtrável', index=False)
-                
-                # Formatação condicional
-                workbook = writer.book
-                worksheet_resumo = writer.sheets['Resumo']
-                status_col = len(df_resumo.columns)
-                
-                verde = PatternFill(start_color="92D050", end_color="92D050", fill_type="solid")
-                vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-                
-                for i, row in enumerate(df_resumo.itertuples(), 2):
-                    cell = worksheet_resumo.cell(row=i, column=status_col)
-                    if row.Status == "OK":
-                        cell.fill = verde
-                    elif row.Status == "COM DIFERENÇA":
-                        cell.fill = vermelho
-            
-            self.progress_bar.set(1.0)
-            
-            # Estatísticas
-            diferenca_a_mais = len([row for _, row in resultado_detalhado.iterrows() if row['A_Mais_Sistema']])
-            diferenca_a_menos = len([row for _, row in resultado_detalhado.iterrows() if row['A_Menos_Sistema']])
-            sem_diferencas = len(df_resumo[df_resumo['Status'] == 'OK'])
-            com_diferencas = len(df_resumo[df_resumo['Status'] == 'COM DIFERENÇA'])
-            
-            self.log_message("\n" + "="*60)
-            self.log_message("📊 RESUMO ESTATÍSTICO")
-            self.log_message("="*60)
-            self.log_message(f"📄 Total de transações na Operadora: {len(df_operadora)}")
-            self.log_message(f"💼 Total de transações no Sistema: {len(df_totvs)}")
-            self.log_message("-"*60)
-            self.log_message(f"⬆️  Valores A MAIS no Sistema: {diferenca_a_mais}")
-            self.log_message(f"    (lançados no Sistema mas não encontrados na Operadora)")
-            self.log_message(f"⬇️  Valores A MENOS no Sistema: {diferenca_a_menos}")
-            self.log_message(f"    (existem na Operadora mas não foram lançados no Sistema)")
-            self.log_message("-"*60)
-            self.log_message(f"✅ Combinações sem diferenças: {sem_diferencas}")
-            self.log_message(f"⚠️  Combinações com diferenças: {com_diferencas}")
-            self.log_message("="*60)
-            self.log_message(f"\n💾 Arquivo salvo em:\n{resultado_path}\n")
-            
-            messagebox.showinfo("✅ Sucesso", f"Processamento concluído com sucesso!\n\nArquivo salvo como:\n{nome_arquivo}.xlsx")
+            self.mostrar_estatisticas(estatisticas, opcoes['resultado_path'])
+            self.fila_interface.put(('sucesso', opcoes['nome_arquivo']))
             
+        except Cancelado:
+            self.log_message("\n⛔ Processamento cancelado. Nenhum arquivo foi gerado.")
+            self.definir_progresso(0)
         except Exception as e:
             self.log_message(f"\n❌ Erro durante o processamento: {str(e)}")
-            messagebox.showerror("Erro", f"Ocorreu um erro durante o processamento:\n{str(e)}")
+            self.fila_interface.put(('erro', str(e)))
         finally:
-            self.process_button.configure(state="normal", text="🚀 Processar Planilhas")
+            self.fila_interface.put(('fim', None))
     
-    # Funções de processamento (mantidas do código original)
-    def formatar_valor(self, valor):
-        if pd.isna(valor):
-            return 0.0
-        if isinstance(valor, str):
-            if '.' in valor and ',' in valor:
-                valor = valor.replace('.', '').replace(',', '.')
-            elif ',' in valor:
-                valor = valor.replace(',', '.')
-        return float(valor)
-
-    def normalizar_bandeira(self, nome):
-        nome = str(nome).upper()
-        if 'MAESTRO' in nome or 'MASTER' in nome or 'MASTERCARD' in nome:
-            return 'MASTERCARD'
-        elif 'VISA' in nome:
-            return 'VISA'
-        elif 'ELO' in nome:
-            return 'ELO'
-        elif 'PIX' in nome:
-            return 'PIX'
-        return nome.strip()
-
-    def normalizar_tipo(self, tipo):
-        tipo = str(tipo).lower()
-        if 'débito' in tipo or 'debito' in tipo:
-            return 'debito'
-        elif 'crédito' in tipo or 'credito' in tipo:
-            return 'credito'
-        elif 'pix' in tipo:
-            return 'pix'
-        return tipo.strip()
-
-    def processar_operadora(self, arquivo):
-        try:
-            self.log_message(f"📂 Processando arquivo da operadora...")
-            cols = ['Data da venda', 'Bandeira', 'Forma de pagamento', 'Valor bruto']
-            df = pd.read_excel(arquivo, usecols=cols)
-            
-            df = df.rename(columns={
-                'Data da venda': 'Data',
-                'Forma de pagamento': 'Tipo',
-                'Valor bruto': 'Valor'
-            })
-            
-            df['Data'] = pd.to_datetime(df['Data'], dayfirst=True).dt.date
-            df['Bandeira'] = df['Bandeira'].fillna(df['Tipo'])
-            df['Bandeira'] = df['Bandeira'].apply(self.normalizar_bandeira)
-            df['Tipo'] = df['Tipo'].apply(self.normalizar_tipo)
-            df['Valor'] = df['Valor'].apply(self.formatar_valor)
-            
-            self.log_message(f"✅ Operadora processada: {len(df)} registros")
-            return df[['Data', 'Bandeira', 'Tipo', 'Valor']]
-        except Exception as e:
-            self.log_message(f"❌ Erro ao processar operadora: {e}")
-            return None
-
-    def processar_totvs(self, arquivo):
-        try:
-            self.log_message(f"📂 Processando arquivo do TOTVS...")
-            cols = ['DT. EMISSAO', 'CLIENTE', 'VALOR']
-            df = pd.read_excel(arquivo, usecols=cols, header=1)
-            
-            df['Bandeira'] = ''
-            df['Tipo'] = ''
-            
-            def extrair_bandeira_tipo_por_codigo(codigo):
-                codigo_str = str(codigo).strip()
-                if codigo_str in self.codigo_bandeira_map:
-                    return (
-                        self.codigo_bandeira_map[codigo_str]['bandeira'],
-                        self.codigo_bandeira_map[codigo_str]['tipo']
-                    )
-                else:
-                    return 'OUTROS', 'outros'
-            
-            for idx, row in df.iterrows():
-                bandeira, tipo = extrair_bandeira_tipo_por_codigo(row['CLIENTE'])
-                df.at[idx, 'Bandeira'] = bandeira
-                df.at[idx, 'Tipo'] = tipo
-            
-            df['Data'] = pd.to_datetime(df['DT. EMISSAO'], dayfirst=True).dt.date
-            df['Valor'] = df['VALOR'].apply(self.formatar_valor)
-            
-            self.log_message(f"✅ TOTVS processado: {len(df)} registros")
-            return df[['Data', 'Bandeira', 'Tipo', 'Valor']]
-        except Exception as e:
-            self.log_message(f"❌ Erro ao processar TOTVS: {e}")
-            return None
-
-    def gerar_comparacao_detalhada(self, df_totvs, df_operadora):
-        self.log_message("🔍 Gerando comparação detalhada...")
-        
-        totvs_grouped = df_totvs.groupby(['Data', 'Bandeira', 'Tipo'])['Valor'].apply(list).reset_index()
-        operadora_grouped = df_operadora.groupby(['Data', 'Bandeira', 'Tipo'])['Valor'].apply(list).reset_index()
-        
-        result = []
-        
-        totvs_keys = set(zip(totvs_grouped['Data'], totvs_grouped['Bandeira'], totvs_grouped['Tipo']))
-        operadora_keys = set(zip(operadora_grouped['Data'], operadora_grouped['Bandeira'], operadora_grouped['Tipo']))
-        all_keys = totvs_keys.union(operadora_keys)
-        
-        for data, bandeira, tipo in sorted(all_keys):
-            totvs_valores = []
-            operadora_valores = []
-            
-            totvs_row = totvs_grouped[(totvs_grouped['Data'] == data) & 
-                                     (totvs_grouped['Bandeira'] == bandeira) & 
-                                     (totvs_grouped['Tipo'] == tipo)]
-            
-            operadora_row = operadora_grouped[(operadora_grouped['Data'] == data) & 
-                                             (operadora_grouped['Bandeira'] == bandeira) & 
-                                             (operadora_grouped['Tipo'] == tipo)]
-            
-            if not totvs_row.empty:
-                totvs_valores = totvs_row['Valor'].iloc[0].copy()
-            
-            if not operadora_row.empty:
-                operadora_valores = operadora_row['Valor'].iloc[0].copy()
-            
-            valores_sistema_restantes = totvs_valores.copy()
-            valores_operadora_restantes = operadora_valores.copy()
-            
-            for valor_operadora in operadora_valores[:]:
-                for i, valor_sistema in enumerate(valores_sistema_restantes):
-                    if valor_sistema == valor_operadora:
-                        valores_sistema_restantes.pop(i)
-                        if valor_operadora in valores_operadora_restantes:
-                            valores_operadora_restantes.remove(valor_operadora)
-                        break
-            
-            for valor_sistema in valores_sistema_restantes:
-                result.append({
-                    'Data': data,
-                    'Bandeira': bandeira,
-                    'Tipo': tipo,
-                    'A_Mais_Sistema': f"{valor_sistema:.2f}".replace('.', ','),
-                    'A_Menos_Sistema': '',
-                    'Valor_Sistema': valor_sistema,
-                    'Valor_Operadora': 0,
-                    'Observação': 'Valor lançado no Sistema mas não encontrado na Operadora'
-                })
-            
-            for valor_operadora in valores_operadora_restantes:
-                result.append({
-                    'Data': data,
-                    'Bandeira': bandeira,
-                    'Tipo': tipo,
-                    'A_Mais_Sistema': '',
-                    'A_Menos_Sistema': f"{valor_operadora:.2f}".replace('.', ','),
-                    'Valor_Sistema': 0,
-                    'Valor_Operadora': valor_operadora,
-                    'Observação': 'Valor na Operadora mas não lançado no Sistema'
-                })
-        
-        df_result = pd.DataFrame(result)
-        if not df_result.empty:
-            df_result = df_result.sort_values(['Data', 'Bandeira', 'Tipo'])
-        
-        self.log_message(f"✅ Comparação concluída: {len(df_result)} diferenças")
-        return df_result
-
-    def gerar_resumo(self, df_totvs, df_operadora, resultado_detalhado):
-        self.log_message("📊 Gerando resumo...")
-        
-        resumo_relatorio = []
-        
-        def formatar_data(data):
-            if isinstance(data, datetime):
-                return data.strftime('%d/%m/%Y')
-            elif hasattr(data, 'strftime'):
-                return data.strftime('%d/%m/%Y')
-            else:
-                return str(data)
-        
-        totvs_combos = set(zip([formatar_data(d) for d in df_totvs['Data']], 
-                             df_totvs['Bandeira'], 
-                             df_totvs['Tipo']))
-        operadora_combos = set(zip([formatar_data(d) for d in df_operadora['Data']], 
-                                df_operadora['Bandeira'], 
-                                df_operadora['Tipo']))
-        todas_combos = totvs_combos.union(operadora_combos)
-        
-        for data, bandeira, tipo in sorted(todas_combos):
-            filtro = resultado_detalhado[(resultado_detalhado['Data'] == data) & 
-                                        (resultado_detalhado['Bandeira'] == bandeira) & 
-                                        (resultado_detalhado['Tipo'] == tipo)]
-            
-            valores_a_mais = [v for v in filtro['A_Mais_Sistema'] if v]
-            valores_a_menos = [v for v in filtro['A_Menos_Sistema'] if v]
-            
-            total_sistema = filtro['Valor_Sistema'].sum() if not filtro.empty else 0
-            total_operadora = filtro['Valor_Operadora'].sum() if not filtro.empty else 0
-            diferenca_total = total_sistema - total_operadora
-            
-            resumo_texto = f"dia {data} no {bandeira.lower()} {tipo}\n"
-            
-            if valores_a_mais:
-                resumo_texto += f" A MAIS no Sistema: {'/'.join(valores_a_mais)}\n"
-            
-            if valores_a_menos:
-                resumo_texto += f" A MENOS no Sistema (falta lançar): {'/'.join(valores_a_menos)}\n"
-            
-            tem_diferencas = diferenca_total != 0 or valores_a_mais or valores_a_menos
-            status = "COM DIFERENÇA" if tem_diferencas else "OK"
-            
-            resumo_relatorio.append({
-                'Data': data,
-                'Bandeira': bandeira,
-                'Tipo': tipo,
-                'Resumo': resumo_texto,
-                'Valores_A_Mais_Sistema': '/'.join(valores_a_mais) if valores_a_mais else '',
-                'Valores_A_Menos_Sistema': '/'.join(valores_a_menos) if valores_a_menos else '',
-                'Total_Sistema': total_sistema,
-                'Total_Operadora': total_operadora,
-                'Diferença_Total': diferenca_total,
-                'Status': status
-            })
-        
-        df_resumo = pd.DataFrame(resumo_relatorio)
-        self.log_message(f"✅ Resumo gerado: {len(df_resumo)} combinações")
-        return df_resumo
-
-    def criar_resumo_organizado(self, df_resumo, resultado_detalhado):
-        self.log_message("📋 Criando resumo organizado...")
-        
-        linhas = []
-        
-        for _, row in resultado_detalhado.iterrows():
-            data = row['Data']
-            bandeira = row['Bandeira']
-            tipo = row['Tipo']
-            
-            if row['A_Mais_Sistema']:
-                linhas.append({
-                    'Data': data,
-                    'Bandeira': bandeira,
-                    'Tipo': tipo,
-                    'Valor': row['A_Mais_Sistema'],
-                    'Tipo_Diferença': 'A_Mais',
-                    'Valor_Sistema': row['Valor_Sistema'],
-                    'Valor_Operadora': 0,
-                    'Descrição': 'Lançado no Sistema, não encontrado na Operadora'
-                })
-            
-            if row['A_Menos_Sistema']:
-                linhas.append({
-                    'Data': data,
-                    'Bandeira': bandeira,
-                    'Tipo': tipo,
-                    'Valor': row['A_Menos_Sistema'],
-                    'Tipo_Diferença': 'A_Menos',
-                    'Valor_Sistema': 0,
-                    'Valor_Operadora': row['Valor_Operadora'],
-                    'Descrição': 'Encontrado na Operadora, não lançado no Sistema'
-                })
-        
-        df_organizado = pd.DataFrame(linhas)
-        
-        if not df_organizado.empty:
-            df_organizado = df_organizado.sort_values(['Data', 'Bandeira', 'Tipo', 'Tipo_Diferença'])
-            df_organizado['Valor_Numérico'] = df_organizado['Valor'].str.replace(',', '.').astype(float)
-        
-        self.log_message(f"✅ Resumo organizado: {len(df_organizado)} diferenças listadas")
-        return df_organizado
+    def avisar(self, etapa, **dados):
+        if etapa == 'progresso':
+            self.definir_progresso(dados['valor'])
+            return
+        origem = " (cache)" if dados.get('cache') else ""
+        self.log_message(MENSAGENS_ETAPAS[etapa].format(origem=origem, **dados))
+    
+    def mostrar_estatisticas(self, estatisticas, resultado_path):
+        titulo = " (RESUMIDA)" if estatisticas['modo'] == 'resumida' else ""
+        self.log_message("\n" + "="*60)
+        self.log_message(f"📊 RESUMO ESTATÍSTICO{titulo}")
+        self.log_message("="*60)
+        self.log_message(f"📄 Total de transações na Operadora: {estatisticas['total_operadora']}")
+        self.log_message(f"💼 Total de transações no Sistema: {estatisticas['total_totvs']}")
+        self.log_message("-"*60)
+        if estatisticas['modo'] == 'resumida':
+            diferenca_total = dinheiro.formatar_centavos([estatisticas['diferenca_total']])[0]
+            self.log_message(f"💰 Diferença total (Sistema - Operadora): R$ {diferenca_total}")
+        else:
+            self.log_message(f"⬆️  Valores A MAIS no Sistema: {estatisticas['a_mais']}")
+            self.log_message(f"    (lançados no Sistema mas não encontrados na Operadora)")
+            self.log_message(f"⬇️  Valores A MENOS no Sistema: {estatisticas['a_menos']}")
+            self.log_message(f"    (existem na Operadora mas não foram lançados no Sistema)")
+            if 'somas' in estatisticas:
+                self.log_message(f"➕ Lançamentos do TOTVS pareados por soma: {estatisticas['somas']}")
+                if estatisticas['somas_pulados']:
+                    self.log_message(f"    ({estatisticas['somas_pulados']} grupos pulados por tamanho ou tempo)")
+            if 'aproximados' in estatisticas:
+                self.log_message(f"🤝 Pares aproximados (valor/data próximos): {estatisticas['aproximados']}")
+        self.log_message("-"*60)
+        self.log_message(f"✅ Combinações sem diferenças: {estatisticas['sem_diferencas']}")
+        self.log_message(f"⚠️  Combinações com diferenças: {estatisticas['com_diferencas']}")
+        self.log_message("="*60)
+        self.log_message(f"\n💾 Arquivo salvo em:\n{resultado_path}\n")
+        extras = estatisticas.get('arquivos', [resultado_path])[1:]
+        if extras:
+            self.log_message("📎 Arquivos adicionais:\n" + "\n".join(extras) + "\n")
 
 if __name__ == "__main__":
+    # Necessário para o pool de processos da leitura no executável do Windows
+    multiprocessing.freeze_support()
     root = ctk.CTk()
     app = PlanilhaComparatorApp(root)
     root.mainloop()
\ No newline at end of file
@@ -1,15 +1,50 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-import pandas as pd
+import multiprocessing
 import os
-from datetime import datetime
-from openpyxl.styles import PatternFill
+import queue
+import threading
 import warnings
 import sys
 
+from conciliacao import dinheiro, leitura, normalizacao, pipeline
+from conciliacao.execucao import Cancelado
+
 # Ignora avisos desnecessários
 warnings.filterwarnings("ignore")
 
+# Texto do log para cada etapa avisada pelo pipeline
+MENSAGENS_ETAPAS = {
+    'cache_encontrado': "Resultado reaproveitado do cache (mesmos arquivos e parâmetros)",
+    'cache_ausente': "Resultado não encontrado no cache, processando os arquivos",
+    'lendo': "Processando arquivo da operadora: {arquivo_operadora}\nProcessando arquivo do TOTVS: {arquivo_totvs}",
+    'operadora_lida': "Operadora processada com sucesso. Total de registros: {registros}{origem}",
+    'operadora_erro': "Erro ao processar operadora: {erro}",
+    'totvs_lida': "TOTVS processado com sucesso. Total de registros: {registros}{origem}",
+    'totvs_erro': "Erro ao processar TOTVS: {erro}",
+    'falha_leitura': "\nErro: Não foi possível processar os arquivos. Verifique os logs acima.",
+    'detalhada_inicio': "Gerando comparação detalhada...",
+    'detalhada': "Comparação detalhada gerada com {diferencas} diferenças encontradas.",
+    'resumida_inicio': "Gerando comparação resumida por grupo...",
+    'resumida': "Comparação resumida gerada com {combinacoes} combinações analisadas.",
+    'resumo_inicio': "Gerando resumo da comparação...",
+    'resumo': "Resumo gerado com {combinacoes} combinações analisadas.",
+    'organizado_inicio': "Criando resumo organizado para filtragem...",
+    'organizado': "Resumo organizado criado com {diferencas} diferenças listadas.",
+    'aba_dividida': "Aba '{aba}' com {linhas} linhas dividida em {partes} partes (limite de linhas do Excel).",
+    'somas': "Pareamento por soma: {somas} lançamentos somados, {pulados} grupos pulados, {diferencas} diferenças restantes.",
+    'incremental': "Base incremental: {recomparados} grupos recomparados, {reaproveitados} reaproveitados.",
+    'aproximados': "Pareamento aproximado: {pares} pares encontrados, {diferencas} diferenças restantes.",
+}
+
+# Onde gravar as abas que repetem as entradas (Operadora/TOTVS Processado)
+OPCOES_ENTRADAS = {
+    "Na planilha": 'planilha',
+    "Não gravar": 'omitir',
+    "Parquet à parte (mais rápido)": 'parquet',
+    "CSV à parte": 'csv',
+}
+
 class PlanilhaComparatorApp:
     def __init__(self, root):
         self.root = root
@@ -30,27 +65,15 @@ class PlanilhaComparatorApp:
         self.style.configure('Title.TLabel', font=('Arial', 16, 'bold'))
         
         # Dicionário para mapear códigos de cliente para bandeiras e tipos
-        self.codigo_bandeira_map = {
-            '481': {'bandeira': 'VISA', 'tipo': 'debito'},
-            '482': {'bandeira': 'VISA', 'tipo': 'credito'},
-            '483': {'bandeira': 'MASTERCARD', 'tipo': 'debito'},
-            '484': {'bandeira': 'MASTERCARD', 'tipo': 'credito'},
-            '485': {'bandeira': 'ELO', 'tipo': 'debito'},
-            '486': {'bandeira': 'ELO', 'tipo': 'credito'},
-            '487': {'bandeira': 'HIPERCARD', 'tipo': 'credito'},
-            '488': {'bandeira': 'AMEX', 'tipo': 'credito'},
-            '489': {'bandeira': 'PIX', 'tipo': 'pix'},
-            '389': {'bandeira': 'ELO', 'tipo': 'debito'},
-            '388': {'bandeira': 'ELO', 'tipo': 'credito'},
-            '397': {'bandeira': 'VISA', 'tipo': 'debito'},
-            '396': {'bandeira': 'VISA', 'tipo': 'credito'},
-            '393': {'bandeira': 'MASTERCARD', 'tipo': 'debito'},
-            '394': {'bandeira': 'MASTERCARD', 'tipo': 'credito'},
-            '461': {'bandeira': 'PIX', 'tipo': 'pix'}
-        }
+        self.codigo_bandeira_map = dict(normalizacao.MAPA_CODIGOS_PAGSEGURO)
+        
+        # O processamento roda numa thread separada e fala com a interface por esta fila
+        self.fila_interface = queue.Queue()
+        self.cancelar = threading.Event()
         
         # Cria a interface
         self.create_widgets()
+        self.root.after(100, self.atualizar_interface)
         
     def create_widgets(self):
         # Frame principal
@@ -99,9 +122,50 @@ class PlanilhaComparatorApp:
         ttk.Radiobutton(settings_frame, text="Detalhada (valor a valor)", variable=self.comparison_type, value="detalhada").grid(row=0, column=1, sticky="w")
         ttk.Radiobutton(settings_frame, text="Resumida (por grupo)", variable=self.comparison_type, value="resumida").grid(row=0, column=2, sticky="w")
         
-        # Botão de processamento
-        process_btn = ttk.Button(main_frame, text="Processar Planilhas", command=self.process_files)
-        process_btn.grid(row=3, column=0, columnspan=3, pady=(10, 0))
+        # Leitura em blocos para arquivos muito grandes
+        ttk.Label(settings_frame, text="Leitura dos Arquivos:").grid(row=1, column=0, sticky="w")
+        self.leitura_em_blocos = tk.BooleanVar(value=False)
+        ttk.Checkbutton(settings_frame, text="Em blocos (arquivos muito grandes, menos memória)", variable=self.leitura_em_blocos).grid(row=1, column=1, columnspan=2, sticky="w")
+        
+        # Cache das entradas já normalizadas
+        self.usar_cache = tk.BooleanVar(value=True)
+        ttk.Checkbutton(settings_frame, text="Reaproveitar arquivos já lidos (cache)", variable=self.usar_cache).grid(row=2, column=1, columnspan=2, sticky="w")
+        
+        # Abas que repetem as entradas: na planilha, omitidas ou em arquivo à parte
+        ttk.Label(settings_frame, text="Abas das Entradas:").grid(row=3, column=0, sticky="w")
+        self.entradas = tk.StringVar(value="Na planilha")
+        ttk.Combobox(settings_frame, textvariable=self.entradas, values=list(OPCOES_ENTRADAS), state="readonly", width=30).grid(row=3, column=1, columnspan=2, sticky="w")
+        
+        # Pareamento aproximado das sobras (só na detalhada): até N centavos e até N dias
+        ttk.Label(settings_frame, text="Pareamento Aproximado:").grid(row=4, column=0, sticky="w")
+        self.tolerancia_centavos = tk.StringVar(value="0")
+        self.janela_dias = tk.StringVar(value="0")
+        aproximado_frame = ttk.Frame(settings_frame)
+        aproximado_frame.grid(row=4, column=1, columnspan=2, sticky="w")
+        ttk.Entry(aproximado_frame, textvariable=self.tolerancia_centavos, width=5).pack(side=tk.LEFT)
+        ttk.Label(aproximado_frame, text="centavos").pack(side=tk.LEFT, padx=(5, 15))
+        ttk.Entry(aproximado_frame, textvariable=self.janela_dias, width=5).pack(side=tk.LEFT)
+        ttk.Label(aproximado_frame, text="dias (0 desliga)").pack(side=tk.LEFT, padx=(5, 0))
+        
+        # Lançamento do TOTVS que soma várias vendas da operadora (só na detalhada)
+        self.parear_somas = tk.BooleanVar(value=False)
+        ttk.Checkbutton(settings_frame, text="Lançamentos somados no TOTVS (soma de várias vendas)", variable=self.parear_somas).grid(row=5, column=1, columnspan=2, sticky="w")
+        
+        # Extratos acumulados do mês: só os dias que mudaram são comparados de novo
+        self.incremental = tk.BooleanVar(value=False)
+        ttk.Checkbutton(settings_frame, text="Incremental (só recompara os dias que mudaram)", variable=self.incremental).grid(row=6, column=1, columnspan=2, sticky="w")
+        
+        # Entradas maiores que a memória: a comparação roda num banco DuckDB em disco
+        self.motor_duckdb = tk.BooleanVar(value=False)
+        ttk.Checkbutton(settings_frame, text="Arquivos maiores que a memória (banco em disco)", variable=self.motor_duckdb).grid(row=7, column=1, columnspan=2, sticky="w")
+        
+        # Botões de processamento e cancelamento
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=3, column=0, columnspan=3, pady=(10, 0))
+        self.process_button = ttk.Button(button_frame, text="Processar Planilhas", command=self.process_files)
+        self.process_button.pack(side=tk.LEFT, padx=(0, 10))
+        self.cancel_button = ttk.Button(button_frame, text="Cancelar", command=self.cancelar_processamento, state=tk.DISABLED)
+        self.cancel_button.pack(side=tk.LEFT)
         
         # Área de logs
         log_frame = ttk.LabelFrame(main_frame, text="Log de Execução", padding="10")
@@ -123,7 +187,7 @@ class PlanilhaComparatorApp:
     def select_operadora_file(self):
         file_path = filedialog.askopenfilename(
             title="Selecione a planilha da Operadora",
-            filetypes=[("Arquivos Excel", "*.xlsx *.xls"), ("Todos os arquivos", "*.*")]
+            filetypes=leitura.TIPOS_ARQUIVO
         )
         if file_path:
             self.arquivo_operadora.set(file_path)
@@ -133,7 +197,7 @@ class PlanilhaComparatorApp:
     def select_totvs_file(self):
         file_path = filedialog.askopenfilename(
             title="Selecione a planilha do Sistema (TOTVS)",
-            filetypes=[("Arquivos Excel", "*.xlsx *.xls"), ("Todos os arquivos", "*.*")]
+            filetypes=leitura.TIPOS_ARQUIVO
         )
         if file_path:
             self.arquivo_totvs.set(file_path)
@@ -146,9 +210,35 @@ class PlanilhaComparatorApp:
             self.pasta_saida.set(folder_path)
     
     def log_message(self, message):
-        self.log_text.insert(tk.END, message + "\n")
-        self.log_text.see(tk.END)
-        self.root.update_idletasks()
+        """Enfileira a mensagem; pode ser chamado da thread de processamento"""
+        self.fila_interface.put(('log', message))
+    
+    def atualizar_interface(self):
+        """Aplica na interface o que a thread de processamento enfileirou (roda a cada 100 ms)"""
+        while True:
+            try:
+                evento, valor = self.fila_interface.get_nowait()
+            except queue.Empty:
+                break
+            
+            if evento == 'log':
+                self.log_text.insert(tk.END, valor + "\n")
+                self.log_text.see(tk.END)
+            elif evento == 'sucesso':
+                messagebox.showinfo("Sucesso", f"Processamento concluído com sucesso!\nArquivo salvo como: {valor}.xlsx")
+            elif evento == 'erro':
+                messagebox.showerror("Erro", f"Ocorreu um erro durante o processamento:\n{valor}")
+            elif evento == 'fim':
+                self.process_button.config(state=tk.NORMAL)
+                self.cancel_button.config(state=tk.DISABLED)
+        
+        self.root.after(100, self.atualizar_interface)
+    
+    def cancelar_processamento(self):
+        """Pede para o processamento parar na próxima etapa"""
+        self.cancelar.set()
+        self.cancel_button.config(state=tk.DISABLED)
+        self.log_message("Cancelando... o processamento vai parar na próxima etapa")
     
     def validar_nome_arquivo(self, nome):
         """Remove caracteres inválidos do nome do arquivo"""
@@ -177,353 +267,100 @@ class PlanilhaComparatorApp:
         # Limpa o nome do arquivo de caracteres inválidos
         nome_arquivo = self.validar_nome_arquivo(nome_arquivo)
         
+        try:
+            tolerancia_centavos = int(self.tolerancia_centavos.get() or 0)
+            janela_dias = int(self.janela_dias.get() or 0)
+        except ValueError:
+            tolerancia_centavos = janela_dias = -1
+        if tolerancia_centavos < 0 or janela_dias < 0:
+            messagebox.showerror("Erro", "A tolerância e a janela de dias devem ser números inteiros (0 desliga).")
+            return
+        if self.incremental.get() and self.motor_duckdb.get():
+            messagebox.showerror("Erro", "O modo incremental não funciona com arquivos maiores que a memória.")
+            return
+        
+        # As variáveis do Tk só são lidas aqui, na thread da interface
+        opcoes = {
+            'arquivo_operadora': self.arquivo_operadora.get(),
+            'arquivo_totvs': self.arquivo_totvs.get(),
+            'nome_arquivo': nome_arquivo,
+            'resultado_path': os.path.join(self.pasta_saida.get(), f'{nome_arquivo}.xlsx'),
+            'modo': self.comparison_type.get(),
+            'em_blocos': self.leitura_em_blocos.get(),
+            'usar_cache': self.usar_cache.get(),
+            'entradas': OPCOES_ENTRADAS[self.entradas.get()],
+            'tolerancia_centavos': tolerancia_centavos,
+            'janela_dias': janela_dias,
+            'somas': self.parear_somas.get(),
+            'incremental': self.incremental.get(),
+            'motor': 'duckdb' if self.motor_duckdb.get() else 'pandas',
+        }
+        
+        self.cancelar.clear()
+        self.process_button.config(state=tk.DISABLED)
+        self.cancel_button.config(state=tk.NORMAL)
+        threading.Thread(target=self.executar, args=(opcoes,), daemon=True).start()
+    
+    def executar(self, opcoes):
+        """Roda o processamento completo fora da thread da interface"""
         try:
             self.log_message("Iniciando processamento...")
             
-            # Processa os arquivos
-            df_operadora = self.processar_operadora(self.arquivo_operadora.get())
-            df_totvs = self.processar_totvs(self.arquivo_totvs.get())
-            
-            if df_operadora is None or df_totvs is None:
-                self.log_message("\nErro: Não foi possível processar os arquivos. Verifique os logs acima.")
+            estatisticas = pipeline.executar(
+                opcoes,
+                'pagseguro',
+                mapa=self.codigo_bandeira_map,
+                avisar=self.avisar,
+                cancelar=self.cancelar
+            )
+            if estatisticas is None:
                 return
             
-            # Gera relatório detalhado
-            resultado_detalhado = self.gerar_comparacao_detalhada(df_totvs, df_operadora)
-            
-            # Formata as datas para o relatório
-            resultado_detalhado['Data'] = pd.to_datetime(resultado_detalhado['Data']).dt.strftime('%d/%m/%Y')
-            
-            # Gera o resumo
-            df_resumo = self.gerar_resumo(df_totvs, df_operadora, resultado_detalhado)
-            
-            # Cria resumo organizado
-            df_resumo_organizado = self.criar_resumo_organizado(df_resumo, resultado_detalhado)
-            
-            # Salva os resultados com o nome personalizado
-            resultado_path = os.path.join(self.pasta_saida.get(), f'{nome_arquivo}.xlsx')
-            
-            with pd.ExcelWriter(resultado_path, engine='openpyxl') as writer:
-                df_operadora.to_excel(writer, sheet_name='Operadora Processada', index=False)
-                df_totvs.to_excel(writer, sheet_name='TOTVS Processado', index=False)
-                resultado_detalhado.to_excel(writer, sheet_name='Comparação Detalhada', index=False)
-                df_resumo.to_excel(writer, sheet_name='Resumo', index=False)
-                
-                if not df_resumo_organizado.empty:
-                    df_resumo_organizado.to_excel(writer, sheet_name='Resumo Filtrável', index=False)
-                
-                # Aplica formatação condicional
-                workbook = writer.book
-                worksheet_resumo = writer.sheets['Resumo']
-                
-                # Determina a coluna do Status (última coluna)
-                status_col = len(df_resumo.columns)
-                
-                # Define os preenchimentos de cor
-                verde = PatternFill(start_color="92D050", end_color="92D050", fill_type="solid")
-                vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-                
-                # Aplica formatação condicional
-                for i, row in enumerate(df_resumo.itertuples(), 2):
-                    cell = worksheet_resumo.cell(row=i, column=status_col)
-                    if row.Status == "OK":
-                        cell.fill = verde
-                    elif row.Status == "COM DIFERENÇA":
-                        cell.fill = vermelho
-            
-            self.log_message(f"\nProcessamento concluído com sucesso! Resultados salvos em:\n{resultado_path}")
-            
-            # Mostra resumo estatístico
-            diferenca_a_mais = len([row for _, row in resultado_detalhado.iterrows() if row['A_Mais']])
-            diferenca_a_menos = len([row for _, row in resultado_detalhado.iterrows() if row['A_Menos']])
-            sem_diferencas = len(df_resumo[df_resumo['Status'] == 'OK'])
-            com_diferencas = len(df_resumo[df_resumo['Status'] == 'COM DIFERENÇA'])
-            
-            self.log_message("\nResumo Estatístico:")
-            self.log_message(f"- Total operadora: {len(df_operadora)} transações")
-            self.log_message(f"- Total TOTVS: {len(df_totvs)} transações")
-            self.log_message(f"- Valores a mais no Sistema: {diferenca_a_mais}")
-            self.log_message(f"- Valores a menos no Sistema: {diferenca_a_menos}")
-            self.log_message(f"- Combinações sem diferenças: {sem_diferencas}")
-            self.log_message(f"- Combinações com diferenças: {com_diferencas}")
-            
-            messagebox.showinfo("Sucesso", f"Processamento concluído com sucesso!\nArquivo salvo como: {nome_arquivo}.xlsx")
+            self.mostrar_estatisticas(estatisticas, opcoes['resultado_path'])
+            self.fila_interface.put(('sucesso', opcoes['nome_arquivo']))
             
+        except Cancelado:
+            self.log_message("\nProcessamento cancelado. Nenhum arquivo foi gerado.")
         except Exception as e:
             self.log_message(f"\nErro durante o processamento: {str(e)}")
-            messagebox.showerror("Erro", f"Ocorreu um erro durante o processamento:\n{str(e)}")
+            self.fila_interface.put(('erro', str(e)))
+        finally:
+            self.fila_interface.put(('fim', None))
     
-    # Funções de processamento (copiadas do seu código original)
-    def formatar_valor(self, valor):
-        """Converte valores com vírgula decimal para float"""
-        if pd.isna(valor):
-            return 0.0
-        
-        if isinstance(valor, str):
-            if '.' in valor and ',' in valor:
-                valor = valor.replace('.', '').replace(',', '.')
-            elif ',' in valor:
-                valor = valor.replace(',', '.')
-        return float(valor)
-
-    def normalizar_bandeira(self, nome):
-        nome = str(nome).upper()
-        if 'MAESTRO' in nome or 'MASTER' in nome or 'MASTERCARD' in nome:
-            return 'MASTERCARD'
-        elif 'VISA' in nome:
-            return 'VISA'
-        elif 'ELO' in nome:
-            return 'ELO'
-        elif 'PIX' in nome:
-            return 'PIX'
-        return nome.strip()
-
-    def normalizar_tipo(self, tipo):
-        tipo = str(tipo).lower()
-        if 'débito' in tipo or 'debito' in tipo:
-            return 'debito'
-        elif 'crédito' in tipo or 'credito' in tipo:
-            return 'credito'
-        elif 'pix' in tipo:
-            return 'pix'
-        return tipo.strip()
-
-    def processar_operadora(self, arquivo):
-        try:
-            self.log_message(f"Processando arquivo da operadora: {arquivo}")
-            cols = ['Data da venda', 'Bandeira', 'Forma de pagamento', 'Valor bruto']
-            df = pd.read_excel(arquivo, usecols=cols)
-            
-            df = df.rename(columns={
-                'Data da venda': 'Data',
-                'Forma de pagamento': 'Tipo',
-                'Valor bruto': 'Valor'
-            })
-            
-            df['Data'] = pd.to_datetime(df['Data']).dt.date
-            df['Bandeira'] = df['Bandeira'].fillna(df['Tipo'])
-            df['Bandeira'] = df['Bandeira'].apply(self.normalizar_bandeira)
-            df['Tipo'] = df['Tipo'].apply(self.normalizar_tipo)
-            df['Valor'] = df['Valor'].apply(self.formatar_valor)
-            
-            self.log_message(f"Operadora processada com sucesso. Total de registros: {len(df)}")
-            return df[['Data', 'Bandeira', 'Tipo', 'Valor']]
-        except Exception as e:
-            self.log_message(f"Erro ao processar operadora: {e}")
-            return None
-
-    def processar_totvs(self, arquivo):
-        try:
-            self.log_message(f"Processando arquivo do TOTVS: {arquivo}")
-            # Alteração aqui: incluímos a coluna CLIENTE para identificar pelo código
-            cols = ['DT. EMISSAO', 'CLIENTE', 'VALOR']
-            df = pd.read_excel(arquivo, usecols=cols, header=1)
-            
-            df['Bandeira'] = ''
-            df['Tipo'] = ''
-            
-            # Nova função que usa o código do cliente para determinar bandeira e tipo
-            def extrair_bandeira_tipo_por_codigo(codigo):
-                codigo_str = str(codigo).strip()
-                if codigo_str in self.codigo_bandeira_map:
-                    return (
-                        self.codigo_bandeira_map[codigo_str]['bandeira'],
-                        self.codigo_bandeira_map[codigo_str]['tipo']
-                    )
-                else:
-                    return 'OUTROS', 'outros'
-            
-            # Aplica a nova função para cada linha
-            for idx, row in df.iterrows():
-                bandeira, tipo = extrair_bandeira_tipo_por_codigo(row['CLIENTE'])
-                df.at[idx, 'Bandeira'] = bandeira
-                df.at[idx, 'Tipo'] = tipo
-            
-            df['Data'] = pd.to_datetime(df['DT. EMISSAO'], dayfirst=True).dt.date
-            df['Valor'] = df['VALOR'].apply(self.formatar_valor)
-            
-            self.log_message(f"TOTVS processado com sucesso. Total de registros: {len(df)}")
-            return df[['Data', 'Bandeira', 'Tipo', 'Valor']]
-        except Exception as e:
-            self.log_message(f"Erro ao processar TOTVS: {e}")
-            return None
-
-    def gerar_comparacao_detalhada(self, df_totvs, df_operadora):
-        self.log_message("Gerando comparação detalhada...")
-        
-        totvs_grouped = df_totvs.groupby(['Data', 'Bandeira', 'Tipo'])['Valor'].apply(list).reset_index()
-        operadora_grouped = df_operadora.groupby(['Data', 'Bandeira', 'Tipo'])['Valor'].apply(list).reset_index()
-        
-        result = []
-        
-        totvs_keys = set(zip(totvs_grouped['Data'], totvs_grouped['Bandeira'], totvs_grouped['Tipo']))
-        operadora_keys = set(zip(operadora_grouped['Data'], operadora_grouped['Bandeira'], operadora_grouped['Tipo']))
-        all_keys = totvs_keys.union(operadora_keys)
-        
-        for data, bandeira, tipo in sorted(all_keys):
-            totvs_valores = []
-            operadora_valores = []
-            
-            totvs_row = totvs_grouped[(totvs_grouped['Data'] == data) & 
-                                     (totvs_grouped['Bandeira'] == bandeira) & 
-                                     (totvs_grouped['Tipo'] == tipo)]
-            
-            operadora_row = operadora_grouped[(operadora_grouped['Data'] == data) & 
-                                             (operadora_grouped['Bandeira'] == bandeira) & 
-                                             (operadora_grouped['Tipo'] == tipo)]
-            
-            if not totvs_row.empty:
-                totvs_valores = totvs_row['Valor'].iloc[0]
-            
-            if not operadora_row.empty:
-                operadora_valores = operadora_row['Valor'].iloc[0]
-            
-            totvs_valores.sort()
-            operadora_valores.sort()
-            
-            valores_a_mais = []
-            valores_totvs_restantes = totvs_valores.copy()
-            
-            for valor_operadora in operadora_valores:
-                match_found = False
-                for i, valor_totvs in enumerate(valores_totvs_restantes):
-                    if valor_totvs == valor_operadora:
-                        match_found = True
-                        valores_totvs_restantes.pop(i)
-                        break
-                
-                if not match_found:
-                    result.append({
-                        'Data': data,
-                        'Bandeira': bandeira,
-                        'Tipo': tipo,
-                        'A_Mais': '',
-                        'A_Menos': f"{valor_operadora:.2f}".replace('.', ','),
-                        'Valor_Sistema': 0,
-                        'Valor_Operadora': valor_operadora
-                    })
-            
-            for valor_totvs in valores_totvs_restantes:
-                result.append({
-                    'Data': data,
-                    'Bandeira': bandeira,
-                    'Tipo': tipo,
-                    'A_Mais': f"{valor_totvs:.2f}".replace('.', ','),
-                    'A_Menos': '',
-                    'Valor_Sistema': valor_totvs,
-                    'Valor_Operadora': 0
-                })
-        
-        df_result = pd.DataFrame(result)
-        if not df_result.empty:
-            df_result = df_result.sort_values(['Data', 'Bandeira', 'Tipo'])
-        
-        self.log_message(f"Comparação detalhada gerada com {len(df_result)} diferenças encontradas.")
-        return df_result
-
-    def gerar_resumo(self, df_totvs, df_operadora, resultado_detalhado):
-        self.log_message("Gerando resumo da comparação...")
-        
-        resumo_relatorio = []
-        
-        def formatar_data(data):
-            if isinstance(data, datetime):
-                return data.strftime('%d/%m/%Y')
-            elif hasattr(data, 'strftime'):
-                return data.strftime('%d/%m/%Y')
-            else:
-                return str(data)
-        
-        totvs_combos = set(zip([formatar_data(d) for d in df_totvs['Data']], 
-                             df_totvs['Bandeira'], 
-                             df_totvs['Tipo']))
-        operadora_combos = set(zip([formatar_data(d) for d in df_operadora['Data']], 
-                                df_operadora['Bandeira'], 
-                                df_operadora['Tipo']))
-        todas_combos = totvs_combos.union(operadora_combos)
-        
-        for data, bandeira, tipo in sorted(todas_combos):
-            filtro = resultado_detalhado[(resultado_detalhado['Data'] == data) & 
-                                        (resultado_detalhado['Bandeira'] == bandeira) & 
-                                        (resultado_detalhado['Tipo'] == tipo)]
-            
-            valores_a_mais = [v for v in filtro['A_Mais'] if v]
-            valores_a_menos = [v for v in filtro['A_Menos'] if v]
-            
-            total_sistema = filtro['Valor_Sistema'].sum() if not filtro.empty else 0
-            total_operadora = filtro['Valor_Operadora'].sum() if not filtro.empty else 0
-            diferenca_total = total_sistema - total_operadora
-            
-            resumo_texto = f"dia {data} no {bandeira.lower()} {tipo}\n"
-            
-            if valores_a_mais:
-                resumo_texto += f" a mais : {'/'.join(valores_a_mais)}\n"
-            
-            if valores_a_menos:
-                resumo_texto += f" a menos : {'/'.join(valores_a_menos)}\n"
-            
-            tem_diferencas = diferenca_total != 0 or valores_a_mais or valores_a_menos
-            status = "COM DIFERENÇA" if tem_diferencas else "OK"
-            
-            resumo_relatorio.append({
-                'Data': data,
-                'Bandeira': bandeira,
-                'Tipo': tipo,
-                'Resumo': resumo_texto,
-                'Valores_A_Mais': '/'.join(valores_a_mais) if valores_a_mais else '',
-                'Valores_A_Menos': '/'.join(valores_a_menos) if valores_a_menos else '',
-                'Total_Sistema': total_sistema,
-                'Total_Operadora': total_operadora,
-                'Diferença_Total': diferenca_total,
-                'Status': status
-            })
-        
-        df_resumo = pd.DataFrame(resumo_relatorio)
-        self.log_message(f"Resumo gerado com {len(df_resumo)} combinações analisadas.")
-        return df_resumo
-
-    def criar_resumo_organizado(self, df_resumo, resultado_detalhado):
-        self.log_message("Criando resumo organizado para filtragem...")
-        
-        linhas = []
-        
-        for _, row in resultado_detalhado.iterrows():
-            data = row['Data']
-            bandeira = row['Bandeira']
-            tipo = row['Tipo']
-            
-            if row['A_Mais']:
-                linhas.append({
-                    'Data': data,
-                    'Bandeira': bandeira,
-                    'Tipo': tipo,
-                    'Valor': row['A_Mais'],
-                    'Tipo_Diferença': 'A_Mais',
-                    'Valor_Sistema': row['Valor_Sistema'],
-                    'Valor_Operadora': 0
-                })
-            
-            if row['A_Menos']:
-                linhas.append({
-                    'Data': data,
-                    'Bandeira': bandeira,
-                    'Tipo': tipo,
-                    'Valor': row['A_Menos'],
-                    'Tipo_Diferença': 'A_Menos',
-                    'Valor_Sistema': 0,
-                    'Valor_Operadora': row['Valor_Operadora']
-                })
-        
-        df_organizado = pd.DataFrame(linhas)
-        
-        if not df_organizado.empty:
-            df_organizado = df_organizado.sort_values(['Data', 'Bandeira', 'Tipo', 'Tipo_Diferença'])
-            df_organizado['Valor_Numérico'] = df_organizado['Valor'].str.replace(',', '.').astype(float)
-        
-        self.log_message(f"Resumo organizado criado com {len(df_organizado)} diferenças listadas.")
-        return df_organizado
+    def avisar(self, etapa, **dados):
+        """Escreve no log o andamento informado pelo pipeline (esta tela não tem barra de progresso)"""
+        if etapa == 'progresso':
+            return
+        origem = " (reaproveitado do cache)" if dados.get('cache') else ""
+        self.log_message(MENSAGENS_ETAPAS[etapa].format(origem=origem, **dados))
+    
+    def mostrar_estatisticas(self, estatisticas, resultado_path):
+        """Escreve no log o resumo estatístico de uma execução (nova ou vinda do cache)"""
+        self.log_message(f"\nProcessamento concluído com sucesso! Resultados salvos em:\n{resultado_path}")
+        for arquivo in estatisticas.get('arquivos', [resultado_path])[1:]:
+            self.log_message(arquivo)
+        
+        if estatisticas['modo'] == 'resumida':
+            self.log_message("\nResumo Estatístico (resumida):")
+        else:
+            self.log_message("\nResumo Estatístico:")
+        self.log_message(f"- Total operadora: {estatisticas['total_operadora']} transações")
+        self.log_message(f"- Total TOTVS: {estatisticas['total_totvs']} transações")
+        if estatisticas['modo'] == 'resumida':
+            self.log_message(f"- Diferença total (Sistema - Operadora): {dinheiro.formatar_centavos([estatisticas['diferenca_total']])[0]}")
+        else:
+            self.log_message(f"- Valores a mais no Sistema: {estatisticas['a_mais']}")
+            self.log_message(f"- Valores a menos no Sistema: {estatisticas['a_menos']}")
+            if 'somas' in estatisticas:
+                self.log_message(f"- Lançamentos do TOTVS pareados por soma: {estatisticas['somas']} ({estatisticas['somas_pulados']} grupos pulados)")
+            if 'aproximados' in estatisticas:
+                self.log_message(f"- Pares aproximados (valor/data próximos): {estatisticas['aproximados']}")
+        self.log_message(f"- Combinações sem diferenças: {estatisticas['sem_diferencas']}")
+        self.log_message(f"- Combinações com diferenças: {estatisticas['com_diferencas']}")
 
 if __name__ == "__main__":
+    # Necessário para o pool de processos da leitura no executável do Windows
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = PlanilhaComparatorApp(root)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1 @@
+"""Rotinas de conciliação compartilhadas pelos comparadores Cielo e PagSeguro x TOTVS."""
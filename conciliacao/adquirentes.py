@@ -0,0 +1,237 @@
+"""Conciliação de várias operadoras numa passada só, contra um único TOTVS.
+
+O TOTVS é lido e classificado uma vez, com o mapa unificado
+(normalizacao.MAPA_CODIGOS); cada linha fica com a operadora dona do código
+de cliente e é separada por ela. Cada operadora é então comparada com a sua
+parte do TOTVS, usando o layout e a leitura de datas do seu comparador
+(pipeline.COMPARADORES), e tudo vai para uma planilha só, com um conjunto de
+abas por operadora ("Cielo Resumo", "PagSeguro Resumo", ...).
+
+    python -m conciliacao.adquirentes --totvs totvs.xlsx --cielo cielo.xlsx --pagseguro pagseguro.csv --saida resultado.xlsx
+
+Linhas do TOTVS com código fora do mapa, ou de operadora cujo arquivo não
+foi informado, vão para a aba "TOTVS Não Conciliado".
+"""
+import argparse
+import os
+import sys
+
+from conciliacao import cache, leitura, motor, normalizacao, pipeline
+from conciliacao.execucao import verificar_cancelamento
+from conciliacao.planilha import DIVISOES, Planilha
+
+ABA_NAO_CONCILIADO = 'TOTVS Não Conciliado'
+
+
+def ler_arquivos(opcoes, mapa, avisar=pipeline.nao_avisar, cancelar=None, paralelo=True):
+    """Lê o TOTVS (com a coluna Adquirente) e o arquivo de cada operadora, um processo por arquivo
+
+    Retorna (df_totvs, {adquirente: df_operadora}), com None no que falhou.
+    """
+    em_blocos = opcoes.get('em_blocos', False)
+    usar_cache = opcoes.get('usar_cache', False)
+    leituras = {
+        'totvs': (leitura.ler_totvs, (opcoes['arquivo_totvs'], mapa),
+                  {'em_blocos': em_blocos, 'usar_cache': usar_cache, 'separar_adquirentes': True}),
+    }
+    for adquirente, arquivo in opcoes['arquivos_operadora'].items():
+        leituras[adquirente] = (
+            leitura.ler_operadora,
+            (arquivo, pipeline.COMPARADORES[adquirente]['dayfirst']),
+            {'em_blocos': em_blocos, 'usar_cache': usar_cache}
+        )
+
+    avisar('lendo', arquivo_totvs=opcoes['arquivo_totvs'], arquivos_operadora=opcoes['arquivos_operadora'])
+    resultados = leitura.ler_em_paralelo(leituras, cancelar, paralelo)
+
+    operadoras = {}
+    for nome, (df, erro) in resultados.items():
+        etapa = 'totvs' if nome == 'totvs' else 'operadora'
+        dados = {} if nome == 'totvs' else {'adquirente': nome}
+        if erro is None:
+            avisar(f'{etapa}_lida', registros=len(df), cache=bool(df.attrs.get('cache')), **dados)
+        else:
+            avisar(f'{etapa}_erro', erro=erro, **dados)
+        if nome != 'totvs':
+            operadoras[nome] = df
+    return resultados['totvs'][0], operadoras
+
+
+def separar_por_adquirente(df_totvs, adquirentes):
+    """Divide o TOTVS pela coluna Adquirente; devolve ({adquirente: df}, não conciliado)"""
+    partes = {}
+    for adquirente in adquirentes:
+        parte = df_totvs[df_totvs['Adquirente'] == adquirente].drop(columns='Adquirente')
+        partes[adquirente] = parte.reset_index(drop=True)
+
+    resto = df_totvs[~df_totvs['Adquirente'].isin(adquirentes)].copy()
+    resto['Adquirente'] = resto['Adquirente'].astype(object).replace(normalizacao.ADQUIRENTE_PADRAO, 'desconhecida')
+    return partes, resto.reset_index(drop=True)
+
+
+def executar(opcoes, mapa=None, avisar=pipeline.nao_avisar, cancelar=None, paralelo=True):
+    """Concilia todas as operadoras informadas e devolve as estatísticas
+
+    opcoes traz arquivo_totvs, arquivos_operadora ({'cielo': caminho, ...}),
+    resultado_path e modo, além de em_blocos, usar_cache, entradas, divisao,
+    processos, incremental e as opções de pareamento (opcionais, como em
+    pipeline.executar). Cada
+    adquirente precisa ser uma chave de pipeline.COMPARADORES. O retorno
+    traz 'operadoras' ({adquirente: estatísticas}) e 'arquivos' (tudo o que
+    foi gravado), ou None quando algum arquivo não pôde ser lido; o motivo
+    vai para avisar.
+    """
+    mapa = normalizacao.MAPA_CODIGOS if mapa is None else mapa
+    resultado_path = opcoes['resultado_path']
+
+    chave = hashes = None
+    if opcoes.get('usar_cache', False):
+        chave, hashes = pipeline.chave_resultado(opcoes, 'adquirentes', mapa)
+        estatisticas = cache.carregar_resultado(chave, resultado_path)
+        if estatisticas is not None:
+            avisar('cache_encontrado')
+            avisar('progresso', valor=1.0)
+            return estatisticas
+        avisar('cache_ausente')
+
+    avisar('progresso', valor=0.3)
+    df_totvs, operadoras = ler_arquivos(opcoes, mapa, avisar, cancelar, paralelo)
+    avisar('progresso', valor=0.5)
+    verificar_cancelamento(cancelar)
+
+    if df_totvs is None or any(df is None for df in operadoras.values()):
+        avisar('falha_leitura')
+        return None
+
+    partes, nao_conciliado = separar_por_adquirente(df_totvs, list(operadoras))
+    if len(nao_conciliado):
+        avisar('nao_conciliado', registros=len(nao_conciliado))
+
+    entradas = opcoes.get('entradas', 'planilha')
+    caminho_base = pipeline.base_incremental(opcoes, 'adquirentes')
+    # Todas as comparações antes de abrir a planilha: um erro ou cancelamento
+    # no meio não deixa no caminho de saída uma planilha só com parte das operadoras
+    por_operadora = {}
+    abas_por_operadora = []
+    for adquirente, df_operadora in operadoras.items():
+        config = pipeline.COMPARADORES[adquirente]
+        avisar('adquirente_inicio', adquirente=adquirente, registros_totvs=len(partes[adquirente]))
+        abas, por_operadora[adquirente] = pipeline.comparar(
+            partes[adquirente], df_operadora, opcoes['modo'], config['layout'], avisar, cancelar,
+            pipeline.opcoes_pareamento(opcoes), opcoes.get('processos') if paralelo else 1,
+            (caminho_base, adquirente) if caminho_base else None
+        )
+        abas_por_operadora.append((config['rotulo'] + ' ', abas))
+    if len(nao_conciliado):
+        abas_por_operadora.append(('', {ABA_NAO_CONCILIADO: nao_conciliado}))
+
+    with Planilha(resultado_path, opcoes.get('divisao', 'mes')) as planilha:
+        for prefixo, abas in abas_por_operadora:
+            pipeline.escrever_abas(planilha, abas, prefixo, entradas, avisar)
+    estatisticas = {'operadoras': por_operadora, 'arquivos': planilha.arquivos}
+    avisar('progresso', valor=1.0)
+
+    # Resultado com grupos pulados pelo limite de tempo pode mudar na próxima vez
+    pulados = any(dados.get('somas_pulados') for dados in por_operadora.values())
+    if chave is not None and not pulados:
+        # A planilha já foi gravada: falhar ao guardar a cópia no cache não falha a execução
+        try:
+            cache.salvar_resultado(chave, resultado_path, estatisticas, hashes, extras=planilha.arquivos[1:])
+        except OSError:
+            pass
+    return estatisticas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m conciliacao.adquirentes',
+        description="Concilia várias operadoras contra um único arquivo do TOTVS, numa planilha só"
+    )
+    parser.add_argument('--totvs', required=True, help="arquivo do TOTVS com as vendas de todas as operadoras")
+    for adquirente, config in pipeline.COMPARADORES.items():
+        parser.add_argument(f'--{adquirente}', help=f"arquivo da {config['rotulo']}")
+    parser.add_argument('--saida', required=True, help="planilha de resultado (.xlsx)")
+    parser.add_argument('--modo', choices=pipeline.MODOS, default='detalhada')
+    parser.add_argument('--entradas', choices=pipeline.ENTRADAS, default='planilha',
+                        help="onde gravar as abas que repetem as entradas (padrão: na planilha)")
+    parser.add_argument('--divisao', choices=DIVISOES, default='mes',
+                        help="como dividir abas acima do limite de linhas do Excel (padrão: por mês)")
+    parser.add_argument('--tolerancia-centavos', type=int, default=0,
+                        help="pareia sobras com até esta diferença de valor, em centavos (só na detalhada)")
+    parser.add_argument('--janela-dias', type=int, default=0,
+                        help="pareia sobras com até esta diferença de data, em dias (só na detalhada)")
+    parser.add_argument('--somas', action='store_true',
+                        help="pareia lançamentos do TOTVS que somam várias vendas da operadora (só na detalhada)")
+    parser.add_argument('--somas-max-itens', type=int, default=motor.MAX_ITENS_SOMA,
+                        help="na busca de somas, pula grupos com mais sobras da operadora que isto")
+    parser.add_argument('--somas-tempo', type=float, default=motor.TEMPO_LIMITE_SOMAS,
+                        help="segundos máximos gastos na busca de somas por conciliação")
+    parser.add_argument('--processos', type=int, default=0,
+                        help="processos na comparação detalhada (0, o padrão: um por núcleo da máquina; 1 desliga)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="só recompara os grupos que mudaram desde a última execução (base SQLite na pasta da saída)")
+    parser.add_argument('--em-blocos', action='store_true', help="lê os arquivos em blocos (menos memória)")
+    parser.add_argument('--sem-cache', action='store_true', help="não usa nem grava o cache")
+    args = parser.parse_args(argv)
+    if args.tolerancia_centavos < 0 or args.janela_dias < 0:
+        parser.error("--tolerancia-centavos e --janela-dias não podem ser negativos")
+    if args.processos < 0:
+        parser.error("--processos não pode ser negativo")
+    if args.somas_max_itens < 2 or args.somas_tempo <= 0:
+        parser.error("--somas-max-itens precisa ser ao menos 2 e --somas-tempo maior que zero")
+
+    arquivos_operadora = {
+        adquirente: getattr(args, adquirente)
+        for adquirente in pipeline.COMPARADORES if getattr(args, adquirente)
+    }
+    if not arquivos_operadora:
+        parser.error("informe o arquivo de pelo menos uma operadora (" +
+                     ", ".join(f'--{a}' for a in pipeline.COMPARADORES) + ")")
+
+    def avisar(etapa, **dados):
+        if etapa.endswith('_erro'):
+            print(f"ERRO  {dados.get('adquirente', 'totvs')}: {dados['erro']}")
+        elif etapa == 'nao_conciliado':
+            print(f"{dados['registros']} linha(s) do TOTVS sem operadora informada -> aba '{ABA_NAO_CONCILIADO}'")
+        elif etapa == 'aba_dividida':
+            print(f"Aba '{dados['aba']}' com {dados['linhas']} linhas dividida em {dados['partes']} partes")
+        elif etapa == 'somas' and dados['pulados']:
+            print(f"{dados['pulados']} grupo(s) pulado(s) na busca de somas (itens ou tempo acima do limite)")
+        elif etapa == 'incremental':
+            print(f"{dados['recomparados']} grupo(s) recomparado(s), {dados['reaproveitados']} da base incremental")
+        elif etapa == 'cache_encontrado':
+            print("Resultado reaproveitado do cache")
+
+    opcoes = {
+        'arquivo_totvs': args.totvs,
+        'arquivos_operadora': arquivos_operadora,
+        'resultado_path': args.saida,
+        'modo': args.modo,
+        'entradas': args.entradas,
+        'divisao': args.divisao,
+        'tolerancia_centavos': args.tolerancia_centavos,
+        'janela_dias': args.janela_dias,
+        'somas': args.somas,
+        'max_itens_soma': args.somas_max_itens,
+        'tempo_limite_somas': args.somas_tempo,
+        'processos': args.processos or None,
+        'incremental': args.incremental,
+        'em_blocos': args.em_blocos,
+        'usar_cache': not args.sem_cache,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.saida)), exist_ok=True)
+    estatisticas = executar(opcoes, avisar=avisar)
+    if estatisticas is None:
+        return 1
+
+    for adquirente, dados in estatisticas['operadoras'].items():
+        print(
+            f"{pipeline.COMPARADORES[adquirente]['rotulo']}: {dados['total_operadora']} registro(s) da operadora, "
+            f"{dados['total_totvs']} do TOTVS, {dados['com_diferencas']} combinação(ões) com diferença"
+        )
+    print("Resultado em " + ", ".join(estatisticas['arquivos']))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,288 @@
+"""Medição do tempo de cada etapa da conciliação sobre entradas sintéticas (ver sintetico).
+
+    python -m conciliacao.benchmark --tamanhos 10000 100000 1000000
+    python -m conciliacao.benchmark --comparador pagseguro --motor duckdb --formato parquet
+
+Para cada tamanho (vendas da operadora) gera uma vez as entradas em
+<dados>/<parâmetros>/, reaproveitadas nas execuções seguintes, e mede em
+segundos:
+
+    leitura       ler as duas planilhas (leitura.ler_tabela)
+    normalizacao  normalizar_operadora/normalizar_totvs e finalizar
+    pareamento    o pareamento exato da Comparação Detalhada
+    resumo        o Resumo e o Resumo Filtrável
+    gravacao      a planilha de resultado (Planilha + escrever_abas)
+
+No motor 'duckdb' a leitura e a normalização acontecem juntas, bloco a bloco,
+na gravação do banco, e aparecem só como leitura. Cada tamanho é medido num
+processo próprio, para que o pico de memória (memoria_mb) seja só dele; com
+--repeticoes fica o menor tempo de cada etapa.
+
+Os resultados são acrescentados, uma linha JSON por tamanho, ao arquivo
+--resultados, com a data, o commit, as versões e os parâmetros; cada linha é
+comparada com a última medição anterior de mesmos parâmetros e tamanho.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from conciliacao import leitura, motor_sql, normalizacao, pipeline, sintetico
+from conciliacao.planilha import LINHAS_POR_ABA, Planilha
+
+ETAPAS = ['leitura', 'normalizacao', 'pareamento', 'resumo', 'gravacao']
+
+TAMANHOS_PADRAO = [10_000, 100_000, 1_000_000, 10_000_000]
+
+# Marcas do avisar de pipeline.abas_da_comparacao que delimitam cada etapa
+MARCAS = {
+    'pareamento': ('detalhada_inicio', 'detalhada'),
+    'resumo': ('resumo_inicio', 'organizado'),
+}
+
+
+class Cronometro:
+    """avisar que anota o instante de cada etapa do pipeline"""
+
+    def __init__(self):
+        self.marcas = {}
+
+    def __call__(self, etapa, **dados):
+        self.marcas[etapa] = time.perf_counter()
+
+    def duracoes(self):
+        return {
+            etapa: self.marcas[fim] - self.marcas[inicio]
+            for etapa, (inicio, fim) in MARCAS.items()
+            if inicio in self.marcas and fim in self.marcas
+        }
+
+
+def pico_memoria_mb():
+    """Maior memória residente do processo até agora, em MB (None onde não há o módulo resource)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # O Linux informa em KB e o macOS em bytes
+    return round(pico / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def commit_atual():
+    """Hash curto do commit do repositório do pacote, ou None fora de um repositório git"""
+    try:
+        resultado = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return resultado.stdout.strip() or None
+
+
+def preparar_entradas(pasta_dados, linhas, parametros):
+    """Caminhos (operadora, totvs) das entradas sintéticas do tamanho, gerando-as se ainda não existem"""
+    nome = '{comparador}_{linhas}_{formato}_d{duplicados}_x{divergencias}_s{semente}'.format(linhas=linhas, **parametros)
+    pasta = os.path.join(pasta_dados, nome)
+    formato = parametros['formato']
+    caminhos = (os.path.join(pasta, f"operadora_{parametros['comparador']}.{formato}"),
+                os.path.join(pasta, f'totvs.{formato}'))
+    if not all(os.path.exists(caminho) for caminho in caminhos):
+        extratos, totvs = sintetico.gerar(
+            linhas, [parametros['comparador']], duplicados=parametros['duplicados'],
+            divergencias=parametros['divergencias'], semente=parametros['semente']
+        )
+        sintetico.gravar(pasta, extratos, totvs, [formato])
+    return caminhos
+
+
+def medir_pandas(arquivo_operadora, arquivo_totvs, config, processos, cronometro):
+    """Leitura e normalização medidas aqui; devolve (tempos, abas) com as abas de abas_detalhada"""
+    tempos = {}
+    inicio = time.perf_counter()
+    bruto_operadora = leitura.ler_tabela(arquivo_operadora, leitura.COLUNAS_OPERADORA)
+    bruto_totvs = leitura.ler_tabela(arquivo_totvs, leitura.COLUNAS_TOTVS, leitura.LINHA_CABECALHO_TOTVS)
+    tempos['leitura'] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    df_operadora = leitura.finalizar(leitura.normalizar_operadora(bruto_operadora, config['dayfirst']))
+    df_totvs = leitura.finalizar(
+        leitura.normalizar_totvs(bruto_totvs, normalizacao.compilar_mapa_codigos(config['mapa']))
+    )
+    leitura.compartilhar_categorias([df_operadora, df_totvs])
+    tempos['normalizacao'] = time.perf_counter() - inicio
+    del bruto_operadora, bruto_totvs
+
+    abas, _ = pipeline.abas_detalhada(df_totvs, df_operadora, config['layout'], cronometro, processos=processos)
+    return tempos, abas
+
+
+def medir_duckdb(arquivo_operadora, arquivo_totvs, config, processos, cronometro, entradas):
+    """Como medir_pandas, com a carga do banco no lugar da leitura e da normalização"""
+    with motor_sql.ComparacaoSQL(processos=processos) as banco:
+        inicio = time.perf_counter()
+        banco.carregar('operadora', leitura.blocos_operadora(arquivo_operadora, config['dayfirst']))
+        banco.carregar('totvs', leitura.blocos_totvs(arquivo_totvs, config['mapa']))
+        tempos = {'leitura': time.perf_counter() - inicio}
+        abas, _ = pipeline.abas_da_comparacao(banco, config['layout'], cronometro)
+        if entradas != 'omitir':
+            abas = dict({'Operadora Processada': banco.entrada('operadora'),
+                         'TOTVS Processado': banco.entrada('totvs')}, **abas)
+    return tempos, abas
+
+
+def medir(arquivo_operadora, arquivo_totvs, parametros):
+    """Uma passada por todas as etapas; devolve {etapa: segundos}"""
+    config = pipeline.COMPARADORES[parametros['comparador']]
+    cronometro = Cronometro()
+    if parametros['motor'] == 'duckdb':
+        tempos, abas = medir_duckdb(arquivo_operadora, arquivo_totvs, config, parametros['processos'], cronometro,
+                                    parametros['entradas'])
+    else:
+        tempos, abas = medir_pandas(arquivo_operadora, arquivo_totvs, config, parametros['processos'], cronometro)
+    tempos.update(cronometro.duracoes())
+
+    with tempfile.TemporaryDirectory(prefix='benchmark_') as pasta:
+        inicio = time.perf_counter()
+        with Planilha(os.path.join(pasta, 'resultado.xlsx'), 'mes') as planilha:
+            pipeline.escrever_abas(planilha, abas, entradas=parametros['entradas'])
+        tempos['gravacao'] = time.perf_counter() - inicio
+    return tempos
+
+
+def medir_tamanho(arquivo_operadora, arquivo_totvs, linhas, parametros, repeticoes=1):
+    """Mede repeticoes vezes; devolve o registro do tamanho
+
+    Roda dentro de um processo próprio (ver main).
+    """
+    medicoes = [medir(arquivo_operadora, arquivo_totvs, parametros) for _ in range(repeticoes)]
+    memoria_mb = pico_memoria_mb()
+    etapas = {etapa: round(min(m[etapa] for m in medicoes), 3) for etapa in ETAPAS if etapa in medicoes[0]}
+    return {
+        'linhas': linhas,
+        'linhas_totvs': contar_linhas(arquivo_totvs),
+        'etapas': etapas,
+        'total': round(sum(etapas.values()), 3),
+        'memoria_mb': memoria_mb,
+    }
+
+
+def contar_linhas(arquivo):
+    """Lançamentos do TOTVS sintético, sem reler a planilha inteira quando possível"""
+    if leitura.extensao(arquivo) == '.parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(arquivo).metadata.num_rows
+    if leitura.extensao(arquivo) == '.csv':
+        with open(arquivo, 'rb') as f:
+            return sum(1 for _ in f) - leitura.LINHA_CABECALHO_TOTVS - 1
+    return len(leitura.ler_tabela(arquivo, ['VALOR'], leitura.LINHA_CABECALHO_TOTVS))
+
+
+def ambiente():
+    return {
+        'commit': commit_atual(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'plataforma': platform.platform(),
+        'nucleos': os.cpu_count(),
+    }
+
+
+def carregar_resultados(caminho):
+    if not os.path.exists(caminho):
+        return []
+    with open(caminho, encoding='utf-8') as arquivo:
+        return [json.loads(linha) for linha in arquivo if linha.strip()]
+
+
+def anterior(resultados, parametros, linhas):
+    """Última medição com os mesmos parâmetros e tamanho, ou None"""
+    for registro in reversed(resultados):
+        if registro['parametros'] == parametros and registro['linhas'] == linhas:
+            return registro
+    return None
+
+
+def formatar_comparacao(registro, referencia):
+    """Texto com o tempo de cada etapa e, havendo referência, a variação em relação a ela"""
+    partes = []
+    for etapa, segundos in dict(registro['etapas'], total=registro['total']).items():
+        texto = f"{etapa} {segundos:.2f}s"
+        antes = None if referencia is None else dict(referencia['etapas'], total=referencia['total']).get(etapa)
+        if antes:
+            texto += f" ({(segundos - antes) / antes:+.0%})"
+        partes.append(texto)
+    return '  '.join(partes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m conciliacao.benchmark',
+                                     description="Mede o tempo de cada etapa da conciliação com dados sintéticos")
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS_PADRAO,
+                        help="vendas da operadora em cada medição (padrão: 10 mil a 10 milhões)")
+    parser.add_argument('--comparador', choices=sorted(pipeline.COMPARADORES), default='cielo')
+    parser.add_argument('--formato', choices=sintetico.FORMATOS, default='csv',
+                        help="formato das entradas (padrão: csv; xlsx só até o limite de linhas do Excel)")
+    parser.add_argument('--motor', choices=pipeline.MOTORES, default='pandas')
+    parser.add_argument('--processos', type=int, default=1,
+                        help="processos do pareamento e do resumo (0: um por núcleo; padrão: 1)")
+    parser.add_argument('--entradas', choices=['planilha', 'omitir'], default='omitir',
+                        help="grava ou não as abas de entrada no resultado (padrão: omitir)")
+    parser.add_argument('--duplicados', type=float, default=0.3, help="ver sintetico (padrão: 0.3)")
+    parser.add_argument('--divergencias', type=float, default=0.02, help="ver sintetico (padrão: 0.02)")
+    parser.add_argument('--semente', type=int, default=0)
+    parser.add_argument('--repeticoes', type=int, default=1, help="medições por tamanho; fica a menor (padrão: 1)")
+    parser.add_argument('--dados', default='dados_benchmark', help="pasta das entradas geradas (padrão: dados_benchmark)")
+    parser.add_argument('--resultados', default='benchmark.jsonl',
+                        help="arquivo JSON Lines onde os resultados são acrescentados (padrão: benchmark.jsonl)")
+    args = parser.parse_args(argv)
+    if any(tamanho < 1 for tamanho in args.tamanhos) or args.repeticoes < 1:
+        parser.error("--tamanhos e --repeticoes precisam ser positivos")
+    if args.processos < 0:
+        parser.error("--processos não pode ser negativo")
+    if not 0 <= args.duplicados <= 1 or not 0 <= args.divergencias <= 1:
+        parser.error("--duplicados e --divergencias precisam estar entre 0 e 1")
+    if args.formato == 'xlsx' and max(args.tamanhos) > LINHAS_POR_ABA - leitura.LINHA_CABECALHO_TOTVS:
+        parser.error("tamanhos acima do limite de linhas do Excel precisam de --formato csv ou parquet")
+
+    parametros = {
+        'comparador': args.comparador,
+        'formato': args.formato,
+        'motor': args.motor,
+        'processos': args.processos or None,
+        'entradas': args.entradas,
+        'duplicados': args.duplicados,
+        'divergencias': args.divergencias,
+        'semente': args.semente,
+    }
+    resultados = carregar_resultados(args.resultados)
+    dados_ambiente = ambiente()
+    for linhas in args.tamanhos:
+        # A geração roda à parte, para não entrar no pico de memória da medição
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            arquivos = pool.submit(preparar_entradas, args.dados, linhas, parametros).result()
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            registro = pool.submit(medir_tamanho, *arquivos, linhas, parametros, args.repeticoes).result()
+        registro = dict({'quando': datetime.now().isoformat(timespec='seconds')}, **dados_ambiente,
+                        parametros=parametros, **registro)
+        print(f"{linhas:>10} linhas  {formatar_comparacao(registro, anterior(resultados, parametros, linhas))}"
+              f"  pico {registro['memoria_mb']} MB")
+        with open(args.resultados, 'a', encoding='utf-8') as arquivo:
+            arquivo.write(json.dumps(registro, ensure_ascii=False) + '\n')
+        resultados.append(registro)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""Cache local das entradas já normalizadas e dos resultados, endereçado pelo conteúdo.
+
+Cada entrada normalizada é uma pasta com uma coluna por arquivo .npy (lida
+com memory-map) e um meta.json com as categorias e o tamanho. A chave combina
+o hash do conteúdo do arquivo, a versão do leitor e os parâmetros da leitura
+(incluindo o codigo_bandeira_map), então qualquer mudança gera outra chave.
+
+Os resultados ficam em resultados/: a planilha gerada e as estatísticas da
+execução, com chave formada pelos hashes das duas entradas, o tipo de
+comparação e o mapa de códigos.
+
+Para limpar o cache:
+
+    python -m conciliacao.cache limpar            # tudo, inclusive resultados
+    python -m conciliacao.cache limpar arquivo.xlsx
+    python -m conciliacao.cache status
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+PASTA_CACHE = os.environ.get(
+    'COMPARADOR_CACHE', os.path.join(os.path.expanduser('~'), '.comparador_planilhas', 'cache')
+)
+PASTA_RESULTADOS = os.path.join(PASTA_CACHE, 'resultados')
+LIMITE_CACHE_MB = 2048
+TAMANHO_LEITURA_HASH = 1024 * 1024
+
+
+def hash_arquivo(arquivo):
+    """Hash do conteúdo do arquivo, lido em pedaços de 1 MB"""
+    h = hashlib.blake2b(digest_size=20)
+    with open(arquivo, 'rb') as f:
+        for pedaco in iter(lambda: f.read(TAMANHO_LEITURA_HASH), b''):
+            h.update(pedaco)
+    return h.hexdigest()
+
+
+def hash_parametros(parametros):
+    """Hash estável de um dicionário de parâmetros (ex: codigo_bandeira_map)"""
+    texto = json.dumps(parametros, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(texto.encode('utf-8'), digest_size=20).hexdigest()
+
+
+def chave_entrada(hash_conteudo, parametros):
+    return f"{hash_conteudo}-{hash_parametros(parametros)}"
+
+
+def chave_resultado(hashes_conteudo, parametros):
+    return hash_parametros(dict(parametros, arquivos=list(hashes_conteudo)))
+
+
+def tamanho_pasta(pasta):
+    return sum(e.stat().st_size for e in os.scandir(pasta) if e.is_file())
+
+
+def publicar(temporaria, destino):
+    """Move a pasta temporária pronta para destino, a não ser que outro processo já tenha gravado a mesma chave
+
+    A mesma chave é o mesmo conteúdo: a entrada existente fica (pode estar
+    aberta com memory-map por outro processo) e a temporária é descartada.
+    """
+    if not os.path.exists(destino):
+        try:
+            os.replace(temporaria, destino)
+            return
+        except OSError:
+            # Outro processo publicou a mesma chave entre a verificação e o replace
+            if not os.path.isdir(destino):
+                raise
+    shutil.rmtree(temporaria, ignore_errors=True)
+
+
+def salvar(chave, df, hash_conteudo, pasta=PASTA_CACHE, limite_mb=LIMITE_CACHE_MB):
+    """Grava o DataFrame normalizado (Data datetime64, Valor em centavos e colunas de texto) no cache
+
+    Bandeira, Tipo e qualquer outra coluna além de Data e Valor (ex:
+    Adquirente) são guardadas como categóricas.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    temporaria = tempfile.mkdtemp(dir=pasta, prefix='.tmp-')
+    try:
+        meta = {'hash_conteudo': hash_conteudo, 'linhas': len(df), 'colunas': list(df.columns), 'categorias': {}}
+        np.save(os.path.join(temporaria, 'Data.npy'), df['Data'].to_numpy(dtype='datetime64[ns]').view(np.int64))
+        np.save(os.path.join(temporaria, 'Valor.npy'), df['Valor'].to_numpy(dtype=np.int64))
+        for coluna in df.columns.drop(['Data', 'Valor']):
+            categorico = pd.Categorical(df[coluna])
+            np.save(os.path.join(temporaria, f'{coluna}.npy'), categorico.codes)
+            meta['categorias'][coluna] = [str(c) for c in categorico.categories]
+        with open(os.path.join(temporaria, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        publicar(temporaria, os.path.join(pasta, chave))
+    except BaseException:
+        shutil.rmtree(temporaria, ignore_errors=True)
+        raise
+
+    despejar(pasta, limite_mb)
+
+
+def carregar(chave, pasta=PASTA_CACHE):
+    """Lê uma entrada do cache com memory-map; retorna None se não existir"""
+    destino = os.path.join(pasta, chave)
+    meta_path = os.path.join(destino, 'meta.json')
+    if not os.path.exists(meta_path):
+        return None
+
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+
+        def coluna(nome):
+            return np.load(os.path.join(destino, f'{nome}.npy'), mmap_mode='r')
+
+        colunas = {
+            'Data': pd.Series(coluna('Data').view('datetime64[ns]'), copy=False),
+            'Valor': pd.Series(coluna('Valor'), copy=False),
+        }
+        for nome, categorias in meta['categorias'].items():
+            colunas[nome] = pd.Categorical.from_codes(coluna(nome), categorias)
+        df = pd.DataFrame(colunas, columns=meta.get('colunas', ['Data', 'Bandeira', 'Tipo', 'Valor']))
+    except (OSError, ValueError, KeyError):
+        # Entrada corrompida ou de outra versão: descarta e lê de novo
+        shutil.rmtree(destino, ignore_errors=True)
+        return None
+
+    # O horário de modificação do meta.json marca o último uso (LRU)
+    os.utime(meta_path)
+    return df
+
+
+def salvar_resultado(chave, resultado_path, estatisticas, hashes_conteudo, extras=(),
+                     pasta=PASTA_RESULTADOS, limite_mb=LIMITE_CACHE_MB):
+    """Guarda uma cópia da planilha gerada e as estatísticas da execução
+
+    extras são os outros arquivos gravados junto (planilhas numeradas,
+    entradas em Parquet/CSV). Todos começam pelo nome da planilha e são
+    guardados pelo que vem depois dele (ex: '_2.xlsx').
+    """
+    os.makedirs(pasta, exist_ok=True)
+    temporaria = tempfile.mkdtemp(dir=pasta, prefix='.tmp-')
+    base = os.path.splitext(resultado_path)[0]
+    try:
+        shutil.copyfile(resultado_path, os.path.join(temporaria, 'resultado' + os.path.splitext(resultado_path)[1]))
+        sufixos = [extra[len(base):] for extra in extras]
+        for numero, extra in enumerate(extras):
+            shutil.copyfile(extra, os.path.join(temporaria, f'extra{numero}'))
+        estatisticas = {k: v for k, v in estatisticas.items() if k != 'arquivos'}
+        meta = {'hashes_conteudo': list(hashes_conteudo), 'estatisticas': estatisticas, 'extras': sufixos}
+        with open(os.path.join(temporaria, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        publicar(temporaria, os.path.join(pasta, chave))
+    except BaseException:
+        shutil.rmtree(temporaria, ignore_errors=True)
+        raise
+
+    despejar(pasta, limite_mb)
+
+
+def carregar_resultado(chave, resultado_path, pasta=PASTA_RESULTADOS):
+    """Copia a planilha guardada para resultado_path e devolve as estatísticas
+
+    Retorna None quando não há resultado para a chave. A planilha é copiada
+    (não linkada) para que editar o arquivo entregue não altere o cache. Os
+    arquivos extras voltam com o nome da nova planilha; a lista completa vai
+    em estatisticas['arquivos'].
+    """
+    destino = os.path.join(pasta, chave)
+    meta_path = os.path.join(destino, 'meta.json')
+    planilha = os.path.join(destino, 'resultado' + os.path.splitext(resultado_path)[1])
+    if not os.path.exists(meta_path) or not os.path.exists(planilha):
+        return None
+
+    with open(meta_path, encoding='utf-8') as f:
+        meta = json.load(f)
+    arquivos = [resultado_path]
+    shutil.copyfile(planilha, resultado_path)
+    for numero, sufixo in enumerate(meta.get('extras', [])):
+        arquivos.append(os.path.splitext(resultado_path)[0] + sufixo)
+        shutil.copyfile(os.path.join(destino, f'extra{numero}'), arquivos[-1])
+    os.utime(meta_path)
+    return dict(meta['estatisticas'], arquivos=arquivos)
+
+
+def entradas(pasta=PASTA_CACHE):
+    """Lista (caminho, tamanho em bytes, último uso) das entradas do cache"""
+    if not os.path.isdir(pasta):
+        return []
+    resultado = []
+    for entrada in os.scandir(pasta):
+        meta_path = os.path.join(entrada.path, 'meta.json')
+        if entrada.is_dir() and os.path.exists(meta_path):
+            resultado.append((entrada.path, tamanho_pasta(entrada.path), os.path.getmtime(meta_path)))
+    return resultado
+
+
+def despejar(pasta=PASTA_CACHE, limite_mb=LIMITE_CACHE_MB):
+    """Remove as entradas usadas há mais tempo até o cache caber no limite"""
+    limite = limite_mb * 1024 * 1024
+    lista = sorted(entradas(pasta), key=lambda e: e[2])
+    total = sum(tamanho for _, tamanho, _ in lista)
+    removidas = 0
+    for caminho, tamanho, _ in lista:
+        if total <= limite:
+            break
+        shutil.rmtree(caminho, ignore_errors=True)
+        total -= tamanho
+        removidas += 1
+    return removidas
+
+
+def limpar(arquivos=None, pasta=PASTA_CACHE):
+    """Invalida o cache inteiro ou só as entradas e resultados dos arquivos informados"""
+    hashes = {hash_arquivo(a) for a in arquivos} if arquivos else None
+    removidas = 0
+    for caminho, _, _ in entradas(pasta) + entradas(os.path.join(pasta, 'resultados')):
+        if hashes is not None:
+            with open(os.path.join(caminho, 'meta.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+            conteudos = set(meta.get('hashes_conteudo', [meta.get('hash_conteudo')]))
+            if not conteudos & hashes:
+                continue
+        shutil.rmtree(caminho, ignore_errors=True)
+        removidas += 1
+    return removidas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m conciliacao.cache', description="Gerencia o cache de entradas normalizadas")
+    parser.add_argument('--pasta', default=PASTA_CACHE, help="pasta do cache")
+    sub = parser.add_subparsers(dest='comando', required=True)
+    limpar_parser = sub.add_parser('limpar', help="remove entradas do cache")
+    limpar_parser.add_argument('arquivos', nargs='*', help="só as entradas destes arquivos (padrão: todas)")
+    sub.add_parser('status', help="mostra o tamanho do cache")
+    args = parser.parse_args(argv)
+
+    if args.comando == 'limpar':
+        removidas = limpar(args.arquivos or None, args.pasta)
+        print(f"{removidas} entrada(s) removida(s) de {args.pasta}")
+    else:
+        lista = entradas(args.pasta)
+        resultados = entradas(os.path.join(args.pasta, 'resultados'))
+        total = sum(tamanho for _, tamanho, _ in lista + resultados)
+        print(f"{len(lista)} entrada(s) e {len(resultados)} resultado(s), {total / 1024 / 1024:.1f} MB em {args.pasta}")
+        for caminho, tamanho, uso in sorted(lista, key=lambda e: e[2], reverse=True):
+            print(f"  {os.path.basename(caminho)[:16]}  {tamanho / 1024:.0f} KB  {time.strftime('%d/%m/%Y %H:%M', time.localtime(uso))}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Representação de datas como número de dias desde 1970-01-01 (Int32).
+
+Como os valores em centavos (ver dinheiro), as datas das entradas
+normalizadas ficam como o número do dia num inteiro de 32 bits, com <NA> nas
+datas vazias: 4 bytes por linha, agrupadas e ordenadas como inteiros em vez
+de objetos date do Python. Só voltam a ser date (ou texto "31/01/2024") na
+hora de gravar o resultado.
+"""
+import numpy as np
+import pandas as pd
+
+# Colunas que guardam dias e precisam ser convertidas na gravação
+COLUNAS_DATA = ['Data', 'Data_Sistema', 'Data_Operadora']
+
+# Representação do NaT em datetime64, usada para as datas vazias
+NAT = np.iinfo(np.int64).min
+
+
+def para_dias(datas):
+    """Converte datas (datetime64, date ou Timestamp) em dias desde 1970-01-01, como Int32"""
+    serie = pd.Series(datas)
+    dias = pd.to_datetime(serie).to_numpy(dtype='datetime64[D]')
+    vazias = np.isnat(dias)
+    numeros = np.where(vazias, 0, dias.view(np.int64)).astype(np.int32)
+    return pd.Series(pd.arrays.IntegerArray(numeros, vazias), index=serie.index)
+
+
+def em_datetime64(dias):
+    """Dias (Int32) como array datetime64[D], com NaT nas datas vazias"""
+    return pd.Series(dias).to_numpy(dtype=np.int64, na_value=NAT).view('datetime64[D]')
+
+
+def em_datas(dias):
+    """Dias (Int32) como objetos date, com NaT nas datas vazias (o que o .dt.date do pandas devolve)"""
+    serie = pd.Series(dias)
+    return pd.Series(em_datetime64(serie).astype('datetime64[s]'), index=serie.index).dt.date
+
+
+def formatar_dias(dias, formato='%d/%m/%Y'):
+    """Formata dias (Int32) como texto (ex: 19753 -> "31/01/2024")"""
+    serie = pd.Series(dias)
+    return pd.Series(em_datetime64(serie).astype('datetime64[s]'), index=serie.index).dt.strftime(formato)
+
+
+def com_datas(df, colunas=COLUNAS_DATA):
+    """Cópia do DataFrame com as colunas em dias convertidas para date
+
+    Só colunas inteiras são convertidas: na Comparação Detalhada, por
+    exemplo, 'Data' já é o texto dd/mm/aaaa.
+    """
+    df = df.copy()
+    for coluna in colunas:
+        if coluna in df.columns and pd.api.types.is_integer_dtype(df[coluna]):
+            df[coluna] = em_datas(df[coluna])
+    return df
@@ -0,0 +1,61 @@
+"""Representação de dinheiro em centavos inteiros (int64).
+
+Os valores são convertidos para centavos assim que a planilha é lida e só
+voltam a ser reais (ou texto "1.234,56") na hora de gravar o resultado.
+"""
+import numpy as np
+import pandas as pd
+
+# Colunas que guardam centavos e precisam ser convertidas na gravação
+COLUNAS_MONETARIAS = [
+    'Valor', 'Valor_Sistema', 'Valor_Operadora', 'Valor_Numérico',
+    'Total_Sistema', 'Total_Operadora', 'Diferença_Total', 'Diferença_Valor',
+]
+
+
+def para_centavos(valores):
+    """Converte números do Excel ou textos no formato brasileiro para centavos
+
+    Segue as mesmas regras do antigo formatar_valor: se o texto tem vírgula,
+    os pontos são separadores de milhar e a vírgula é a decimal; sem vírgula,
+    o texto é lido como número comum. Células vazias valem zero.
+    """
+    serie = pd.Series(valores)
+    numeros = pd.to_numeric(serie, errors='coerce')
+
+    # Só os textos que não são números simples passam pela troca de separadores
+    pendentes = numeros.isna() & serie.notna()
+    if pendentes.any():
+        texto = serie[pendentes].astype(str).str.strip()
+        com_virgula = texto.str.contains(',', regex=False)
+        texto = texto.where(
+            ~com_virgula,
+            texto.str.replace('.', '', regex=False).str.replace(',', '.', regex=False),
+        )
+        numeros[pendentes] = pd.to_numeric(texto)
+
+    centavos = np.round(numeros.fillna(0).to_numpy(dtype=float) * 100)
+    return pd.Series(centavos.astype(np.int64), index=serie.index)
+
+
+def formatar_centavos(centavos):
+    """Formata centavos como texto brasileiro (ex: 123456 -> "1.234,56")"""
+    centavos = np.asarray(centavos, dtype=np.int64)
+    absolutos = pd.Series(np.abs(centavos))
+    inteiros = (absolutos // 100).astype(str).str.replace(r'(\d)(?=(\d{3})+$)', r'\1.', regex=True)
+    sinal = pd.Series(np.where(centavos < 0, '-', ''))
+    texto = sinal + inteiros + ',' + (absolutos % 100).astype(str).str.zfill(2)
+    return texto.to_numpy(dtype=object)
+
+
+def em_reais(df, colunas=COLUNAS_MONETARIAS):
+    """Cópia do DataFrame com as colunas em centavos convertidas para reais
+
+    Só colunas inteiras são convertidas: no Resumo Filtrável, por exemplo,
+    'Valor' é o texto já formatado.
+    """
+    df = df.copy()
+    for coluna in colunas:
+        if coluna in df.columns and pd.api.types.is_integer_dtype(df[coluna]):
+            df[coluna] = df[coluna] / 100
+    return df
@@ -0,0 +1,15 @@
+"""Cancelamento cooperativo do processamento.
+
+O processamento roda fora da thread da interface; quem quer interromper marca
+um threading.Event e o motor confere esse evento entre as etapas.
+"""
+
+
+class Cancelado(Exception):
+    """O usuário pediu para interromper o processamento"""
+
+
+def verificar_cancelamento(cancelar):
+    """Levanta Cancelado se o evento (threading.Event ou None) estiver marcado"""
+    if cancelar is not None and cancelar.is_set():
+        raise Cancelado("Processamento cancelado pelo usuário")
@@ -0,0 +1,185 @@
+"""Conciliação incremental: só compara de novo os grupos que mudaram desde a última execução.
+
+Os extratos da Operadora e do TOTVS costumam ser acumulados do mês, então a
+execução de cada dia repete todos os dias anteriores. A base incremental (um
+arquivo SQLite) guarda, para cada (Data, Bandeira, Tipo), um hash dos valores
+dos dois lados, na ordem de leitura, e as sobras do pareamento exato daquele
+grupo. Na execução seguinte só os grupos com hash diferente (ou novos) passam
+pelo motor; os outros vêm da base, e a comparação detalhada é remontada a
+partir dela. O resultado é o mesmo de comparar tudo de novo.
+
+Cada base guarda um contexto por comparador (ou por adquirente, em
+conciliacao.adquirentes). Grupos que sumiram das entradas saem da base, então
+use uma base por loja: por padrão ela fica na pasta do resultado
+(ver caminho_base).
+"""
+import contextlib
+import hashlib
+import os
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from conciliacao import calendario, motor, particoes
+from conciliacao.execucao import verificar_cancelamento
+
+# Aumente quando o que é guardado mudar; bases de outra versão são recomparadas
+VERSAO_BASE = 1
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS grupos (
+    contexto TEXT NOT NULL,
+    data TEXT NOT NULL,
+    bandeira TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    qtd_sistema INTEGER NOT NULL,
+    qtd_operadora INTEGER NOT NULL,
+    PRIMARY KEY (contexto, data, bandeira, tipo)
+);
+CREATE TABLE IF NOT EXISTS diferencas (
+    contexto TEXT NOT NULL,
+    data TEXT NOT NULL,
+    bandeira TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    ordem INTEGER NOT NULL,
+    a_mais INTEGER NOT NULL,
+    valor INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS diferencas_grupo ON diferencas (contexto, data, bandeira, tipo);
+"""
+
+
+def caminho_base(pasta, nome):
+    """Arquivo padrão da base incremental de um comparador (ex: 'cielo') numa pasta de resultados"""
+    return os.path.join(pasta, f'conciliacao_{nome}.sqlite')
+
+
+def chave_grupo(chave):
+    """(Data, Bandeira, Tipo) do groupby como texto: data (em dias, ver calendario) em aaaa-mm-dd"""
+    data, bandeira, tipo = chave
+    return str(np.datetime64(int(data), 'D')), str(bandeira), str(tipo)
+
+
+def hashes_dos_grupos(df_totvs, df_operadora):
+    """Hash dos valores de cada (Data, Bandeira, Tipo) das duas entradas
+
+    Devolve ({grupo: (hash, qtd_sistema, qtd_operadora)}, {grupo: linhas
+    do TOTVS}, {grupo: linhas da Operadora}). Os valores entram na ordem de
+    leitura, que também decide a ordem das sobras no detalhe.
+    """
+    linhas_totvs = {
+        chave_grupo(chave): posicoes
+        for chave, posicoes in df_totvs.groupby(motor.CHAVE, observed=True, sort=False).indices.items()
+    }
+    linhas_operadora = {
+        chave_grupo(chave): posicoes
+        for chave, posicoes in df_operadora.groupby(motor.CHAVE, observed=True, sort=False).indices.items()
+    }
+    valores_totvs = df_totvs['Valor'].to_numpy(dtype=np.int64)
+    valores_operadora = df_operadora['Valor'].to_numpy(dtype=np.int64)
+    vazio = np.array([], dtype=np.int64)
+
+    hashes = {}
+    for grupo in linhas_totvs.keys() | linhas_operadora.keys():
+        sistema = valores_totvs[linhas_totvs.get(grupo, vazio)]
+        operadora = valores_operadora[linhas_operadora.get(grupo, vazio)]
+        h = hashlib.blake2b(digest_size=16)
+        h.update(sistema.tobytes())
+        h.update(b'|')
+        h.update(operadora.tobytes())
+        hashes[grupo] = (h.hexdigest(), len(sistema), len(operadora))
+    return hashes, linhas_totvs, linhas_operadora
+
+
+def linhas_dos_grupos(linhas, grupos):
+    """Posições, em ordem de leitura, das linhas que pertencem aos grupos"""
+    posicoes = [linhas[grupo] for grupo in grupos if grupo in linhas]
+    return np.sort(np.concatenate(posicoes)) if posicoes else np.array([], dtype=np.int64)
+
+
+def sobras_para_base(detalhe, layout):
+    """Linhas da tabela diferencas a partir de um detalhe gerado pelo motor"""
+    eh_a_mais = (detalhe[layout['a_mais']] != '').to_numpy()
+    valores = np.where(eh_a_mais, detalhe['Valor_Sistema'], detalhe['Valor_Operadora']).astype(np.int64)
+    ordem = detalhe.groupby(motor.CHAVE, observed=True, sort=False).cumcount().to_numpy()
+    datas = calendario.formatar_dias(detalhe['Data'], '%Y-%m-%d').to_numpy()
+    return list(zip(
+        datas.tolist(),
+        detalhe['Bandeira'].astype(str).tolist(),
+        detalhe['Tipo'].astype(str).tolist(),
+        ordem.tolist(),
+        eh_a_mais.astype(int).tolist(),
+        valores.tolist(),
+    ))
+
+
+def comparacao_detalhada(base, contexto, df_totvs, df_operadora, layout=motor.LAYOUT_CIELO,
+                         avisar=None, cancelar=None, processos=1):
+    """motor.gerar_comparacao_detalhada, comparando só os grupos que mudaram desde a última execução
+
+    base é o arquivo SQLite (criado se não existir) e contexto separa os
+    comparadores que dividem a mesma base. Os grupos alterados passam pelo
+    motor (por faixas de datas, ver particoes), a base é atualizada e o
+    detalhe inteiro é remontado a partir dela. avisar recebe a etapa
+    'incremental' com os grupos recomparados e reaproveitados.
+    """
+    contexto = f'{contexto}/v{VERSAO_BASE}/r{motor.VERSAO_RESULTADO}/{int(layout["ordenar_valores"])}'
+    hashes, linhas_totvs, linhas_operadora = hashes_dos_grupos(df_totvs, df_operadora)
+    verificar_cancelamento(cancelar)
+
+    with contextlib.closing(sqlite3.connect(base)) as conexao:
+        conexao.executescript(ESQUEMA)
+        guardados = {
+            (data, bandeira, tipo): hash_grupo
+            for data, bandeira, tipo, hash_grupo in conexao.execute(
+                "SELECT data, bandeira, tipo, hash FROM grupos WHERE contexto = ?", (contexto,)
+            )
+        }
+        alterados = sorted(grupo for grupo, (h, _, _) in hashes.items() if guardados.get(grupo) != h)
+        removidos = sorted(guardados.keys() - hashes.keys())
+        if avisar is not None:
+            avisar('incremental', recomparados=len(alterados), reaproveitados=len(hashes) - len(alterados))
+
+        if alterados or removidos:
+            sub_totvs = df_totvs.iloc[linhas_dos_grupos(linhas_totvs, alterados)]
+            sub_operadora = df_operadora.iloc[linhas_dos_grupos(linhas_operadora, alterados)]
+            with particoes.ComparacaoPorFaixas(sub_totvs, sub_operadora, processos) as faixas:
+                novas = faixas.comparacao_detalhada(layout, cancelar)
+            verificar_cancelamento(cancelar)
+
+            # Tudo numa transação: uma execução cancelada ou com erro não deixa a base pela metade
+            with conexao:
+                for grupo in alterados + removidos:
+                    conexao.execute(
+                        "DELETE FROM grupos WHERE contexto = ? AND data = ? AND bandeira = ? AND tipo = ?",
+                        (contexto,) + grupo
+                    )
+                    conexao.execute(
+                        "DELETE FROM diferencas WHERE contexto = ? AND data = ? AND bandeira = ? AND tipo = ?",
+                        (contexto,) + grupo
+                    )
+                conexao.executemany(
+                    "INSERT INTO grupos VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(contexto,) + grupo + hashes[grupo] for grupo in alterados]
+                )
+                conexao.executemany(
+                    "INSERT INTO diferencas VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(contexto,) + linha for linha in sobras_para_base(novas, layout)]
+                )
+
+        sobras = pd.read_sql_query(
+            "SELECT data, bandeira, tipo, a_mais, valor FROM diferencas WHERE contexto = ? "
+            "ORDER BY data, bandeira, tipo, ordem",
+            conexao, params=(contexto,)
+        )
+
+    return motor.montar_detalhe(
+        calendario.para_dias(pd.to_datetime(sobras['data'], format='%Y-%m-%d')).array,
+        sobras['bandeira'].to_numpy(dtype=object),
+        sobras['tipo'].to_numpy(dtype=object),
+        sobras['a_mais'].to_numpy(dtype=bool),
+        sobras['valor'].to_numpy(dtype=np.int64),
+        layout
+    )
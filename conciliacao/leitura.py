@@ -0,0 +1,374 @@
+"""Leitura e normalização das planilhas da Operadora e do TOTVS.
+
+Aceita Excel (.xlsx/.xls), CSV no padrão brasileiro (separador ';') e
+Parquet. A leitura em blocos percorre o arquivo aos pedaços e normaliza cada
+bloco assim que ele é lido, guardando apenas as colunas compactas (Data,
+Bandeira, Tipo, Valor).
+
+ler_entradas (e ler_em_paralelo, para mais de dois arquivos) lê a Operadora
+e o TOTVS ao mesmo tempo, um processo para cada arquivo, já que a leitura de
+xlsx é limitada pela CPU.
+"""
+import multiprocessing
+import os
+
+import pandas as pd
+from openpyxl import load_workbook
+from pandas.api.types import union_categoricals
+
+from conciliacao import cache, calendario, dinheiro, normalizacao
+from conciliacao.execucao import Cancelado, verificar_cancelamento
+
+COLUNAS_OPERADORA = ['Data da venda', 'Bandeira', 'Forma de pagamento', 'Valor bruto']
+COLUNAS_TOTVS = ['DT. EMISSAO', 'CLIENTE', 'VALOR']
+
+# O relatório do TOTVS tem uma linha de título acima do cabeçalho
+LINHA_CABECALHO_TOTVS = 1
+
+# Aumente sempre que a normalização mudar, para invalidar o cache de entradas
+VERSAO_LEITURA = 1
+
+TAMANHO_BLOCO = 50_000
+LIMITE_MEMORIA_MB = 1024
+
+SEPARADOR_CSV = ';'
+ENCODINGS_CSV = ['utf-8-sig', 'latin-1']
+
+# Filtro usado nas janelas de seleção de arquivo
+TIPOS_ARQUIVO = [
+    ("Planilhas", "*.xlsx *.xls *.csv *.parquet"),
+    ("Arquivos Excel", "*.xlsx *.xls"),
+    ("Arquivos CSV", "*.csv"),
+    ("Arquivos Parquet", "*.parquet"),
+    ("Todos os arquivos", "*.*"),
+]
+
+
+def normalizar_operadora(df, dayfirst=True):
+    """Converte as colunas brutas da Operadora em Data, Bandeira, Tipo e Valor (centavos)"""
+    df = df.rename(columns={
+        'Data da venda': 'Data',
+        'Forma de pagamento': 'Tipo',
+        'Valor bruto': 'Valor'
+    })
+
+    df['Data'] = pd.to_datetime(df['Data'], dayfirst=dayfirst).dt.normalize()
+    df['Bandeira'] = df['Bandeira'].fillna(df['Tipo'])
+    df['Bandeira'] = normalizacao.normalizar_categorias(df['Bandeira'], normalizacao.normalizar_bandeira)
+    df['Tipo'] = normalizacao.normalizar_categorias(df['Tipo'], normalizacao.normalizar_tipo)
+    df['Valor'] = dinheiro.para_centavos(df['Valor'])
+    return df[['Data', 'Bandeira', 'Tipo', 'Valor']]
+
+
+def normalizar_totvs(df, mapa_compilado, separar_adquirentes=False):
+    """Converte as colunas brutas do TOTVS em Data, Bandeira, Tipo e Valor (centavos)
+
+    Com separar_adquirentes=True inclui a coluna Adquirente, a operadora dona
+    do código de cliente ('' para códigos fora do mapa).
+    """
+    df = df.copy()
+    df['Bandeira'], df['Tipo'], adquirentes = normalizacao.classificar_codigos(df['CLIENTE'], mapa_compilado)
+    df['Data'] = pd.to_datetime(df['DT. EMISSAO'], dayfirst=True).dt.normalize()
+    df['Valor'] = dinheiro.para_centavos(df['VALOR'])
+    if not separar_adquirentes:
+        return df[['Data', 'Bandeira', 'Tipo', 'Valor']]
+    df['Adquirente'] = pd.Categorical(adquirentes)
+    return df[['Data', 'Bandeira', 'Tipo', 'Valor', 'Adquirente']]
+
+
+def finalizar(df):
+    """Entrega o DataFrame normalizado no formato usado pelo motor
+
+    Data em dias desde 1970-01-01 (Int32, ver calendario), Bandeira, Tipo
+    (e Adquirente) categóricas e Valor em centavos (int64).
+    """
+    df = df.reset_index(drop=True)
+    df['Data'] = calendario.para_dias(df['Data'])
+    for coluna in df.columns.drop(['Data', 'Valor']):
+        df[coluna] = df[coluna].astype('category')
+    return df
+
+
+def compartilhar_categorias(dfs, colunas=('Bandeira', 'Tipo')):
+    """Dá às colunas categóricas de todos os DataFrames as mesmas categorias, em ordem alfabética
+
+    Com as categorias iguais dos dois lados, os joins e groupbys do motor
+    comparam só os códigos inteiros. Altera os DataFrames no lugar.
+    """
+    for coluna in colunas:
+        categorias = sorted(set().union(*(df[coluna].cat.categories for df in dfs)))
+        for df in dfs:
+            df[coluna] = df[coluna].cat.set_categories(categorias)
+
+
+def iterar_blocos_excel(arquivo, colunas, linha_cabecalho=0, tamanho_bloco=TAMANHO_BLOCO):
+    """Percorre a primeira aba da planilha devolvendo DataFrames de até tamanho_bloco linhas
+
+    Usa o openpyxl em modo somente leitura, que não monta a árvore inteira
+    da planilha na memória.
+    """
+    workbook = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        linhas = workbook.worksheets[0].iter_rows(values_only=True)
+        for _ in range(linha_cabecalho):
+            next(linhas, None)
+
+        cabecalho = [str(c).strip() if c is not None else '' for c in next(linhas, ())]
+        faltando = [c for c in colunas if c not in cabecalho]
+        if faltando:
+            raise ValueError(f"Colunas não encontradas na planilha: {faltando}")
+        posicoes = [cabecalho.index(c) for c in colunas]
+
+        bloco = []
+        for linha in linhas:
+            if linha is None or all(v is None for v in linha):
+                continue
+            bloco.append([linha[i] if i < len(linha) else None for i in posicoes])
+            if len(bloco) >= tamanho_bloco:
+                yield pd.DataFrame(bloco, columns=colunas)
+                bloco = []
+        if bloco:
+            yield pd.DataFrame(bloco, columns=colunas)
+    finally:
+        workbook.close()
+
+
+def extensao(arquivo):
+    return os.path.splitext(str(arquivo))[1].lower()
+
+
+def abrir_csv(arquivo, colunas, **kwargs):
+    """pd.read_csv no padrão brasileiro, só com as colunas pedidas e tudo como texto
+
+    O cabeçalho é procurado nas primeiras linhas (o relatório do TOTVS pode
+    vir com uma linha de título) e o encoding cai para latin-1 quando o
+    arquivo não é UTF-8. Valores e datas são convertidos depois, pelas mesmas
+    regras usadas para o Excel.
+    """
+    for encoding in ENCODINGS_CSV:
+        try:
+            with open(arquivo, encoding=encoding) as f:
+                primeiras = [f.readline() for _ in range(10)]
+            break
+        except UnicodeDecodeError:
+            continue
+
+    linha_cabecalho = 0
+    for i, linha in enumerate(primeiras):
+        nomes = [c.strip().strip('"') for c in linha.rstrip('\r\n').split(SEPARADOR_CSV)]
+        if all(c in nomes for c in colunas):
+            linha_cabecalho = i
+            break
+
+    return pd.read_csv(
+        arquivo,
+        sep=SEPARADOR_CSV,
+        skiprows=linha_cabecalho,
+        usecols=colunas,
+        dtype=str,
+        encoding=encoding,
+        skipinitialspace=True,
+        **kwargs
+    )
+
+
+def ler_tabela(arquivo, colunas, linha_cabecalho=0):
+    """Lê apenas as colunas pedidas de um Excel, CSV ou Parquet"""
+    if extensao(arquivo) == '.csv':
+        return abrir_csv(arquivo, colunas)
+    if extensao(arquivo) == '.parquet':
+        return pd.read_parquet(arquivo, columns=colunas)
+    return pd.read_excel(arquivo, usecols=colunas, header=linha_cabecalho)
+
+
+def iterar_blocos_parquet(arquivo, colunas, tamanho_bloco=TAMANHO_BLOCO):
+    import pyarrow.parquet as pq
+
+    with pq.ParquetFile(arquivo) as parquet:
+        for lote in parquet.iter_batches(batch_size=tamanho_bloco, columns=colunas):
+            yield lote.to_pandas()
+
+
+def iterar_blocos(arquivo, colunas, linha_cabecalho=0, tamanho_bloco=TAMANHO_BLOCO):
+    """Percorre o arquivo devolvendo DataFrames de até tamanho_bloco linhas"""
+    if extensao(arquivo) == '.csv':
+        with abrir_csv(arquivo, colunas, chunksize=tamanho_bloco) as leitor:
+            yield from leitor
+    elif extensao(arquivo) == '.parquet':
+        yield from iterar_blocos_parquet(arquivo, colunas, tamanho_bloco)
+    else:
+        yield from iterar_blocos_excel(arquivo, colunas, linha_cabecalho, tamanho_bloco)
+
+
+def blocos_operadora(arquivo, dayfirst=True, tamanho_bloco=TAMANHO_BLOCO):
+    """Percorre a planilha da Operadora devolvendo blocos já normalizados"""
+    for bloco in iterar_blocos(arquivo, COLUNAS_OPERADORA, tamanho_bloco=tamanho_bloco):
+        yield normalizar_operadora(bloco, dayfirst)
+
+
+def blocos_totvs(arquivo, codigo_bandeira_map, tamanho_bloco=TAMANHO_BLOCO, separar_adquirentes=False):
+    """Percorre a planilha do TOTVS devolvendo blocos já normalizados"""
+    mapa_compilado = normalizacao.compilar_mapa_codigos(codigo_bandeira_map)
+    for bloco in iterar_blocos(arquivo, COLUNAS_TOTVS, LINHA_CABECALHO_TOTVS, tamanho_bloco):
+        yield normalizar_totvs(bloco, mapa_compilado, separar_adquirentes)
+
+
+def juntar_blocos(blocos, limite_memoria_mb=LIMITE_MEMORIA_MB, cancelar=None, categoricas=('Bandeira', 'Tipo')):
+    """Concatena blocos normalizados, respeitando um teto de memória
+
+    As colunas categoricas (Bandeira, Tipo e, se houver, Adquirente)
+    continuam categóricas: as categorias de todos os blocos são unidas em vez
+    de virarem texto solto na concatenação. O evento cancelar é conferido a
+    cada bloco lido.
+    """
+    normalizados = []
+    memoria = 0
+    limite = limite_memoria_mb * 1024 * 1024
+    for bloco in blocos:
+        verificar_cancelamento(cancelar)
+        memoria += bloco.memory_usage(index=False, deep=True).sum()
+        if memoria > limite:
+            raise MemoryError(
+                f"Os dados normalizados passaram do limite de {limite_memoria_mb} MB; "
+                "aumente o limite ou divida o arquivo"
+            )
+        normalizados.append(bloco)
+
+    colunas = ['Data', 'Bandeira', 'Tipo', 'Valor'] + [c for c in categoricas if c not in ('Bandeira', 'Tipo')]
+    if not normalizados:
+        vazio = {coluna: pd.Categorical([]) for coluna in colunas}
+        vazio.update(Data=pd.Series([], dtype='datetime64[ns]'), Valor=pd.Series([], dtype='int64'))
+        return pd.DataFrame(vazio, columns=colunas)
+
+    df = pd.DataFrame({
+        coluna: union_categoricals([b[coluna].astype('category') for b in normalizados], sort_categories=True)
+        if coluna in categoricas
+        else pd.concat([b[coluna] for b in normalizados], ignore_index=True)
+        for coluna in colunas
+    })
+    return df
+
+
+def ler_com_cache(arquivo, parametros, usar_cache, ler, compacto=False):
+    """Executa ler() ou reaproveita o resultado guardado para o mesmo conteúdo e parâmetros
+
+    Quando o resultado vem do cache, df.attrs['cache'] fica True. Com
+    compacto=True o DataFrame sai sem finalizar (Data ainda em datetime64).
+    """
+    if not usar_cache:
+        df = ler()
+    else:
+        hash_conteudo = cache.hash_arquivo(arquivo)
+        chave = cache.chave_entrada(hash_conteudo, dict(parametros, versao=VERSAO_LEITURA))
+        df = cache.carregar(chave)
+        if df is not None:
+            df.attrs['cache'] = True
+        else:
+            df = ler()
+            # O cache é só um atalho: falhar ao gravar não falha a leitura
+            try:
+                cache.salvar(chave, df, hash_conteudo)
+            except OSError:
+                pass
+
+    return df if compacto else finalizar(df)
+
+
+def ler_operadora(arquivo, dayfirst=True, em_blocos=False, tamanho_bloco=TAMANHO_BLOCO,
+                  limite_memoria_mb=LIMITE_MEMORIA_MB, usar_cache=False, cancelar=None, compacto=False):
+    """Lê e normaliza a planilha da Operadora (Excel, CSV ou Parquet)"""
+    def ler():
+        if not em_blocos:
+            return normalizar_operadora(ler_tabela(arquivo, COLUNAS_OPERADORA), dayfirst)
+        return juntar_blocos(blocos_operadora(arquivo, dayfirst, tamanho_bloco), limite_memoria_mb, cancelar)
+
+    parametros = {'entrada': 'operadora', 'dayfirst': dayfirst}
+    return ler_com_cache(arquivo, parametros, usar_cache, ler, compacto)
+
+
+def ler_totvs(arquivo, codigo_bandeira_map, em_blocos=False, tamanho_bloco=TAMANHO_BLOCO,
+              limite_memoria_mb=LIMITE_MEMORIA_MB, usar_cache=False, cancelar=None, compacto=False,
+              separar_adquirentes=False):
+    """Lê a planilha do TOTVS e classifica cada lançamento pelo código do cliente
+
+    separar_adquirentes=True acrescenta a coluna Adquirente (ver normalizar_totvs).
+    """
+    def ler():
+        if not em_blocos:
+            df = ler_tabela(arquivo, COLUNAS_TOTVS, LINHA_CABECALHO_TOTVS)
+            mapa_compilado = normalizacao.compilar_mapa_codigos(codigo_bandeira_map)
+            return normalizar_totvs(df, mapa_compilado, separar_adquirentes)
+        blocos = blocos_totvs(arquivo, codigo_bandeira_map, tamanho_bloco, separar_adquirentes)
+        categoricas = ('Bandeira', 'Tipo', 'Adquirente') if separar_adquirentes else ('Bandeira', 'Tipo')
+        return juntar_blocos(blocos, limite_memoria_mb, cancelar, categoricas)
+
+    # O mapa de códigos faz parte da chave: mudou o mapa, muda a classificação
+    parametros = {'entrada': 'totvs', 'mapa': codigo_bandeira_map}
+    if separar_adquirentes:
+        parametros['separar_adquirentes'] = True
+    return ler_com_cache(arquivo, parametros, usar_cache, ler, compacto)
+
+
+def ler_em_paralelo(leituras, cancelar=None, paralelo=True):
+    """Executa várias leituras, em paralelo por padrão (um processo para cada arquivo)
+
+    leituras é {nome: (funcao, args, kwargs)}, com funcao sendo ler_operadora
+    ou ler_totvs. Os processos devolvem os DataFrames compactos (Data em
+    datetime64, Bandeira/Tipo categóricos, Valor em centavos), que só são
+    finalizados aqui. Retorna {nome: (df, erro)}, com erro sendo a exceção
+    levantada na leitura (ou None); os DataFrames lidos saem com as mesmas
+    categorias de Bandeira e Tipo (ver compartilhar_categorias). Se o evento
+    cancelar for marcado durante a leitura, os processos são encerrados e
+    sobe Cancelado.
+
+    paralelo=False lê um arquivo depois do outro no próprio processo, para
+    quem já roda dentro de um pool (ex: processamento em lote).
+    """
+    resultados = {}
+    if not paralelo:
+        for nome, (ler, args, kwargs) in leituras.items():
+            try:
+                resultados[nome] = (ler(*args, cancelar=cancelar, **kwargs), None)
+            except Cancelado:
+                raise
+            except Exception as e:
+                resultados[nome] = (None, e)
+    else:
+        resultados = ler_no_pool(leituras, cancelar)
+
+    compartilhar_categorias([df for df, erro in resultados.values() if erro is None])
+    return resultados
+
+
+def ler_no_pool(leituras, cancelar=None):
+    """ler_em_paralelo com um processo para cada arquivo"""
+    resultados = {}
+    with multiprocessing.Pool(processes=len(leituras)) as pool:
+        pendentes = {
+            nome: pool.apply_async(ler, args, dict(kwargs, compacto=True))
+            for nome, (ler, args, kwargs) in leituras.items()
+        }
+        for pendente in pendentes.values():
+            while not pendente.ready():
+                if cancelar is not None and cancelar.is_set():
+                    pool.terminate()
+                    raise Cancelado("Processamento cancelado pelo usuário")
+                pendente.wait(0.1)
+
+        for nome, pendente in pendentes.items():
+            try:
+                resultados[nome] = (finalizar(pendente.get()), None)
+            except Exception as e:
+                resultados[nome] = (None, e)
+    return resultados
+
+
+def ler_entradas(arquivo_operadora, arquivo_totvs, codigo_bandeira_map, dayfirst=True,
+                 em_blocos=False, usar_cache=False, cancelar=None, paralelo=True):
+    """Lê a Operadora e o TOTVS ao mesmo tempo; retorna {'operadora': (df, erro), 'totvs': (df, erro)}"""
+    opcoes = {'em_blocos': em_blocos, 'usar_cache': usar_cache}
+    leituras = {
+        'operadora': (ler_operadora, (arquivo_operadora, dayfirst), opcoes),
+        'totvs': (ler_totvs, (arquivo_totvs, codigo_bandeira_map), opcoes),
+    }
+    return ler_em_paralelo(leituras, cancelar, paralelo)
@@ -0,0 +1,214 @@
+"""Conciliação em lote, sem interface gráfica: várias lojas de uma vez, em paralelo.
+
+Cada trabalho é um trio (operadora, TOTVS, saída). Os trios vêm de um
+manifesto CSV (separador ';', colunas operadora;totvs;saida e, opcionalmente,
+comparador;modo) ou de uma pasta com uma subpasta por loja:
+
+    python -m conciliacao.lote --manifesto lojas.csv
+    python -m conciliacao.lote --pasta exportacoes/ --comparador pagseguro
+
+No modo pasta, cada subpasta precisa ter exatamente um arquivo que case com
+--padrao-operadora e um com --padrao-totvs; o resultado vai para
+<subpasta>/<nome>.xlsx, ou para <saida>/<loja>.xlsx com --saida. Caminhos
+relativos do manifesto partem da pasta do próprio manifesto.
+
+Os trabalhos são distribuídos num pool de processos. O código de saída é 0
+quando todos terminam bem e 1 quando algum falha ou é ignorado.
+"""
+import argparse
+import csv
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from conciliacao import leitura, motor, pipeline
+from conciliacao.planilha import DIVISOES
+
+
+def trabalhos_do_manifesto(manifesto, comparador, modo):
+    """Lê os trios do manifesto; comparador e modo valem para as linhas que não os informam"""
+    base = os.path.dirname(os.path.abspath(manifesto))
+
+    def caminho(valor):
+        return os.path.join(base, valor.strip())
+
+    trabalhos = []
+    with open(manifesto, encoding='utf-8-sig', newline='') as f:
+        for linha in csv.DictReader(f, delimiter=leitura.SEPARADOR_CSV):
+            saida = caminho(linha['saida'])
+            trabalhos.append({
+                'nome': os.path.splitext(os.path.basename(saida))[0],
+                'arquivo_operadora': caminho(linha['operadora']),
+                'arquivo_totvs': caminho(linha['totvs']),
+                'resultado_path': saida,
+                'comparador': (linha.get('comparador') or comparador).strip().lower(),
+                'modo': (linha.get('modo') or modo).strip().lower(),
+            })
+    return trabalhos
+
+
+def trabalhos_da_pasta(pasta, comparador, modo, padrao_operadora, padrao_totvs, nome, saida=None):
+    """Monta um trabalho por subpasta; devolve (trabalhos, problemas)"""
+    trabalhos = []
+    problemas = []
+    for loja in sorted((e for e in os.scandir(pasta) if e.is_dir()), key=lambda e: e.name):
+        operadora = glob.glob(os.path.join(loja.path, padrao_operadora))
+        totvs = glob.glob(os.path.join(loja.path, padrao_totvs))
+        if len(operadora) != 1 or len(totvs) != 1:
+            problemas.append(
+                f"{loja.name}: esperado 1 arquivo da operadora e 1 do TOTVS, "
+                f"encontrados {len(operadora)} e {len(totvs)}"
+            )
+            continue
+
+        if saida:
+            resultado_path = os.path.join(saida, f'{loja.name}.xlsx')
+        else:
+            resultado_path = os.path.join(loja.path, f'{nome}.xlsx')
+        trabalhos.append({
+            'nome': loja.name,
+            'arquivo_operadora': operadora[0],
+            'arquivo_totvs': totvs[0],
+            'resultado_path': resultado_path,
+            'comparador': comparador,
+            'modo': modo,
+        })
+    return trabalhos, problemas
+
+
+def executar_trabalho(trabalho, em_blocos=False, usar_cache=True, opcoes_extras=None):
+    """Roda uma conciliação num processo do pool; devolve (trabalho, estatísticas, erro, segundos)
+
+    opcoes_extras vai para o pipeline junto com o trabalho (entradas, divisao, pareamento...).
+    """
+    inicio = time.perf_counter()
+    erros_leitura = []
+    do_cache = []
+
+    def avisar(etapa, **dados):
+        if etapa == 'cache_encontrado':
+            do_cache.append(True)
+        elif etapa.endswith('_erro'):
+            erros_leitura.append(f"{etapa[:-len('_erro')]}: {dados['erro']}")
+
+    opcoes = dict(trabalho, em_blocos=em_blocos, usar_cache=usar_cache, **(opcoes_extras or {}))
+    # Com --saida todas as lojas caem na mesma pasta: cada uma tem a sua base incremental
+    opcoes['base_incremental'] = os.path.splitext(trabalho['resultado_path'])[0] + '.sqlite'
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(trabalho['resultado_path'])), exist_ok=True)
+        # Cada trabalho já ocupa um processo do pool: os dois arquivos são lidos em sequência
+        estatisticas = pipeline.executar(opcoes, trabalho['comparador'], avisar=avisar, paralelo=False)
+        erro = None if estatisticas is not None else '; '.join(erros_leitura)
+        if do_cache:
+            estatisticas = dict(estatisticas, cache=True)
+    except Exception as e:
+        estatisticas, erro = None, str(e) or type(e).__name__
+    return trabalho, estatisticas, erro, time.perf_counter() - inicio
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m conciliacao.lote', description="Concilia várias lojas de uma vez, sem interface")
+    origem = parser.add_mutually_exclusive_group(required=True)
+    origem.add_argument('--manifesto', help="CSV com as colunas operadora;totvs;saida[;comparador;modo]")
+    origem.add_argument('--pasta', help="pasta com uma subpasta por loja")
+    parser.add_argument('--comparador', choices=sorted(pipeline.COMPARADORES), default='cielo')
+    parser.add_argument('--modo', choices=pipeline.MODOS, default='detalhada')
+    parser.add_argument('--padrao-operadora', default='*operadora*', help="padrão do arquivo da operadora em cada subpasta")
+    parser.add_argument('--padrao-totvs', default='*totvs*', help="padrão do arquivo do TOTVS em cada subpasta")
+    parser.add_argument('--nome', default='resultado_final', help="nome do arquivo de resultado em cada subpasta")
+    parser.add_argument('--saida', help="pasta única para os resultados (um <loja>.xlsx por subpasta)")
+    parser.add_argument('--processos', type=int, default=0,
+                        help="processos em paralelo (0, o padrão: um por núcleo da máquina)")
+    parser.add_argument('--entradas', choices=pipeline.ENTRADAS, default='planilha',
+                        help="onde gravar as abas que repetem as entradas (padrão: na planilha)")
+    parser.add_argument('--divisao', choices=DIVISOES, default='mes',
+                        help="como dividir abas acima do limite de linhas do Excel (padrão: por mês)")
+    parser.add_argument('--tolerancia-centavos', type=int, default=0,
+                        help="pareia sobras com até esta diferença de valor, em centavos (só na detalhada)")
+    parser.add_argument('--janela-dias', type=int, default=0,
+                        help="pareia sobras com até esta diferença de data, em dias (só na detalhada)")
+    parser.add_argument('--somas', action='store_true',
+                        help="pareia lançamentos do TOTVS que somam várias vendas da operadora (só na detalhada)")
+    parser.add_argument('--somas-max-itens', type=int, default=motor.MAX_ITENS_SOMA,
+                        help="na busca de somas, pula grupos com mais sobras da operadora que isto")
+    parser.add_argument('--somas-tempo', type=float, default=motor.TEMPO_LIMITE_SOMAS,
+                        help="segundos máximos gastos na busca de somas por conciliação")
+    parser.add_argument('--incremental', action='store_true',
+                        help="só recompara os grupos que mudaram desde a última execução (base SQLite na pasta de cada saída)")
+    parser.add_argument('--motor', choices=pipeline.MOTORES, default='pandas',
+                        help="onde a comparação roda; 'duckdb' usa um banco em disco, para arquivos maiores que a memória")
+    parser.add_argument('--em-blocos', action='store_true', help="lê os arquivos em blocos (menos memória)")
+    parser.add_argument('--sem-cache', action='store_true', help="não usa nem grava o cache")
+    args = parser.parse_args(argv)
+    if args.tolerancia_centavos < 0 or args.janela_dias < 0:
+        parser.error("--tolerancia-centavos e --janela-dias não podem ser negativos")
+    if args.somas_max_itens < 2 or args.somas_tempo <= 0:
+        parser.error("--somas-max-itens precisa ser ao menos 2 e --somas-tempo maior que zero")
+    if args.incremental and args.motor == 'duckdb':
+        parser.error("--incremental não funciona com --motor duckdb")
+    if args.processos < 0:
+        parser.error("--processos não pode ser negativo")
+    processos = args.processos or os.cpu_count() or 1
+
+    problemas = []
+    if args.manifesto:
+        trabalhos = trabalhos_do_manifesto(args.manifesto, args.comparador, args.modo)
+    else:
+        trabalhos, problemas = trabalhos_da_pasta(
+            args.pasta, args.comparador, args.modo, args.padrao_operadora, args.padrao_totvs, args.nome, args.saida
+        )
+
+    validos = []
+    for trabalho in trabalhos:
+        if trabalho['comparador'] in pipeline.COMPARADORES and trabalho['modo'] in pipeline.MODOS:
+            validos.append(trabalho)
+        else:
+            problemas.append(f"{trabalho['nome']}: comparador '{trabalho['comparador']}' ou modo '{trabalho['modo']}' inválido")
+    trabalhos = validos
+
+    for problema in problemas:
+        print(f"IGNORADO  {problema}")
+    if not trabalhos:
+        print("Nenhum trabalho para processar")
+        return 1
+
+    opcoes_extras = {
+        'entradas': args.entradas,
+        'divisao': args.divisao,
+        'tolerancia_centavos': args.tolerancia_centavos,
+        'janela_dias': args.janela_dias,
+        'somas': args.somas,
+        'max_itens_soma': args.somas_max_itens,
+        'tempo_limite_somas': args.somas_tempo,
+        'incremental': args.incremental,
+        'motor': args.motor,
+    }
+    print(f"{len(trabalhos)} trabalho(s) em até {processos} processo(s)")
+    inicio = time.perf_counter()
+    falhas = 0
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        futuros = [
+            pool.submit(executar_trabalho, t, args.em_blocos, not args.sem_cache, opcoes_extras)
+            for t in trabalhos
+        ]
+        for futuro in as_completed(futuros):
+            trabalho, estatisticas, erro, segundos = futuro.result()
+            if erro is not None:
+                falhas += 1
+                print(f"ERRO  {trabalho['nome']}  {segundos:.1f}s  {erro}")
+            else:
+                origem = " (cache)" if estatisticas.get('cache') else ""
+                print(
+                    f"OK    {trabalho['nome']}  {segundos:.1f}s{origem}  "
+                    f"{estatisticas['com_diferencas']} combinação(ões) com diferença -> {trabalho['resultado_path']}"
+                )
+
+    total = time.perf_counter() - inicio
+    print(f"\n{len(trabalhos) - falhas} ok, {falhas} com erro, {len(problemas)} ignorado(s) em {total:.1f}s")
+    return 1 if falhas or problemas else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,466 @@
+"""Motor de conciliação valor a valor entre a Operadora e o TOTVS."""
+import time
+
+import numpy as np
+import pandas as pd
+
+from conciliacao import calendario, dinheiro
+from conciliacao.execucao import verificar_cancelamento
+
+CHAVE = ['Data', 'Bandeira', 'Tipo']
+
+# Aumente sempre que a planilha de resultado mudar, para invalidar o cache de resultados
+VERSAO_RESULTADO = 2
+
+# Limites do pareamento por soma: itens da Operadora por (Data, Bandeira, Tipo)
+# e tempo total, para que um dia patológico não trave a execução
+MAX_ITENS_SOMA = 24
+TEMPO_LIMITE_SOMAS = 30.0
+
+# Rótulos de saída de cada comparador
+LAYOUT_CIELO = {
+    'a_mais': 'A_Mais_Sistema',
+    'a_menos': 'A_Menos_Sistema',
+    'obs_a_mais': 'Valor lançado no Sistema mas não encontrado na Operadora',
+    'obs_a_menos': 'Valor na Operadora mas não lançado no Sistema',
+    'ordenar_valores': False,
+    'valores_a_mais': 'Valores_A_Mais_Sistema',
+    'valores_a_menos': 'Valores_A_Menos_Sistema',
+    'texto_a_mais': ' A MAIS no Sistema: ',
+    'texto_a_menos': ' A MENOS no Sistema (falta lançar): ',
+    'desc_a_mais': 'Lançado no Sistema, não encontrado na Operadora',
+    'desc_a_menos': 'Encontrado na Operadora, não lançado no Sistema',
+}
+
+LAYOUT_PAGSEGURO = {
+    'a_mais': 'A_Mais',
+    'a_menos': 'A_Menos',
+    'obs_a_mais': None,
+    'obs_a_menos': None,
+    'ordenar_valores': True,
+    'valores_a_mais': 'Valores_A_Mais',
+    'valores_a_menos': 'Valores_A_Menos',
+    'texto_a_mais': ' a mais : ',
+    'texto_a_menos': ' a menos : ',
+    'desc_a_mais': None,
+    'desc_a_menos': None,
+}
+
+
+def numerar_ocorrencias(df):
+    """Numera as repetições de cada valor dentro de (Data, Bandeira, Tipo)
+
+    O primeiro 10,00 de um grupo recebe ocorrência 0, o segundo 1 e assim por
+    diante, de modo que pares iguais dos dois lados compartilham a mesma chave.
+    """
+    df = df[CHAVE + ['Valor']].dropna(subset=CHAVE).copy()
+    df['Posicao'] = np.arange(len(df))
+    df['Ocorrencia'] = df.groupby(CHAVE + ['Valor'], sort=False).cumcount()
+    return df
+
+
+def gerar_comparacao_detalhada(df_totvs, df_operadora, layout=LAYOUT_CIELO, cancelar=None):
+    """Lista os valores a mais e a menos no Sistema para cada (Data, Bandeira, Tipo)
+
+    Os dois lados são unidos num único outer join por (Data, Bandeira, Tipo,
+    Valor, Ocorrencia): o que só existe no TOTVS é "a mais" e o que só existe
+    na Operadora é "a menos". O evento cancelar é conferido entre as etapas.
+    """
+    sistema = numerar_ocorrencias(df_totvs)
+    operadora = numerar_ocorrencias(df_operadora)
+    verificar_cancelamento(cancelar)
+
+    pares = sistema.merge(
+        operadora,
+        on=CHAVE + ['Valor', 'Ocorrencia'],
+        how='outer',
+        suffixes=('_Sistema', '_Operadora'),
+        indicator=True,
+    )
+    verificar_cancelamento(cancelar)
+    diferencas = pares[pares['_merge'] != 'both'].copy()
+    do_sistema = diferencas['_merge'] == 'left_only'
+
+    # Dentro de cada grupo: TOTVS antes da Operadora, na ordem de leitura.
+    # O comparador PagSeguro sempre listou primeiro o que falta lançar, em ordem de valor.
+    diferencas['Posicao'] = diferencas['Posicao_Sistema'].fillna(diferencas['Posicao_Operadora'])
+    if layout['ordenar_valores']:
+        diferencas['Lado'] = np.where(do_sistema, 1, 0)
+        ordem = CHAVE + ['Lado', 'Valor', 'Posicao']
+    else:
+        diferencas['Lado'] = np.where(do_sistema, 0, 1)
+        ordem = CHAVE + ['Lado', 'Posicao']
+    diferencas = diferencas.sort_values(ordem, kind='mergesort')
+    verificar_cancelamento(cancelar)
+    return montar_detalhe(
+        diferencas['Data'].array,
+        diferencas['Bandeira'].to_numpy(),
+        diferencas['Tipo'].to_numpy(),
+        (diferencas['_merge'] == 'left_only').to_numpy(),
+        diferencas['Valor'].to_numpy(dtype=np.int64),
+        layout
+    )
+
+
+def montar_detalhe(datas, bandeiras, tipos, eh_a_mais, valores, layout=LAYOUT_CIELO):
+    """Monta as colunas da comparação detalhada a partir do lado (a mais ou a menos) e do valor de cada sobra"""
+    texto = dinheiro.formatar_centavos(valores)
+    df_result = pd.DataFrame({
+        'Data': datas,
+        'Bandeira': bandeiras,
+        'Tipo': tipos,
+        layout['a_mais']: np.where(eh_a_mais, texto, ''),
+        layout['a_menos']: np.where(eh_a_mais, '', texto),
+        'Valor_Sistema': np.where(eh_a_mais, valores, 0),
+        'Valor_Operadora': np.where(eh_a_mais, 0, valores),
+    })
+    if layout['obs_a_mais']:
+        df_result['Observação'] = np.where(eh_a_mais, layout['obs_a_mais'], layout['obs_a_menos'])
+    return df_result
+
+
+def parear_chaves(chaves_a, chaves_b):
+    """Pareia as posições de a e b (ambos ordenados) que têm a mesma chave, por ordem de ocorrência
+
+    A primeira ocorrência de uma chave em a fica com a primeira em b, a
+    segunda com a segunda e assim por diante; cada chave de a é localizada em
+    b com searchsorted. Retorna (posições em a, posições em b).
+    """
+    ocorrencia = np.arange(len(chaves_a)) - np.searchsorted(chaves_a, chaves_a, side='left')
+    inicio = np.searchsorted(chaves_b, chaves_a, side='left') + ocorrencia
+    tem_par = inicio < np.searchsorted(chaves_b, chaves_a, side='right')
+    return np.flatnonzero(tem_par), inicio[tem_par]
+
+
+def deslocamentos(tolerancia_centavos, janela_dias):
+    """(dias, centavos) a testar, do mais próximo ao mais distante, começando pelo (0, 0)"""
+    return sorted(
+        ((dias, centavos)
+         for dias in range(-janela_dias, janela_dias + 1)
+         for centavos in range(-tolerancia_centavos, tolerancia_centavos + 1)),
+        key=lambda d: (abs(d[0]), abs(d[1]), d[0], d[1])
+    )
+
+
+def parear_aproximados(resultado_detalhado, layout=LAYOUT_CIELO, tolerancia_centavos=0, janela_dias=0):
+    """Segunda passada sobre as sobras do pareamento exato: aceita diferenças pequenas de valor e data
+
+    Um valor a mais no Sistema e um a menos da mesma Bandeira e Tipo formam
+    um par quando diferem em até tolerancia_centavos e até janela_dias dias
+    (ex: venda lançada no TOTVS no dia seguinte, ou um centavo de
+    arredondamento). Cada deslocamento (dias, centavos) é um pareamento exato
+    sobre arrays ordenados, do mais próximo ao mais distante, então o custo
+    fica O(n log n) por Bandeira/Tipo. Espera o detalhe com a Data ainda em
+    dias (ver calendario). Retorna (detalhe sem os pares, DataFrame dos pares).
+    """
+    colunas_pares = ['Bandeira', 'Tipo', 'Data_Sistema', 'Data_Operadora', 'Valor_Sistema',
+                     'Valor_Operadora', 'Diferença_Dias', 'Diferença_Valor']
+    if not (tolerancia_centavos or janela_dias) or resultado_detalhado.empty:
+        return resultado_detalhado, pd.DataFrame(columns=colunas_pares)
+
+    eh_a_mais = (resultado_detalhado[layout['a_mais']] != '').to_numpy()
+    dias = resultado_detalhado['Data'].to_numpy(dtype=np.int64)
+    valores = np.where(eh_a_mais, resultado_detalhado['Valor_Sistema'], resultado_detalhado['Valor_Operadora']).astype(np.int64)
+    grupos = resultado_detalhado.groupby(['Bandeira', 'Tipo'], sort=False, observed=True).ngroup().to_numpy()
+
+    # Chave única (grupo, dia, valor) em um int64, com folga para os deslocamentos
+    dias = dias - dias.min() + janela_dias
+    valores = valores - valores.min() + tolerancia_centavos
+    largura_valor = int(valores.max()) + tolerancia_centavos + 1
+    largura_grupo = (int(dias.max()) + janela_dias + 1) * largura_valor
+
+    # Deslocar todas as chaves pelo mesmo valor não muda a ordem: cada lado é
+    # ordenado uma vez só e cada passada apenas filtra os que ainda estão livres
+    sistema = np.flatnonzero(eh_a_mais)
+    operadora = np.flatnonzero(~eh_a_mais)
+    chaves_sistema = grupos[sistema] * largura_grupo + dias[sistema] * largura_valor + valores[sistema]
+    chaves_operadora = grupos[operadora] * largura_grupo + dias[operadora] * largura_valor + valores[operadora]
+    ordem = np.argsort(chaves_sistema, kind='stable')
+    sistema, chaves_sistema = sistema[ordem], chaves_sistema[ordem]
+    ordem = np.argsort(chaves_operadora, kind='stable')
+    operadora, chaves_operadora = operadora[ordem], chaves_operadora[ordem]
+
+    livres_sistema = np.ones(len(sistema), dtype=bool)
+    livres_operadora = np.ones(len(operadora), dtype=bool)
+    pares = []
+    for desloc_dias, desloc_centavos in deslocamentos(tolerancia_centavos, janela_dias):
+        indices_sistema = np.flatnonzero(livres_sistema)
+        indices_operadora = np.flatnonzero(livres_operadora)
+        if not len(indices_sistema) or not len(indices_operadora):
+            break
+        deslocamento = desloc_dias * largura_valor + desloc_centavos
+        em_s, em_o = parear_chaves(chaves_sistema[indices_sistema] - deslocamento, chaves_operadora[indices_operadora])
+        livres_sistema[indices_sistema[em_s]] = False
+        livres_operadora[indices_operadora[em_o]] = False
+        pares.append((sistema[indices_sistema[em_s]], operadora[indices_operadora[em_o]]))
+
+    linhas_sistema = np.concatenate([p[0] for p in pares]) if pares else np.array([], dtype=np.int64)
+    linhas_operadora = np.concatenate([p[1] for p in pares]) if pares else np.array([], dtype=np.int64)
+    do_sistema = resultado_detalhado.iloc[linhas_sistema]
+    da_operadora = resultado_detalhado.iloc[linhas_operadora]
+    df_pares = pd.DataFrame({
+        'Bandeira': do_sistema['Bandeira'].to_numpy(),
+        'Tipo': do_sistema['Tipo'].to_numpy(),
+        'Data_Sistema': do_sistema['Data'].array,
+        'Data_Operadora': da_operadora['Data'].array,
+        'Valor_Sistema': do_sistema['Valor_Sistema'].to_numpy(),
+        'Valor_Operadora': da_operadora['Valor_Operadora'].to_numpy(),
+        'Diferença_Dias': do_sistema['Data'].to_numpy(dtype=np.int64) - da_operadora['Data'].to_numpy(dtype=np.int64),
+        'Diferença_Valor': do_sistema['Valor_Sistema'].to_numpy() - da_operadora['Valor_Operadora'].to_numpy(),
+    }, columns=colunas_pares)
+    df_pares = df_pares.sort_values(['Data_Sistema', 'Bandeira', 'Tipo'], kind='mergesort').reset_index(drop=True)
+
+    pareadas = np.zeros(len(resultado_detalhado), dtype=bool)
+    pareadas[linhas_sistema] = True
+    pareadas[linhas_operadora] = True
+    return resultado_detalhado[~pareadas].reset_index(drop=True), df_pares
+
+
+def somas_dos_subconjuntos(valores):
+    """Soma e quantidade de itens de cada subconjunto de valores; o subconjunto i é a máscara de bits i"""
+    mascaras = np.arange(1 << len(valores), dtype=np.int64)
+    bits = (mascaras[:, None] >> np.arange(len(valores))) & 1
+    return bits @ valores, bits.sum(axis=1)
+
+
+def subconjunto_com_soma(valores, alvo):
+    """Posições do menor subconjunto (2 itens ou mais) de valores que soma exatamente alvo, ou None
+
+    Meet-in-the-middle: as somas de cada metade são enumeradas (2^(n/2)
+    cada), a segunda metade é ordenada e o complemento de cada soma da
+    primeira é procurado nela com searchsorted.
+    """
+    meio = len(valores) // 2
+    somas_a, itens_a = somas_dos_subconjuntos(valores[:meio])
+    somas_b, itens_b = somas_dos_subconjuntos(valores[meio:])
+
+    # Soma e itens da segunda metade numa chave só, ordenada por soma e,
+    # entre somas iguais, por itens; para cada máscara da primeira metade
+    # procura a soma que falta com os itens que faltam para chegar a 2
+    largura = len(valores) - meio + 1
+    chaves_b = somas_b * largura + itens_b
+    ordem_b = np.argsort(chaves_b, kind='stable')
+    chaves_b = chaves_b[ordem_b]
+    faltam = alvo - somas_a
+    posicoes = np.searchsorted(chaves_b, faltam * largura + np.maximum(2 - itens_a, 0))
+    achou = posicoes < len(chaves_b)
+    achou[achou] = chaves_b[posicoes[achou]] // largura == faltam[achou]
+    itens = np.where(achou, itens_a + chaves_b[np.minimum(posicoes, len(chaves_b) - 1)] % largura, len(valores) + 1)
+    mascara_a = int(np.argmin(itens))
+    if itens[mascara_a] > len(valores):
+        return None
+
+    mascara_b = int(ordem_b[posicoes[mascara_a]])
+    return ([i for i in range(meio) if mascara_a >> i & 1]
+            + [meio + i for i in range(len(valores) - meio) if mascara_b >> i & 1])
+
+
+def parear_somas(resultado_detalhado, layout=LAYOUT_CIELO, max_itens=MAX_ITENS_SOMA, tempo_limite=TEMPO_LIMITE_SOMAS):
+    """Acha lançamentos do TOTVS que são a soma de várias vendas da Operadora no mesmo grupo
+
+    Passada sobre as sobras do pareamento exato: dentro de cada (Data,
+    Bandeira, Tipo), cada valor a mais no Sistema, do maior para o menor,
+    procura um subconjunto dos valores a menos ainda livres que some
+    exatamente o mesmo (subconjunto_com_soma). Grupos com mais de max_itens
+    sobras da Operadora são pulados, e a passada para quando o tempo_limite
+    (segundos) se esgota. Espera o detalhe com a Data ainda em dias.
+
+    Retorna (detalhe sem os valores pareados, DataFrame das somas, grupos
+    pulados). Cada soma recebe um rótulo ("Soma 1", "Soma 2"...) repetido no
+    lançamento do Sistema e nas vendas da Operadora que o compõem.
+    """
+    colunas_somas = ['Data', 'Bandeira', 'Tipo', 'Soma', 'Lado', 'Valor_Sistema', 'Valor_Operadora']
+    eh_a_mais = (resultado_detalhado[layout['a_mais']] != '').to_numpy()
+    valores = np.where(eh_a_mais, resultado_detalhado['Valor_Sistema'], resultado_detalhado['Valor_Operadora']).astype(np.int64)
+    limite = time.perf_counter() + tempo_limite
+
+    linhas = []
+    pareadas = np.zeros(len(resultado_detalhado), dtype=bool)
+    pulados = 0
+    # Só interessam os grupos com sobra dos dois lados
+    grupos = []
+    for posicoes in resultado_detalhado.groupby(CHAVE, sort=False, observed=True).indices.values():
+        sistema = posicoes[eh_a_mais[posicoes]]
+        operadora = posicoes[~eh_a_mais[posicoes]]
+        if len(sistema) and len(operadora) >= 2:
+            grupos.append((sistema, operadora))
+
+    for numero, (sistema, operadora) in enumerate(grupos):
+        if time.perf_counter() > limite:
+            pulados += len(grupos) - numero
+            break
+        if len(operadora) > max_itens:
+            pulados += 1
+            continue
+
+        livres = list(operadora)
+        for linha_sistema in sistema[np.argsort(-valores[sistema], kind='stable')]:
+            if len(livres) < 2:
+                break
+            escolhidas = subconjunto_com_soma(valores[livres], valores[linha_sistema])
+            if escolhidas is None:
+                continue
+            compostas = [livres[i] for i in escolhidas]
+            linhas.append((f"Soma {len(linhas) + 1}", linha_sistema, compostas))
+            livres = [p for p in livres if p not in compostas]
+            pareadas[linha_sistema] = True
+            pareadas[compostas] = True
+
+    registros = []
+    for rotulo, linha_sistema, compostas in linhas:
+        data, bandeira, tipo = (resultado_detalhado[c].iat[linha_sistema] for c in CHAVE)
+        registros.append((data, bandeira, tipo, rotulo, 'Sistema', int(valores[linha_sistema]), 0))
+        registros.extend((data, bandeira, tipo, rotulo, 'Operadora', 0, int(valores[p])) for p in compostas)
+    df_somas = pd.DataFrame(registros, columns=colunas_somas).astype({'Data': 'Int32'})
+    return resultado_detalhado[~pareadas].reset_index(drop=True), df_somas, pulados
+
+
+def combinacoes_distintas(*dfs):
+    """(Data, Bandeira, Tipo) distintos das entradas, com a data já em dd/mm/aaaa"""
+    combos = pd.concat([
+        df[CHAVE].drop_duplicates().astype({'Bandeira': object, 'Tipo': object}) for df in dfs
+    ])
+    combos = combos.dropna().drop_duplicates()
+    combos['Data'] = calendario.formatar_dias(combos['Data'])
+    return combos.drop_duplicates()
+
+
+def juntar_valores(coluna):
+    """Junta por '/' os valores não vazios de cada grupo do detalhe"""
+    preenchidos = coluna[coluna != '']
+    return preenchidos.groupby([preenchidos.index.get_level_values(c) for c in CHAVE]).agg('/'.join)
+
+
+def totais_do_detalhe(resultado_detalhado, layout=LAYOUT_CIELO):
+    """Totais e valores a mais/a menos (juntos por '/') de cada (Data, Bandeira, Tipo) do detalhe"""
+    detalhe = resultado_detalhado.astype({'Bandeira': object, 'Tipo': object}).set_index(CHAVE)
+    totais = detalhe.groupby(level=CHAVE)[['Valor_Sistema', 'Valor_Operadora']].sum()
+    totais.columns = ['Total_Sistema', 'Total_Operadora']
+    totais[layout['valores_a_mais']] = juntar_valores(detalhe[layout['a_mais']])
+    totais[layout['valores_a_menos']] = juntar_valores(detalhe[layout['a_menos']])
+    return totais.reset_index()
+
+
+def gerar_resumo(df_totvs, df_operadora, resultado_detalhado, layout=LAYOUT_CIELO):
+    """Uma linha por (Data, Bandeira, Tipo) das entradas com o total das diferenças
+
+    Espera o resultado detalhado com a Data já formatada como dd/mm/aaaa. Os
+    totais e as listas de valores saem de um único groupby sobre o detalhe,
+    que é então unido às combinações distintas das duas entradas.
+    """
+    return montar_resumo(
+        combinacoes_distintas(df_totvs, df_operadora), totais_do_detalhe(resultado_detalhado, layout), layout
+    )
+
+
+def montar_resumo(combinacoes, totais, layout=LAYOUT_CIELO):
+    """Monta o resumo a partir das combinações distintas das entradas e dos totais do detalhe
+
+    Os dois vêm com a Data em dd/mm/aaaa; combinações sem diferença ficam
+    com total zero e Status OK.
+    """
+    df_resumo = combinacoes.merge(totais, on=CHAVE, how='outer')
+    df_resumo = df_resumo.sort_values(CHAVE).reset_index(drop=True)
+    data, bandeira, tipo = (df_resumo[coluna].astype(object) for coluna in CHAVE)
+
+    valores_a_mais = df_resumo[layout['valores_a_mais']].fillna('').astype(object)
+    valores_a_menos = df_resumo[layout['valores_a_menos']].fillna('').astype(object)
+    total_sistema = df_resumo['Total_Sistema'].fillna(0).astype(np.int64)
+    total_operadora = df_resumo['Total_Operadora'].fillna(0).astype(np.int64)
+    diferenca_total = total_sistema - total_operadora
+
+    tem_a_mais = valores_a_mais != ''
+    tem_a_menos = valores_a_menos != ''
+    resumo_texto = (
+        'dia ' + data + ' no ' + bandeira.str.lower() + ' ' + tipo + '\n'
+        + (layout['texto_a_mais'] + valores_a_mais + '\n').where(tem_a_mais, '')
+        + (layout['texto_a_menos'] + valores_a_menos + '\n').where(tem_a_menos, '')
+    )
+    tem_diferencas = (diferenca_total != 0) | tem_a_mais | tem_a_menos
+
+    return pd.DataFrame({
+        'Data': data,
+        'Bandeira': bandeira,
+        'Tipo': tipo,
+        'Resumo': resumo_texto,
+        layout['valores_a_mais']: valores_a_mais,
+        layout['valores_a_menos']: valores_a_menos,
+        'Total_Sistema': total_sistema,
+        'Total_Operadora': total_operadora,
+        'Diferença_Total': diferenca_total,
+        'Status': np.where(tem_diferencas, 'COM DIFERENÇA', 'OK'),
+    })
+
+
+def criar_resumo_organizado(resultado_detalhado, layout=LAYOUT_CIELO):
+    """Uma linha por diferença, com o lado indicado em Tipo_Diferença, para filtrar no Excel"""
+    col_a_mais = layout['a_mais']
+    col_a_menos = layout['a_menos']
+    eh_a_mais = (resultado_detalhado[col_a_mais] != '').to_numpy()
+
+    df_organizado = pd.DataFrame({
+        'Data': resultado_detalhado['Data'],
+        'Bandeira': resultado_detalhado['Bandeira'],
+        'Tipo': resultado_detalhado['Tipo'],
+        'Valor': np.where(eh_a_mais, resultado_detalhado[col_a_mais], resultado_detalhado[col_a_menos]),
+        'Tipo_Diferença': np.where(eh_a_mais, 'A_Mais', 'A_Menos'),
+        'Valor_Sistema': resultado_detalhado['Valor_Sistema'],
+        'Valor_Operadora': resultado_detalhado['Valor_Operadora'],
+    })
+    if layout['desc_a_mais']:
+        df_organizado['Descrição'] = np.where(eh_a_mais, layout['desc_a_mais'], layout['desc_a_menos'])
+
+    df_organizado = df_organizado.sort_values(CHAVE + ['Tipo_Diferença'], kind='mergesort')
+    # Um dos dois lados é sempre zero, então a soma é o próprio valor da diferença
+    df_organizado['Valor_Numérico'] = df_organizado['Valor_Sistema'] + df_organizado['Valor_Operadora']
+    return df_organizado
+
+
+def contar_diferencas(resultado_detalhado, df_resumo, layout=LAYOUT_CIELO):
+    """Contadores do resumo estatístico da execução"""
+    return {
+        'a_mais': int((resultado_detalhado[layout['a_mais']] != '').sum()),
+        'a_menos': int((resultado_detalhado[layout['a_menos']] != '').sum()),
+        'sem_diferencas': int((df_resumo['Status'] == 'OK').sum()),
+        'com_diferencas': int((df_resumo['Status'] == 'COM DIFERENÇA').sum()),
+    }
+
+
+def totais_por_grupo(df):
+    """Soma e quantidade de valores por (Data, Bandeira, Tipo)"""
+    return df.groupby(CHAVE, observed=True)['Valor'].agg(['sum', 'count'])
+
+
+def gerar_comparacao_resumida(df_totvs, df_operadora):
+    """Compara apenas totais e quantidades por (Data, Bandeira, Tipo), sem parear valores"""
+    totais = totais_por_grupo(df_totvs).join(
+        totais_por_grupo(df_operadora), how='outer', lsuffix='_Sistema', rsuffix='_Operadora'
+    )
+    return montar_comparacao_resumida(totais.reset_index())
+
+
+def montar_comparacao_resumida(totais):
+    """Monta a comparação resumida a partir de sum/count de cada lado por (Data, Bandeira, Tipo)
+
+    Grupos que só existem de um lado vêm com o outro vazio (NaN).
+    """
+    colunas = ['count_Sistema', 'sum_Sistema', 'count_Operadora', 'sum_Operadora']
+    totais[colunas] = totais[colunas].fillna(0).astype(np.int64)
+    totais = totais.sort_values(CHAVE).reset_index(drop=True)
+
+    diferenca_qtd = totais['count_Sistema'] - totais['count_Operadora']
+    diferenca_total = totais['sum_Sistema'] - totais['sum_Operadora']
+    tem_diferencas = (diferenca_qtd != 0) | (diferenca_total != 0)
+
+    return pd.DataFrame({
+        'Data': calendario.formatar_dias(totais['Data']),
+        'Bandeira': totais['Bandeira'].astype(object),
+        'Tipo': totais['Tipo'].astype(object),
+        'Qtd_Sistema': totais['count_Sistema'],
+        'Qtd_Operadora': totais['count_Operadora'],
+        'Diferença_Qtd': diferenca_qtd,
+        'Total_Sistema': totais['sum_Sistema'],
+        'Total_Operadora': totais['sum_Operadora'],
+        'Diferença_Total': diferenca_total,
+        'Status': np.where(tem_diferencas, 'COM DIFERENÇA', 'OK'),
+    })
@@ -0,0 +1,240 @@
+"""Conciliação em SQL (DuckDB), para entradas maiores que a memória.
+
+As entradas normalizadas são gravadas, bloco a bloco, num banco DuckDB em
+arquivo, e o pareamento exato (as ocorrências de cada valor numeradas dentro
+de (Data, Bandeira, Tipo), como em motor.gerar_comparacao_detalhada), as
+combinações do resumo e a comparação resumida rodam em SQL. O DuckDB usa no
+máximo limite_memoria_mb e grava o excedente em disco, então só as sobras
+(que já precisam caber na planilha de resultado) voltam para o pandas. O
+resultado é o mesmo do motor em pandas, linha a linha e tipo a tipo.
+
+O duckdb é opcional: só é importado quando este motor é usado.
+"""
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+from conciliacao import calendario, leitura, motor
+from conciliacao.execucao import Cancelado, verificar_cancelamento
+
+LIMITE_MEMORIA_MB = 1024
+
+TABELAS = ['totvs', 'operadora']
+
+# Ocorrência de cada valor dentro de (Data, Bandeira, Tipo), na ordem de leitura
+OCORRENCIAS = """
+SELECT Data, Bandeira, Tipo, Valor, Posicao,
+       row_number() OVER (PARTITION BY Data, Bandeira, Tipo, Valor ORDER BY Posicao) AS Ocorrencia
+FROM {tabela}
+WHERE Data IS NOT NULL AND Bandeira IS NOT NULL AND Tipo IS NOT NULL
+"""
+
+SOBRAS = f"""
+CREATE OR REPLACE TABLE sobras AS
+WITH sistema AS ({OCORRENCIAS.format(tabela='totvs')}),
+     operadora AS ({OCORRENCIAS.format(tabela='operadora')})
+SELECT coalesce(s.Data, o.Data) AS Data,
+       coalesce(s.Bandeira, o.Bandeira) AS Bandeira,
+       coalesce(s.Tipo, o.Tipo) AS Tipo,
+       s.Posicao IS NOT NULL AS A_Mais,
+       coalesce(s.Valor, o.Valor) AS Valor,
+       coalesce(s.Posicao, o.Posicao) AS Posicao
+FROM sistema s
+FULL OUTER JOIN operadora o
+  ON s.Data = o.Data AND s.Bandeira = o.Bandeira AND s.Tipo = o.Tipo
+ AND s.Valor = o.Valor AND s.Ocorrencia = o.Ocorrencia
+WHERE s.Posicao IS NULL OR o.Posicao IS NULL
+"""
+
+# Mesma ordem do motor: TOTVS antes da Operadora, na ordem de leitura; o
+# PagSeguro lista primeiro o que falta lançar, em ordem de valor
+ORDEM_SOBRAS = {
+    False: "ORDER BY Data, Bandeira, Tipo, A_Mais DESC, Posicao",
+    True: "ORDER BY Data, Bandeira, Tipo, A_Mais, Valor, Posicao",
+}
+
+COMBINACOES = """
+SELECT DISTINCT strftime(Data, '%d/%m/%Y') AS Data, Bandeira, Tipo
+FROM (SELECT Data, Bandeira, Tipo FROM totvs UNION ALL SELECT Data, Bandeira, Tipo FROM operadora)
+WHERE Data IS NOT NULL AND Bandeira IS NOT NULL AND Tipo IS NOT NULL
+"""
+
+TOTAIS_DETALHE = """
+SELECT Data, Bandeira, Tipo,
+       sum(Valor_Sistema)::BIGINT AS Total_Sistema,
+       sum(Valor_Operadora)::BIGINT AS Total_Operadora,
+       string_agg({a_mais}, '/' ORDER BY Ordem) FILTER (WHERE {a_mais} <> '') AS {valores_a_mais},
+       string_agg({a_menos}, '/' ORDER BY Ordem) FILTER (WHERE {a_menos} <> '') AS {valores_a_menos}
+FROM detalhe
+GROUP BY Data, Bandeira, Tipo
+"""
+
+TOTAIS_POR_GRUPO = """
+SELECT Data, Bandeira, Tipo, count(*) AS count_{lado}, sum(Valor)::BIGINT AS sum_{lado}
+FROM {tabela}
+WHERE Data IS NOT NULL AND Bandeira IS NOT NULL AND Tipo IS NOT NULL
+GROUP BY Data, Bandeira, Tipo
+"""
+
+COMPARACAO_RESUMIDA = f"""
+SELECT Data, Bandeira, Tipo,
+       coalesce(count_Sistema, 0) AS count_Sistema, coalesce(sum_Sistema, 0) AS sum_Sistema,
+       coalesce(count_Operadora, 0) AS count_Operadora, coalesce(sum_Operadora, 0) AS sum_Operadora
+FROM ({TOTAIS_POR_GRUPO.format(tabela='totvs', lado='Sistema')})
+FULL OUTER JOIN ({TOTAIS_POR_GRUPO.format(tabela='operadora', lado='Operadora')})
+USING (Data, Bandeira, Tipo)
+"""
+
+
+def importar_duckdb():
+    try:
+        import duckdb
+    except ImportError:
+        raise ImportError("O motor 'duckdb' precisa do pacote duckdb (pip install duckdb)") from None
+    return duckdb
+
+
+def identificador(nome):
+    """Nome de coluna entre aspas, para os rótulos do layout"""
+    return '"' + nome.replace('"', '""') + '"'
+
+
+def como_objeto(df, colunas):
+    """Colunas de texto vindas do DuckDB como object, o tipo que o motor produz"""
+    return df.astype({coluna: object for coluna in colunas})
+
+
+class ComparacaoSQL:
+    """Banco DuckDB temporário com as duas entradas; use com with, que apaga o banco
+
+    Tem a mesma interface de particoes.ComparacaoPorFaixas
+    (comparacao_detalhada e resumo), mais carregar, para gravar as entradas
+    em blocos, e comparacao_resumida. pasta é onde o banco e os arquivos de
+    transbordo são criados (padrão: a pasta temporária do sistema).
+    processos limita as threads do DuckDB (None: uma por núcleo).
+    """
+
+    def __init__(self, pasta=None, limite_memoria_mb=LIMITE_MEMORIA_MB, processos=None):
+        self.duckdb = importar_duckdb()
+        self.pasta = tempfile.mkdtemp(prefix='conciliacao_', dir=pasta)
+        # Pelo config, e não por SET, o caminho não precisa ser escapado no SQL
+        config = {
+            'memory_limit': f'{int(limite_memoria_mb)}MB',
+            'temp_directory': os.path.join(self.pasta, 'transbordo'),
+            'preserve_insertion_order': False,
+        }
+        if processos:
+            config['threads'] = int(processos)
+        self.conexao = self.duckdb.connect(os.path.join(self.pasta, 'conciliacao.duckdb'), config=config)
+        for tabela in TABELAS:
+            self.conexao.execute(
+                f"CREATE TABLE {tabela} (Data DATE, Bandeira VARCHAR, Tipo VARCHAR, Valor BIGINT, Posicao BIGINT)"
+            )
+        self.quantidades = dict.fromkeys(TABELAS, 0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        self.conexao.close()
+        shutil.rmtree(self.pasta, ignore_errors=True)
+
+    def executar(self, sql, cancelar=None):
+        """Executa sql; se cancelar for marcado no meio, interrompe a consulta e sobe Cancelado"""
+        verificar_cancelamento(cancelar)
+        if cancelar is None:
+            return self.conexao.execute(sql)
+        terminou = threading.Event()
+
+        def vigiar():
+            while not terminou.wait(0.1):
+                if cancelar.is_set():
+                    self.conexao.interrupt()
+                    return
+
+        vigia = threading.Thread(target=vigiar, daemon=True)
+        vigia.start()
+        try:
+            return self.conexao.execute(sql)
+        except self.duckdb.InterruptException:
+            raise Cancelado("Processamento cancelado pelo usuário") from None
+        finally:
+            terminou.set()
+            vigia.join()
+
+    def carregar(self, tabela, blocos, cancelar=None):
+        """Grava na tabela ('totvs' ou 'operadora') os blocos normalizados; devolve o total de linhas
+
+        blocos vem de leitura.blocos_operadora ou leitura.blocos_totvs. A
+        posição de cada linha guarda a ordem de leitura, que decide as
+        ocorrências e a ordem das sobras.
+        """
+        for bloco in blocos:
+            verificar_cancelamento(cancelar)
+            inicio = self.quantidades[tabela]
+            bloco = bloco[['Data', 'Bandeira', 'Tipo', 'Valor']].assign(
+                Posicao=np.arange(inicio, inicio + len(bloco), dtype=np.int64)
+            )
+            self.conexao.register('bloco', bloco)
+            try:
+                self.conexao.execute(
+                    f"INSERT INTO {tabela} SELECT Data::DATE, Bandeira::VARCHAR, Tipo::VARCHAR, "
+                    "Valor, Posicao FROM bloco"
+                )
+            finally:
+                self.conexao.unregister('bloco')
+            self.quantidades[tabela] += len(bloco)
+        return self.quantidades[tabela]
+
+    def entrada(self, tabela, cancelar=None):
+        """A tabela inteira como DataFrame, no formato de leitura.finalizar (Data em dias)
+
+        Só para gravar as abas de entrada: precisa caber na memória.
+        """
+        df = self.executar(f"SELECT Data, Bandeira, Tipo, Valor FROM {tabela} ORDER BY Posicao", cancelar).df()
+        return leitura.finalizar(df)
+
+    def comparacao_detalhada(self, layout=motor.LAYOUT_CIELO, cancelar=None):
+        """motor.gerar_comparacao_detalhada em SQL; só as sobras do pareamento exato vêm para a memória"""
+        self.executar(SOBRAS, cancelar)
+        sobras = self.executar(
+            "SELECT Data, Bandeira, Tipo, A_Mais, Valor FROM sobras " + ORDEM_SOBRAS[layout['ordenar_valores']],
+            cancelar
+        ).df()
+        return motor.montar_detalhe(
+            calendario.para_dias(sobras['Data']).array,
+            sobras['Bandeira'].to_numpy(dtype=object),
+            sobras['Tipo'].to_numpy(dtype=object),
+            sobras['A_Mais'].to_numpy(dtype=bool),
+            sobras['Valor'].to_numpy(dtype=np.int64),
+            layout
+        )
+
+    def resumo(self, resultado_detalhado, layout=motor.LAYOUT_CIELO, cancelar=None):
+        """motor.gerar_resumo, com as combinações das entradas e os totais do detalhe somados em SQL
+
+        Como no motor, espera o detalhe com a Data já como dd/mm/aaaa.
+        """
+        combinacoes = como_objeto(self.executar(COMBINACOES, cancelar).df(), motor.CHAVE)
+        detalhe = resultado_detalhado.astype({'Bandeira': object, 'Tipo': object}).assign(
+            Ordem=np.arange(len(resultado_detalhado))
+        )
+        self.conexao.register('detalhe', detalhe)
+        try:
+            totais = self.executar(TOTAIS_DETALHE.format(**{
+                chave: identificador(layout[chave])
+                for chave in ['a_mais', 'a_menos', 'valores_a_mais', 'valores_a_menos']
+            }), cancelar).df()
+        finally:
+            self.conexao.unregister('detalhe')
+        totais = como_objeto(totais, motor.CHAVE + [layout['valores_a_mais'], layout['valores_a_menos']])
+        return motor.montar_resumo(combinacoes, totais, layout)
+
+    def comparacao_resumida(self, cancelar=None):
+        """motor.gerar_comparacao_resumida, com os totais de cada lado somados em SQL"""
+        totais = self.executar(COMPARACAO_RESUMIDA, cancelar).df()
+        totais['Data'] = calendario.para_dias(totais['Data'])
+        return motor.montar_comparacao_resumida(como_objeto(totais, ['Bandeira', 'Tipo']))
@@ -0,0 +1,114 @@
+"""Classificação e normalização de Bandeira e Tipo."""
+import numpy as np
+import pandas as pd
+
+BANDEIRA_PADRAO = 'OUTROS'
+TIPO_PADRAO = 'outros'
+
+ADQUIRENTE_PADRAO = ''
+
+# Código de cliente do TOTVS -> bandeira, tipo e operadora (adquirente) dona do código
+MAPA_CODIGOS = {
+    '481': {'bandeira': 'VISA', 'tipo': 'debito', 'adquirente': 'pagseguro'},
+    '482': {'bandeira': 'VISA', 'tipo': 'credito', 'adquirente': 'pagseguro'},
+    '483': {'bandeira': 'MASTERCARD', 'tipo': 'debito', 'adquirente': 'pagseguro'},
+    '484': {'bandeira': 'MASTERCARD', 'tipo': 'credito', 'adquirente': 'pagseguro'},
+    '485': {'bandeira': 'ELO', 'tipo': 'debito', 'adquirente': 'pagseguro'},
+    '486': {'bandeira': 'ELO', 'tipo': 'credito', 'adquirente': 'pagseguro'},
+    '487': {'bandeira': 'HIPERCARD', 'tipo': 'credito', 'adquirente': 'pagseguro'},
+    '488': {'bandeira': 'AMEX', 'tipo': 'credito', 'adquirente': 'pagseguro'},
+    '489': {'bandeira': 'PIX', 'tipo': 'pix', 'adquirente': 'pagseguro'},
+    '389': {'bandeira': 'ELO', 'tipo': 'debito', 'adquirente': 'cielo'},
+    '388': {'bandeira': 'ELO', 'tipo': 'credito', 'adquirente': 'cielo'},
+    '397': {'bandeira': 'VISA', 'tipo': 'debito', 'adquirente': 'cielo'},
+    '396': {'bandeira': 'VISA', 'tipo': 'credito', 'adquirente': 'cielo'},
+    '393': {'bandeira': 'MASTERCARD', 'tipo': 'debito', 'adquirente': 'cielo'},
+    '394': {'bandeira': 'MASTERCARD', 'tipo': 'credito', 'adquirente': 'cielo'},
+    '461': {'bandeira': 'PIX', 'tipo': 'pix', 'adquirente': 'cielo'}
+}
+
+
+def mapa_de_uma_operadora(adquirente, mapa=MAPA_CODIGOS):
+    """Mapa para comparar uma operadora só contra o TOTVS inteiro
+
+    Os códigos das outras operadoras levam o nome delas na bandeira (ex: no
+    comparador Cielo o 481 vira 'PAGSEGURO VISA'), para nunca casarem com as
+    vendas desta operadora.
+    """
+    return {
+        codigo: info if info['adquirente'] == adquirente
+        else dict(info, bandeira=f"{info['adquirente'].upper()} {info['bandeira']}")
+        for codigo, info in mapa.items()
+    }
+
+
+MAPA_CODIGOS_CIELO = mapa_de_uma_operadora('cielo')
+MAPA_CODIGOS_PAGSEGURO = mapa_de_uma_operadora('pagseguro')
+
+
+def compilar_mapa_codigos(codigo_bandeira_map):
+    """Compila o dicionário de códigos de cliente em arrays de consulta
+
+    Retorna o índice dos códigos e os arrays de bandeiras, tipos e
+    adquirentes alinhados a ele. A última posição de cada array guarda o valor
+    padrão, de modo que o -1 devolvido para códigos desconhecidos já cai em
+    'OUTROS'/'outros' (e em nenhuma operadora).
+    """
+    codigos = pd.Index(list(codigo_bandeira_map), dtype=object)
+    bandeiras = np.array([info['bandeira'] for info in codigo_bandeira_map.values()] + [BANDEIRA_PADRAO], dtype=object)
+    tipos = np.array([info['tipo'] for info in codigo_bandeira_map.values()] + [TIPO_PADRAO], dtype=object)
+    adquirentes = np.array(
+        [info.get('adquirente', ADQUIRENTE_PADRAO) for info in codigo_bandeira_map.values()] + [ADQUIRENTE_PADRAO],
+        dtype=object
+    )
+    return codigos, bandeiras, tipos, adquirentes
+
+
+def classificar_codigos(coluna, mapa_compilado):
+    """Retorna os arrays de Bandeira, Tipo e adquirente para uma coluna de códigos de cliente"""
+    codigos, bandeiras, tipos, adquirentes = mapa_compilado
+
+    # A conversão para texto e a consulta são feitas só nos códigos distintos
+    indices, unicos = pd.factorize(pd.Series(coluna))
+    unicos_texto = pd.Series(unicos, dtype=object).astype(str).str.strip()
+    posicoes = np.append(codigos.get_indexer(unicos_texto), -1)[indices]
+
+    return bandeiras[posicoes], tipos[posicoes], adquirentes[posicoes]
+
+
+def normalizar_bandeira(nome):
+    nome = str(nome).upper()
+    if 'MAESTRO' in nome or 'MASTER' in nome or 'MASTERCARD' in nome:
+        return 'MASTERCARD'
+    elif 'VISA' in nome:
+        return 'VISA'
+    elif 'ELO' in nome:
+        return 'ELO'
+    elif 'PIX' in nome:
+        return 'PIX'
+    return nome.strip()
+
+
+def normalizar_tipo(tipo):
+    tipo = str(tipo).lower()
+    if 'débito' in tipo or 'debito' in tipo:
+        return 'debito'
+    elif 'crédito' in tipo or 'credito' in tipo:
+        return 'credito'
+    elif 'pix' in tipo:
+        return 'pix'
+    return tipo.strip()
+
+
+def normalizar_categorias(coluna, normalizar):
+    """Normaliza cada valor distinto da coluna uma única vez
+
+    A coluna é fatorada, a função roda só sobre os valores distintos e o
+    resultado volta como Categorical com categorias em ordem alfabética, para
+    que ordenações por código sigam a mesma ordem do texto.
+    """
+    indices, unicos = pd.factorize(pd.Series(coluna), use_na_sentinel=False)
+    normalizados = [normalizar(valor) for valor in unicos]
+    categorias = sorted(set(normalizados))
+    codigos = pd.Index(categorias).get_indexer(normalizados)
+    return pd.Categorical.from_codes(codigos[indices], categories=categorias)
@@ -0,0 +1,144 @@
+"""Comparação detalhada e resumo em paralelo, por faixas de datas.
+
+Nem o pareamento valor a valor (motor.gerar_comparacao_detalhada) nem o
+resumo (motor.gerar_resumo) cruzam a fronteira de um (Data, Bandeira, Tipo).
+As entradas são cortadas em faixas contínuas de datas com quantidades
+parecidas de linhas, cada faixa é comparada num processo do pool e os
+pedaços são juntados na ordem das faixas. O resultado é o mesmo da
+comparação num processo só, linha a linha e tipo a tipo.
+
+Abaixo de LINHAS_MINIMAS_PARALELO linhas, ou com um processo só, tudo roda
+no próprio processo: abrir o pool custa mais do que se ganha.
+"""
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+
+from conciliacao import calendario, motor
+from conciliacao.execucao import Cancelado
+
+LINHAS_MINIMAS_PARALELO = 200_000
+
+# Mais faixas que processos: quem termina antes pega a próxima
+FAIXAS_POR_PROCESSO = 4
+
+
+def cortes_por_linhas(datas, quantidade):
+    """Datas onde começa cada faixa, para quantidade faixas com linhas parecidas
+
+    datas são as datas (datetime64[D]) de todas as linhas das duas entradas.
+    Uma data nunca é dividida entre duas faixas.
+    """
+    dias, linhas = np.unique(datas[~np.isnat(datas)], return_counts=True)
+    if not len(dias):
+        return dias
+    acumulado = np.cumsum(linhas)
+    alvos = acumulado[-1] * np.arange(1, quantidade) / quantidade
+    inicios = np.unique(np.searchsorted(acumulado, alvos, side='right'))
+    return np.concatenate([dias[:1], dias[inicios[inicios < len(dias)]]])
+
+
+def faixa_de_cada_linha(datas, cortes):
+    """Índice da faixa de cada linha (-1 para data vazia)"""
+    faixas = np.searchsorted(cortes, datas, side='right') - 1
+    faixas[np.isnat(datas)] = -1
+    return faixas
+
+
+def em_dias(coluna, formato=None):
+    return pd.to_datetime(coluna, format=formato).to_numpy(dtype='datetime64[D]')
+
+
+def mapear(pool, funcao, argumentos, cancelar=None):
+    """Roda funcao(*args) no pool para cada args de argumentos; devolve os resultados na mesma ordem"""
+    pendentes = [pool.apply_async(funcao, args) for args in argumentos]
+    for pendente in pendentes:
+        while not pendente.ready():
+            if cancelar is not None and cancelar.is_set():
+                pool.terminate()
+                raise Cancelado("Processamento cancelado pelo usuário")
+            pendente.wait(0.1)
+    return [pendente.get() for pendente in pendentes]
+
+
+def juntar(partes):
+    """Concatena os pedaços de cada faixa; faixas vazias ficam de fora para não mudar os tipos"""
+    preenchidas = [parte for parte in partes if len(parte)]
+    if not preenchidas:
+        return partes[0]
+    return pd.concat(preenchidas, ignore_index=True)
+
+
+class ComparacaoPorFaixas:
+    """Compara df_totvs e df_operadora por faixas de datas; use com with, que fecha o pool
+
+    processos=None usa um processo por núcleo da máquina. Sem pool (um
+    processo, ou entradas pequenas) os métodos chamam o motor direto. O pool
+    só é aberto na primeira comparação que precisar dele.
+    """
+
+    def __init__(self, df_totvs, df_operadora, processos=None):
+        self.df_totvs = df_totvs
+        self.df_operadora = df_operadora
+        self.processos = processos or os.cpu_count() or 1
+        self.paralelo = self.processos >= 2 and len(df_totvs) + len(df_operadora) >= LINHAS_MINIMAS_PARALELO
+        self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def abrir_pool(self):
+        """Calcula as faixas e abre o pool, uma vez só"""
+        if self.pool is not None:
+            return
+        datas_totvs = calendario.em_datetime64(self.df_totvs['Data'])
+        datas_operadora = calendario.em_datetime64(self.df_operadora['Data'])
+        self.cortes = cortes_por_linhas(
+            np.concatenate([datas_totvs, datas_operadora]), self.processos * FAIXAS_POR_PROCESSO
+        )
+        self.faixas_totvs = faixa_de_cada_linha(datas_totvs, self.cortes)
+        self.faixas_operadora = faixa_de_cada_linha(datas_operadora, self.cortes)
+        self.pool = multiprocessing.Pool(processes=self.processos)
+
+    def entradas_da_faixa(self, faixa):
+        """As duas entradas com as linhas da faixa"""
+        return self.df_totvs[self.faixas_totvs == faixa], self.df_operadora[self.faixas_operadora == faixa]
+
+    def comparacao_detalhada(self, layout=motor.LAYOUT_CIELO, cancelar=None):
+        """motor.gerar_comparacao_detalhada, com uma faixa por tarefa do pool
+
+        As faixas saem em ordem de data e o detalhe já é ordenado por (Data,
+        Bandeira, Tipo), então basta concatená-las.
+        """
+        if not self.paralelo:
+            return motor.gerar_comparacao_detalhada(self.df_totvs, self.df_operadora, layout, cancelar)
+        self.abrir_pool()
+        argumentos = [self.entradas_da_faixa(faixa) + (layout,) for faixa in range(max(len(self.cortes), 1))]
+        return juntar(mapear(self.pool, motor.gerar_comparacao_detalhada, argumentos, cancelar))
+
+    def resumo(self, resultado_detalhado, layout=motor.LAYOUT_CIELO, cancelar=None):
+        """motor.gerar_resumo, com uma faixa por tarefa do pool
+
+        O resumo é ordenado pela Data já como texto dd/mm/aaaa (ordem do dia,
+        não do calendário), então os pedaços são reordenados depois de
+        juntados. (Data, Bandeira, Tipo) não se repete no resumo, então a
+        ordem final é a mesma da comparação num processo só.
+        """
+        if not self.paralelo:
+            return motor.gerar_resumo(self.df_totvs, self.df_operadora, resultado_detalhado, layout)
+        self.abrir_pool()
+        faixas_detalhe = faixa_de_cada_linha(em_dias(resultado_detalhado['Data'], '%d/%m/%Y'), self.cortes)
+        argumentos = [
+            self.entradas_da_faixa(faixa) + (resultado_detalhado[faixas_detalhe == faixa], layout)
+            for faixa in range(max(len(self.cortes), 1))
+        ]
+        df_resumo = juntar(mapear(self.pool, motor.gerar_resumo, argumentos, cancelar))
+        return df_resumo.sort_values(motor.CHAVE).reset_index(drop=True)
@@ -0,0 +1,381 @@
+"""Conciliação completa sem interface: leitura, comparação e planilha de resultado.
+
+É o mesmo caminho usado pelas duas interfaces e pelo processamento em lote
+(python -m conciliacao.lote). O andamento é informado por
+avisar(etapa, **dados); cada interface escolhe o texto de cada etapa e quem
+não precisa de log usa nao_avisar. Nada aqui importa tkinter.
+"""
+import os
+
+from conciliacao import cache, calendario, dinheiro, incremental, leitura, motor, motor_sql, normalizacao, particoes
+from conciliacao.execucao import Cancelado, verificar_cancelamento
+from conciliacao.planilha import FORMATOS_ARQUIVO, Planilha
+
+# Como cada operadora é lida e apresentada
+COMPARADORES = {
+    'cielo': {
+        'rotulo': 'Cielo',
+        'layout': motor.LAYOUT_CIELO,
+        'dayfirst': True,
+        'mapa': normalizacao.MAPA_CODIGOS_CIELO,
+    },
+    'pagseguro': {
+        'rotulo': 'PagSeguro',
+        'layout': motor.LAYOUT_PAGSEGURO,
+        'dayfirst': False,
+        'mapa': normalizacao.MAPA_CODIGOS_PAGSEGURO,
+    },
+}
+
+MODOS = ['detalhada', 'resumida']
+
+# Onde a comparação roda: no pandas, com tudo na memória, ou num banco DuckDB
+# em arquivo, para entradas maiores que a memória (ver motor_sql)
+MOTORES = ['pandas', 'duckdb']
+
+# Abas que só repetem as entradas já normalizadas, e o que fazer com elas:
+# gravar na planilha, omitir ou gravar à parte em Parquet/CSV
+ABAS_ENTRADA = ['Operadora Processada', 'TOTVS Processado']
+ENTRADAS = ['planilha', 'omitir'] + FORMATOS_ARQUIVO
+
+# Passadas extras da comparação detalhada sobre as sobras do pareamento exato
+# (ver motor.parear_somas e motor.parear_aproximados); o padrão desliga todas
+PAREAMENTO_PADRAO = {
+    'somas': False,
+    'max_itens_soma': motor.MAX_ITENS_SOMA,
+    'tempo_limite_somas': motor.TEMPO_LIMITE_SOMAS,
+    'tolerancia_centavos': 0,
+    'janela_dias': 0,
+}
+
+
+def nao_avisar(etapa, **dados):
+    pass
+
+
+def opcoes_pareamento(opcoes):
+    """As opções de pareamento de opcoes, com o padrão no que não foi informado"""
+    return {nome: opcoes.get(nome, padrao) for nome, padrao in PAREAMENTO_PADRAO.items()}
+
+
+def base_incremental(opcoes, nome):
+    """Arquivo da base incremental (ver incremental), ou None sem opcoes['incremental']
+
+    Por padrão a base fica na pasta do resultado; opcoes['base_incremental']
+    indica outro arquivo.
+    """
+    if not opcoes.get('incremental', False):
+        return None
+    pasta = os.path.dirname(os.path.abspath(opcoes['resultado_path']))
+    return opcoes.get('base_incremental') or incremental.caminho_base(pasta, nome)
+
+
+def chave_resultado(opcoes, comparador, mapa):
+    """Chave do cache de resultados: conteúdo dos arquivos, tipo de comparação e mapa de códigos
+
+    Com opcoes['arquivos_operadora'] ({operadora: arquivo}, ver adquirentes)
+    no lugar de arquivo_operadora, entram os arquivos de todas as operadoras.
+    """
+    parametros = {'comparador': comparador}
+    if 'arquivos_operadora' in opcoes:
+        operadoras = sorted(opcoes['arquivos_operadora'])
+        arquivos = [opcoes['arquivos_operadora'][operadora] for operadora in operadoras]
+        parametros['operadoras'] = operadoras
+    else:
+        arquivos = [opcoes['arquivo_operadora']]
+    hashes = [cache.hash_arquivo(arquivo) for arquivo in arquivos + [opcoes['arquivo_totvs']]]
+    parametros.update({
+        'modo': opcoes['modo'],
+        'entradas': opcoes.get('entradas', 'planilha'),
+        'divisao': opcoes.get('divisao', 'mes'),
+        'pareamento': opcoes_pareamento(opcoes),
+        'mapa': mapa,
+        'versao_leitura': leitura.VERSAO_LEITURA,
+        'versao_resultado': motor.VERSAO_RESULTADO,
+    })
+    return cache.chave_resultado(hashes, parametros), hashes
+
+
+def ler_arquivos(opcoes, comparador, mapa, avisar=nao_avisar, cancelar=None, paralelo=True):
+    """Lê os dois arquivos; devolve (df_operadora, df_totvs), com None no lado que falhou"""
+    avisar('lendo', arquivo_operadora=opcoes['arquivo_operadora'], arquivo_totvs=opcoes['arquivo_totvs'])
+    resultados = leitura.ler_entradas(
+        opcoes['arquivo_operadora'],
+        opcoes['arquivo_totvs'],
+        mapa,
+        dayfirst=COMPARADORES[comparador]['dayfirst'],
+        em_blocos=opcoes.get('em_blocos', False),
+        usar_cache=opcoes.get('usar_cache', False),
+        cancelar=cancelar,
+        paralelo=paralelo
+    )
+
+    for nome, (df, erro) in resultados.items():
+        if erro is None:
+            avisar(f'{nome}_lida', registros=len(df), cache=bool(df.attrs.get('cache')))
+        else:
+            avisar(f'{nome}_erro', erro=erro)
+    return resultados['operadora'][0], resultados['totvs'][0]
+
+
+def abas_detalhada(df_totvs, df_operadora, layout, avisar=nao_avisar, cancelar=None, pareamento=None,
+                   processos=1, base=None):
+    """Compara valor a valor; devolve ({nome da aba: DataFrame}, estatísticas)
+
+    pareamento (ver PAREAMENTO_PADRAO) liga as passadas sobre as sobras do
+    pareamento exato: lançamentos do TOTVS que somam várias vendas
+    (aba 'Pareamento por Soma') e valores/datas próximos (aba 'Pareamento
+    Aproximado'). O que for pareado nelas deixa de aparecer como diferença.
+    Com processos diferente de 1 (None: um por núcleo), o pareamento exato e
+    o resumo rodam por faixas de datas em paralelo (ver particoes). base,
+    um par (arquivo SQLite, contexto), faz o pareamento exato só dos grupos
+    que mudaram desde a última execução (ver incremental).
+    """
+    with particoes.ComparacaoPorFaixas(df_totvs, df_operadora, processos) as faixas:
+        abas, estatisticas = abas_da_comparacao(faixas, layout, avisar, cancelar, pareamento, base)
+    estatisticas.update(total_operadora=len(df_operadora), total_totvs=len(df_totvs))
+    return dict({'Operadora Processada': df_operadora, 'TOTVS Processado': df_totvs}, **abas), estatisticas
+
+
+def abas_da_comparacao(comparacao, layout, avisar=nao_avisar, cancelar=None, pareamento=None, base=None):
+    """O miolo de abas_detalhada, sobre uma particoes.ComparacaoPorFaixas ou motor_sql.ComparacaoSQL
+
+    Devolve as abas e as estatísticas sem as entradas e sem os totais de
+    cada uma, que ficam com quem chamou. A base incremental só funciona com
+    a ComparacaoPorFaixas.
+    """
+    pareamento = opcoes_pareamento(pareamento or {})
+    avisar('detalhada_inicio')
+    if base is None:
+        resultado_detalhado = comparacao.comparacao_detalhada(layout, cancelar)
+    else:
+        caminho, contexto = base
+        resultado_detalhado = incremental.comparacao_detalhada(
+            caminho, contexto, comparacao.df_totvs, comparacao.df_operadora, layout, avisar, cancelar,
+            comparacao.processos
+        )
+    avisar('detalhada', diferencas=len(resultado_detalhado))
+    verificar_cancelamento(cancelar)
+
+    df_somas = None
+    if pareamento['somas']:
+        resultado_detalhado, df_somas, pulados = motor.parear_somas(
+            resultado_detalhado, layout, pareamento['max_itens_soma'], pareamento['tempo_limite_somas']
+        )
+        somas = df_somas['Soma'].nunique()
+        avisar('somas', somas=somas, pulados=pulados, diferencas=len(resultado_detalhado))
+        verificar_cancelamento(cancelar)
+
+    aproximar = pareamento['tolerancia_centavos'] or pareamento['janela_dias']
+    resultado_detalhado, df_aproximados = motor.parear_aproximados(
+        resultado_detalhado, layout, pareamento['tolerancia_centavos'], pareamento['janela_dias']
+    )
+    if aproximar:
+        avisar('aproximados', pares=len(df_aproximados), diferencas=len(resultado_detalhado))
+    avisar('progresso', valor=0.7)
+    verificar_cancelamento(cancelar)
+
+    resultado_detalhado['Data'] = calendario.formatar_dias(resultado_detalhado['Data'])
+    for coluna in ['Data_Sistema', 'Data_Operadora']:
+        df_aproximados[coluna] = calendario.formatar_dias(df_aproximados[coluna])
+    if df_somas is not None:
+        df_somas['Data'] = calendario.formatar_dias(df_somas['Data'])
+
+    avisar('resumo_inicio')
+    df_resumo = comparacao.resumo(resultado_detalhado, layout, cancelar)
+    avisar('resumo', combinacoes=len(df_resumo))
+
+    avisar('organizado_inicio')
+    df_resumo_organizado = motor.criar_resumo_organizado(resultado_detalhado, layout)
+    avisar('organizado', diferencas=len(df_resumo_organizado))
+
+    abas = {
+        'Comparação Detalhada': resultado_detalhado,
+        'Resumo': df_resumo,
+    }
+    if not df_resumo_organizado.empty:
+        abas['Resumo Filtrável'] = df_resumo_organizado
+    if df_somas is not None and not df_somas.empty:
+        abas['Pareamento por Soma'] = df_somas
+    if not df_aproximados.empty:
+        abas['Pareamento Aproximado'] = df_aproximados
+
+    estatisticas = motor.contar_diferencas(resultado_detalhado, df_resumo, layout)
+    estatisticas['modo'] = 'detalhada'
+    if df_somas is not None:
+        estatisticas.update(somas=somas, somas_pulados=pulados)
+    if aproximar:
+        estatisticas['aproximados'] = len(df_aproximados)
+    return abas, estatisticas
+
+
+def abas_resumida(df_totvs, df_operadora, avisar=nao_avisar, cancelar=None):
+    """Compara apenas totais e quantidades por grupo; devolve ({nome da aba: DataFrame}, estatísticas)"""
+    avisar('resumida_inicio')
+    df_resumo = motor.gerar_comparacao_resumida(df_totvs, df_operadora)
+    avisar('resumida', combinacoes=len(df_resumo))
+    return {'Resumo': df_resumo}, estatisticas_resumida(df_resumo, len(df_operadora), len(df_totvs))
+
+
+def estatisticas_resumida(df_resumo, total_operadora, total_totvs):
+    return {
+        'modo': 'resumida',
+        'total_operadora': total_operadora,
+        'total_totvs': total_totvs,
+        'diferenca_total': int(df_resumo['Diferença_Total'].sum()),
+        'sem_diferencas': int((df_resumo['Status'] == 'OK').sum()),
+        'com_diferencas': int((df_resumo['Status'] == 'COM DIFERENÇA').sum()),
+    }
+
+
+def escrever_abas(planilha, abas, prefixo='', entradas='planilha', avisar=nao_avisar):
+    """Grava as abas com os valores em reais e as datas como data; a coluna Status do Resumo sai colorida
+
+    entradas diz o que fazer com as ABAS_ENTRADA (ver ENTRADAS).
+    """
+    for nome, df in abas.items():
+        if nome in ABAS_ENTRADA and entradas == 'omitir':
+            continue
+        df = calendario.com_datas(dinheiro.em_reais(df))
+        if nome in ABAS_ENTRADA and entradas != 'planilha':
+            planilha.escrever_arquivo(prefixo + nome, df, entradas)
+            continue
+        gravadas = planilha.escrever_aba(prefixo + nome, df, colorir_status=(nome == 'Resumo'))
+        if len(gravadas) > 1:
+            avisar('aba_dividida', aba=prefixo + nome, linhas=len(df), partes=len(gravadas))
+
+
+def comparar(df_totvs, df_operadora, modo, layout, avisar=nao_avisar, cancelar=None, pareamento=None,
+             processos=1, base=None):
+    """Roda a comparação do modo pedido; devolve (abas, estatísticas)
+
+    O pareamento, os processos e a base incremental só valem para a
+    detalhada: a resumida compara totais por grupo e não pareia valores.
+    """
+    if modo == 'resumida':
+        abas, estatisticas = abas_resumida(df_totvs, df_operadora, avisar, cancelar)
+    else:
+        abas, estatisticas = abas_detalhada(
+            df_totvs, df_operadora, layout, avisar, cancelar, pareamento, processos, base
+        )
+    avisar('progresso', valor=0.85)
+    verificar_cancelamento(cancelar)
+    return abas, estatisticas
+
+
+def comparar_sql(opcoes, comparador, mapa, avisar=nao_avisar, cancelar=None, processos=None):
+    """Lê e compara com o motor 'duckdb'; devolve (abas, estatísticas), ou None se algum arquivo falhou
+
+    Os arquivos são lidos em blocos direto para o banco (ver motor_sql), sem
+    passar pelo cache de entradas. As abas de entrada só voltam para a
+    memória se forem gravadas (entradas diferente de 'omitir').
+    """
+    config = COMPARADORES[comparador]
+    avisar('lendo', arquivo_operadora=opcoes['arquivo_operadora'], arquivo_totvs=opcoes['arquivo_totvs'])
+    with motor_sql.ComparacaoSQL(opcoes.get('pasta_temporaria'), processos=processos) as banco:
+        blocos = {
+            'operadora': leitura.blocos_operadora(opcoes['arquivo_operadora'], config['dayfirst']),
+            'totvs': leitura.blocos_totvs(opcoes['arquivo_totvs'], mapa),
+        }
+        falhou = False
+        for nome, blocos_entrada in blocos.items():
+            try:
+                registros = banco.carregar(nome, blocos_entrada, cancelar)
+            except Cancelado:
+                raise
+            except Exception as e:
+                avisar(f'{nome}_erro', erro=e)
+                falhou = True
+            else:
+                avisar(f'{nome}_lida', registros=registros, cache=False)
+        avisar('progresso', valor=0.5)
+        verificar_cancelamento(cancelar)
+        if falhou:
+            return None
+
+        total_operadora, total_totvs = banco.quantidades['operadora'], banco.quantidades['totvs']
+        if opcoes['modo'] == 'resumida':
+            avisar('resumida_inicio')
+            df_resumo = banco.comparacao_resumida(cancelar)
+            avisar('resumida', combinacoes=len(df_resumo))
+            abas, estatisticas = {'Resumo': df_resumo}, estatisticas_resumida(df_resumo, total_operadora, total_totvs)
+        else:
+            abas, estatisticas = abas_da_comparacao(
+                banco, config['layout'], avisar, cancelar, opcoes_pareamento(opcoes)
+            )
+            estatisticas.update(total_operadora=total_operadora, total_totvs=total_totvs)
+            if opcoes.get('entradas', 'planilha') != 'omitir':
+                abas = dict({
+                    'Operadora Processada': banco.entrada('operadora', cancelar),
+                    'TOTVS Processado': banco.entrada('totvs', cancelar),
+                }, **abas)
+    avisar('progresso', valor=0.85)
+    verificar_cancelamento(cancelar)
+    return abas, estatisticas
+
+
+def executar(opcoes, comparador, mapa=None, avisar=nao_avisar, cancelar=None, paralelo=True):
+    """Roda uma conciliação e devolve as estatísticas
+
+    opcoes traz arquivo_operadora, arquivo_totvs, resultado_path e modo
+    ('detalhada' ou 'resumida'), além de em_blocos, usar_cache, entradas
+    (ver ENTRADAS), divisao (ver planilha.DIVISOES), processos (ver
+    abas_detalhada), incremental e base_incremental (ver base_incremental),
+    motor (ver MOTORES; com 'duckdb', pasta_temporaria diz onde fica o banco
+    e a base incremental não é usada) e as opções de PAREAMENTO_PADRAO,
+    opcionais. Em
+    estatisticas['arquivos'] vêm todos os arquivos gravados. paralelo=False
+    faz tudo no próprio processo, para quem já roda dentro de um pool.
+    mapa substitui o mapa de códigos padrão do comparador. Retorna None
+    quando algum dos arquivos não pôde ser lido; o motivo vai para avisar.
+    """
+    config = COMPARADORES[comparador]
+    mapa = config['mapa'] if mapa is None else mapa
+    resultado_path = opcoes['resultado_path']
+
+    # Mesmos arquivos e parâmetros: copia o resultado anterior
+    chave = hashes = None
+    if opcoes.get('usar_cache', False):
+        chave, hashes = chave_resultado(opcoes, comparador, mapa)
+        estatisticas = cache.carregar_resultado(chave, resultado_path)
+        if estatisticas is not None:
+            avisar('cache_encontrado')
+            avisar('progresso', valor=1.0)
+            return estatisticas
+        avisar('cache_ausente')
+
+    avisar('progresso', valor=0.3)
+    processos = opcoes.get('processos') if paralelo else 1
+    if opcoes.get('motor', 'pandas') == 'duckdb':
+        resultado = comparar_sql(opcoes, comparador, mapa, avisar, cancelar, processos)
+        if resultado is None:
+            avisar('falha_leitura')
+            return None
+        abas, estatisticas = resultado
+    else:
+        df_operadora, df_totvs = ler_arquivos(opcoes, comparador, mapa, avisar, cancelar, paralelo)
+        avisar('progresso', valor=0.5)
+        verificar_cancelamento(cancelar)
+
+        if df_operadora is None or df_totvs is None:
+            avisar('falha_leitura')
+            return None
+
+        caminho_base = base_incremental(opcoes, comparador)
+        abas, estatisticas = comparar(
+            df_totvs, df_operadora, opcoes['modo'], config['layout'], avisar, cancelar, opcoes_pareamento(opcoes),
+            processos, (caminho_base, comparador) if caminho_base else None
+        )
+    with Planilha(resultado_path, opcoes.get('divisao', 'mes')) as planilha:
+        escrever_abas(planilha, abas, entradas=opcoes.get('entradas', 'planilha'), avisar=avisar)
+    estatisticas['arquivos'] = planilha.arquivos
+    avisar('progresso', valor=1.0)
+
+    # Resultado com grupos pulados pelo limite de tempo pode mudar na próxima vez
+    if chave is not None and not estatisticas.get('somas_pulados'):
+        # A planilha já foi gravada: falhar ao guardar a cópia no cache não falha a execução
+        try:
+            cache.salvar_resultado(chave, resultado_path, estatisticas, hashes, extras=planilha.arquivos[1:])
+        except OSError:
+            pass
+    return estatisticas
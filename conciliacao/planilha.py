@@ -0,0 +1,215 @@
+"""Gravação da planilha de resultado com xlsxwriter em modo de memória constante.
+
+Cada linha vai para o disco assim que é escrita, então o uso de memória não
+cresce com o tamanho das abas (o pd.ExcelWriter com openpyxl monta a
+planilha inteira em memória antes de salvar). As abas saem no mesmo formato
+do to_excel do pandas: cabeçalho simples, sem índice, datas como
+aaaa-mm-dd. A cor da coluna Status é uma formatação condicional da aba, e
+não um preenchimento célula a célula.
+
+Uma aba do Excel comporta 1.048.576 linhas. Abas maiores que isso são
+divididas antes de gravar, conforme a divisão escolhida:
+
+    'mes'       uma aba por mês da coluna Data ("TOTVS Processado 2024-01")
+    'dia'       uma aba por dia ("TOTVS Processado 2024-01-15")
+    'arquivos'  o excedente vai para planilhas numeradas (resultado_2.xlsx, ...)
+                com o mesmo nome de aba
+
+Um mês ou dia que sozinho passe do limite, ou uma aba sem coluna Data, é
+dividido em partes numeradas. Abas que cabem no limite nunca são divididas.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+from conciliacao.leitura import SEPARADOR_CSV
+
+# Linhas de dados por aba: o limite do Excel menos a linha do cabeçalho
+LINHAS_POR_ABA = 1_048_576 - 1
+TAMANHO_NOME_ABA = 31
+
+DIVISOES = ['mes', 'dia', 'arquivos']
+FORMATOS_ARQUIVO = ['parquet', 'csv']
+
+VERDE = '#92D050'
+VERMELHO = '#FF0000'
+
+# Dia zero das datas do Excel (sistema 1900)
+EPOCA_EXCEL = np.datetime64('1899-12-30')
+
+
+def preparar_coluna(serie):
+    """Devolve o tipo de célula e a lista de valores Python da coluna (None nas células vazias)
+
+    Datas viram o número de série do Excel, como o Excel guarda internamente.
+    """
+    tipo_inferido = pd.api.types.infer_dtype(serie, skipna=True)
+    if pd.api.types.is_datetime64_any_dtype(serie) or tipo_inferido in ('date', 'datetime'):
+        datas = pd.to_datetime(serie).to_numpy(dtype='datetime64[ns]')
+        dias = (datas - EPOCA_EXCEL) / np.timedelta64(1, 'D')
+        tipo = 'data' if tipo_inferido == 'date' or np.all(dias[~np.isnan(dias)] % 1 == 0) else 'data_hora'
+        return tipo, np.where(np.isnan(dias), None, dias).tolist()
+
+    if pd.api.types.is_bool_dtype(serie):
+        return 'booleano', serie.astype(object).where(serie.notna(), None).tolist()
+
+    if pd.api.types.is_numeric_dtype(serie):
+        valores = serie.to_numpy()
+        if valores.dtype.kind == 'f':
+            return 'numero', np.where(np.isnan(valores), None, valores).tolist()
+        return 'numero', valores.tolist()
+
+    # Texto vazio fica como célula vazia, como no to_excel
+    valores = serie.astype(object)
+    return 'texto', valores.where(valores.notna() & (valores != ''), None).tolist()
+
+
+def nome_aba(nome, sufixo):
+    """Acrescenta o sufixo ao nome da aba, encurtando o nome para caber nos 31 caracteres do Excel"""
+    return nome[:TAMANHO_NOME_ABA - len(sufixo) - 1].rstrip() + ' ' + sufixo
+
+
+def datas_da_coluna(coluna):
+    """Datas da coluna Data, venha ela como date ou como texto dd/mm/aaaa"""
+    if pd.api.types.infer_dtype(coluna, skipna=True) == 'string':
+        return pd.to_datetime(coluna, format='%d/%m/%Y')
+    return pd.to_datetime(coluna)
+
+
+def em_pedacos(nome, df, limite):
+    """Parte o DataFrame em pedaços de até limite linhas; devolve [(nome, df)]"""
+    if len(df) <= limite:
+        return [(nome, df)]
+    return [
+        (nome_aba(nome, str(numero)), df.iloc[inicio:inicio + limite])
+        for numero, inicio in enumerate(range(0, len(df), limite), 1)
+    ]
+
+
+def dividir_aba(nome, df, divisao='mes', limite=LINHAS_POR_ABA):
+    """Divide uma aba grande demais por mês ou dia da coluna Data; devolve [(nome, df)]
+
+    Com divisao='arquivos' (ou sem coluna Data) os pedaços são numerados.
+    """
+    if len(df) <= limite:
+        return [(nome, df)]
+    if divisao not in ('mes', 'dia') or 'Data' not in df.columns:
+        return em_pedacos(nome, df, limite)
+
+    formato = '%Y-%m' if divisao == 'mes' else '%Y-%m-%d'
+    periodos = datas_da_coluna(df['Data']).dt.strftime(formato).fillna('sem data')
+    partes = []
+    for periodo, parte in df.groupby(periodos.to_numpy(), sort=True):
+        partes.extend(em_pedacos(nome_aba(nome, periodo), parte, limite))
+    return partes
+
+
+class Planilha:
+    """Planilha .xlsx gravada linha a linha; use com with, como o pd.ExcelWriter
+
+    Abas acima de limite_linhas são divididas conforme divisao (ver DIVISOES).
+    Ao final, arquivos lista tudo o que foi gravado: a planilha principal,
+    as planilhas numeradas e os arquivos à parte.
+    """
+
+    def __init__(self, caminho, divisao='mes', limite_linhas=LINHAS_POR_ABA):
+        self.caminho = caminho
+        self.divisao = divisao
+        self.limite_linhas = limite_linhas
+        self.workbooks = []
+        self.formatos = []
+        self.arquivos = []
+        self.abrir_workbook()
+
+    def abrir_workbook(self):
+        """Abre a próxima planilha numerada (a primeira é o próprio caminho); devolve o índice dela"""
+        base, extensao = os.path.splitext(self.caminho)
+        numero = len(self.workbooks) + 1
+        caminho = self.caminho if numero == 1 else f'{base}_{numero}{extensao}'
+        workbook = xlsxwriter.Workbook(caminho, {'constant_memory': True})
+        self.formatos.append({
+            'data': workbook.add_format({'num_format': 'YYYY-MM-DD'}),
+            'data_hora': workbook.add_format({'num_format': 'YYYY-MM-DD HH:MM:SS'}),
+            'verde': workbook.add_format({'bg_color': VERDE}),
+            'vermelho': workbook.add_format({'bg_color': VERMELHO}),
+        })
+        self.workbooks.append(workbook)
+        self.arquivos.append(caminho)
+        return len(self.workbooks) - 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *erro):
+        for workbook in self.workbooks:
+            workbook.close()
+
+    def escrever_aba(self, nome, df, colorir_status=False):
+        """Grava o DataFrame numa aba nova (ou em várias, se passar do limite), sem índice
+
+        colorir_status=True pinta a última coluna (Status) de verde quando
+        'OK' e de vermelho quando 'COM DIFERENÇA'. Devolve os nomes das abas
+        gravadas; com divisao='arquivos' a mesma aba se repete nas
+        planilhas numeradas.
+        """
+        if self.divisao == 'arquivos' and len(df) > self.limite_linhas:
+            pedacos = [df.iloc[inicio:inicio + self.limite_linhas] for inicio in range(0, len(df), self.limite_linhas)]
+            for numero, pedaco in enumerate(pedacos):
+                if numero == len(self.workbooks):
+                    self.abrir_workbook()
+                self.gravar_aba(numero, nome, pedaco, colorir_status)
+            return [nome] * len(pedacos)
+
+        partes = dividir_aba(nome, df, self.divisao, self.limite_linhas)
+        for nome_parte, parte in partes:
+            self.gravar_aba(0, nome_parte, parte, colorir_status)
+        return [nome_parte for nome_parte, _ in partes]
+
+    def escrever_arquivo(self, nome, df, formato):
+        """Grava o DataFrame à parte, em Parquet ou CSV (';'), ao lado da planilha; devolve o caminho"""
+        caminho = f'{os.path.splitext(self.caminho)[0]} - {nome}.{formato}'
+        if formato == 'parquet':
+            df.to_parquet(caminho, index=False)
+        else:
+            df.to_csv(caminho, sep=SEPARADOR_CSV, decimal=',', index=False, encoding='utf-8-sig')
+        self.arquivos.append(caminho)
+        return caminho
+
+    def gravar_aba(self, numero, nome, df, colorir_status=False):
+        """Grava uma aba que já cabe no limite na planilha de índice numero"""
+        worksheet = self.workbooks[numero].add_worksheet(nome)
+        formatos_planilha = self.formatos[numero]
+        for coluna, titulo in enumerate(df.columns):
+            worksheet.write_string(0, coluna, str(titulo))
+
+        escritores = {
+            'numero': worksheet.write_number,
+            'texto': worksheet.write_string,
+            'booleano': worksheet.write_boolean,
+            'data': worksheet.write_number,
+            'data_hora': worksheet.write_number,
+        }
+        listas = []
+        escrever = []
+        formatos = []
+        for nome_coluna in df.columns:
+            tipo, valores = preparar_coluna(df[nome_coluna])
+            listas.append(valores)
+            escrever.append(escritores[tipo])
+            formatos.append(formatos_planilha.get(tipo))
+
+        # O modo de memória constante exige gravar linha por linha, em ordem
+        for linha, valores in enumerate(zip(*listas), 1):
+            for coluna, valor in enumerate(valores):
+                if valor is not None:
+                    escrever[coluna](linha, coluna, valor, formatos[coluna])
+
+        if colorir_status and len(df):
+            status_col = len(df.columns) - 1
+            for valor, cor in (('OK', 'verde'), ('COM DIFERENÇA', 'vermelho')):
+                worksheet.conditional_format(1, status_col, len(df), status_col, {
+                    'type': 'cell', 'criteria': '==', 'value': f'"{valor}"', 'format': formatos_planilha[cor],
+                })
+        return worksheet
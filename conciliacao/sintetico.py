@@ -0,0 +1,302 @@
+"""Entradas sintéticas da Operadora e do TOTVS, para testes de volume e medições de desempenho.
+
+    python -m conciliacao.sintetico dados/ --linhas 100000 --operadoras cielo pagseguro --formatos xlsx csv
+
+Para cada operadora grava operadora_<nome>.<formato> com as colunas do
+extrato (Data da venda, Bandeira, Forma de pagamento e Valor bruto, mais NSU
+e Valor líquido, que a leitura ignora) e um único totvs.<formato> com os
+lançamentos de todas elas: linha de título e, na LINHA_CABECALHO_TOTVS, o
+cabeçalho TITULO, DT. EMISSAO, CLIENTE e VALOR, com os códigos de cliente do
+MAPA_CODIGOS. Bandeira e Forma de pagamento vêm escritas como nos extratos
+("Visa Electron", "Maestro", "Crédito à vista", Pix sem bandeira); a Cielo
+traz só a data (dd/mm/aaaa) e o PagSeguro data e hora (aaaa-mm-dd hh:mm:ss).
+Nos CSVs os valores saem com vírgula decimal.
+
+duplicados é a fração das vendas com valor sorteado de VALORES_REPETIDOS, o
+que enche cada (Data, Bandeira, Tipo) de valores iguais; divergencias é a
+fração das vendas que sai diferente no TOTVS (não lançada, lançada com alguns
+centavos de diferença ou no dia seguinte, em partes iguais), e mais um terço
+disso em lançamentos do TOTVS sem venda. A mesma semente gera os mesmos
+arquivos.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+from conciliacao import leitura, normalizacao
+from conciliacao.planilha import LINHAS_POR_ABA, preparar_coluna
+
+FORMATOS = ['xlsx', 'csv', 'parquet']
+
+# Como cada operadora escreve a data da venda
+PERFIS = {
+    'cielo': {'formato_data': '%d/%m/%Y', 'formato_excel': 'DD/MM/YYYY', 'com_hora': False},
+    'pagseguro': {'formato_data': '%Y-%m-%d %H:%M:%S', 'formato_excel': 'YYYY-MM-DD HH:MM:SS', 'com_hora': True},
+}
+
+# Grafias da bandeira e da forma de pagamento nos extratos (ver normalizacao)
+ROTULOS_BANDEIRA = {
+    'VISA': ['Visa', 'VISA'],
+    'MASTERCARD': ['Mastercard', 'Master'],
+    'ELO': ['Elo'],
+    'HIPERCARD': ['Hipercard'],
+    'AMEX': ['Amex'],
+    'PIX': [None],
+}
+ROTULOS_DEBITO = {'VISA': ['Visa Electron'], 'MASTERCARD': ['Maestro']}
+ROTULOS_TIPO = {
+    'credito': ['Crédito', 'Crédito à vista', 'Crédito parcelado'],
+    'debito': ['Débito', 'Débito à vista'],
+    'pix': ['Pix'],
+}
+
+# Parcela das vendas de cada tipo, dividida igualmente entre as bandeiras
+PESOS_TIPO = {'credito': 0.5, 'debito': 0.3, 'pix': 0.2}
+
+# Valores redondos usados nas vendas repetidas, em centavos
+VALORES_REPETIDOS = np.array([500, 1000, 1500, 2000, 2500, 3000, 5000, 10000], dtype=np.int64)
+
+# Vendas fora de VALORES_REPETIDOS: lognormal em torno de R$ 60,00
+MEDIANA_CENTAVOS = 6000
+DISPERSAO = 0.9
+
+TAXA_OPERADORA = 0.025
+ABERTURA, FECHAMENTO = 8 * 3600, 22 * 3600
+
+TITULO_TOTVS = 'Títulos a receber - relatório sintético'
+
+
+def codigos_da_operadora(operadora, mapa=normalizacao.MAPA_CODIGOS):
+    """Códigos de cliente da operadora e a probabilidade de cada um numa venda"""
+    codigos = [codigo for codigo, info in mapa.items() if info['adquirente'] == operadora]
+    if not codigos:
+        raise ValueError(f"Nenhum código de cliente da operadora '{operadora}' no mapa")
+    por_tipo = pd.Series([mapa[codigo]['tipo'] for codigo in codigos]).value_counts()
+    pesos = np.array([PESOS_TIPO.get(mapa[codigo]['tipo'], 0.1) / por_tipo[mapa[codigo]['tipo']] for codigo in codigos])
+    return codigos, pesos / pesos.sum()
+
+
+def sortear_valores(rng, quantidade, duplicados):
+    """Valores em centavos: a fração duplicados vem de VALORES_REPETIDOS, o resto da lognormal"""
+    valores = rng.lognormal(np.log(MEDIANA_CENTAVOS), DISPERSAO, quantidade).clip(100, 500_000).astype(np.int64)
+    repetidos = rng.random(quantidade) < duplicados
+    valores[repetidos] = rng.choice(VALORES_REPETIDOS, repetidos.sum())
+    return valores
+
+
+def rotulos(rng, indices, codigos, mapa):
+    """Bandeira e Forma de pagamento, como o extrato escreve, do código de cada venda"""
+    bandeiras = np.empty(len(indices), dtype=object)
+    tipos = np.empty(len(indices), dtype=object)
+    for i, codigo in enumerate(codigos):
+        linhas = np.flatnonzero(indices == i)
+        bandeira, tipo = mapa[codigo]['bandeira'], mapa[codigo]['tipo']
+        opcoes_bandeira = ROTULOS_BANDEIRA.get(bandeira, [bandeira.title()])
+        if tipo == 'debito':
+            opcoes_bandeira = opcoes_bandeira + ROTULOS_DEBITO.get(bandeira, [])
+        opcoes_tipo = ROTULOS_TIPO.get(tipo, [tipo.title()])
+        bandeiras[linhas] = np.array(opcoes_bandeira, dtype=object)[rng.integers(0, len(opcoes_bandeira), len(linhas))]
+        tipos[linhas] = np.array(opcoes_tipo, dtype=object)[rng.integers(0, len(opcoes_tipo), len(linhas))]
+    return bandeiras, tipos
+
+
+def gerar_operadora(rng, operadora, linhas, inicio, dias, duplicados, mapa=normalizacao.MAPA_CODIGOS):
+    """Extrato sintético da operadora, em ordem de data
+
+    Devolve (extrato com Valor bruto em centavos, lançamentos esperados no
+    TOTVS com Dia, Codigo e Valor).
+    """
+    codigos, pesos = codigos_da_operadora(operadora, mapa)
+    dia = np.sort(rng.integers(0, dias, linhas))
+    segundos = dia.astype(np.int64) * 86400
+    if PERFIS[operadora]['com_hora']:
+        segundos = segundos + rng.integers(ABERTURA, FECHAMENTO, linhas)
+        segundos.sort()
+    datas = np.datetime64(inicio, 's') + segundos.astype('timedelta64[s]')
+    indices = rng.choice(len(codigos), linhas, p=pesos)
+    valores = sortear_valores(rng, linhas, duplicados)
+    bandeiras, tipos = rotulos(rng, indices, codigos, mapa)
+
+    extrato = pd.DataFrame({
+        'Data da venda': datas,
+        'NSU': rng.integers(100_000, 1_000_000, linhas),
+        'Bandeira': bandeiras,
+        'Forma de pagamento': tipos,
+        'Valor bruto': valores,
+        'Valor líquido': np.round(valores * (1 - TAXA_OPERADORA)).astype(np.int64),
+    })
+    lancamentos = pd.DataFrame({
+        'Dia': dia,
+        'Codigo': np.array(codigos)[indices],
+        'Valor': valores,
+    })
+    return extrato, lancamentos
+
+
+def divergir(rng, lancamentos, divergencias, dias, pesos_codigos, duplicados):
+    """Lançamentos do TOTVS a partir dos esperados, com a fração divergencias alterada
+
+    Cada divergência é uma venda não lançada, lançada com 1 a 99 centavos de
+    diferença ou lançada no dia seguinte; mais len * divergencias / 3
+    lançamentos sem venda. pesos_codigos é {código: probabilidade}.
+    """
+    quantidade = len(lancamentos)
+    divergentes = rng.random(quantidade) < divergencias
+    tipo = np.where(divergentes, rng.integers(0, 3, quantidade), -1)
+
+    valor = lancamentos['Valor'].to_numpy().copy()
+    alterados = tipo == 1
+    diferenca = rng.integers(1, 100, alterados.sum()) * rng.choice([-1, 1], alterados.sum())
+    valor[alterados] = np.maximum(valor[alterados] + diferenca, 1)
+    dia = lancamentos['Dia'].to_numpy() + (tipo == 2)
+
+    extras = int(round(quantidade * divergencias / 3))
+    codigos = np.array(list(pesos_codigos))
+    pesos = np.array(list(pesos_codigos.values()))
+    mantidos = tipo != 0
+    totvs = pd.DataFrame({
+        'Dia': np.concatenate([dia[mantidos], rng.integers(0, dias, extras)]),
+        'Codigo': np.concatenate([lancamentos['Codigo'].to_numpy()[mantidos], rng.choice(codigos, extras, p=pesos)]),
+        'Valor': np.concatenate([valor[mantidos], sortear_valores(rng, extras, duplicados)]),
+    })
+    return totvs.sort_values('Dia', kind='stable', ignore_index=True)
+
+
+def gerar(linhas, operadoras=('cielo',), inicio='2024-01-01', dias=30, duplicados=0.3, divergencias=0.02,
+          semente=0, mapa=normalizacao.MAPA_CODIGOS):
+    """Gera os extratos e o TOTVS na memória; devolve ({operadora: extrato}, totvs)
+
+    linhas é o número de vendas de cada operadora. Os valores ficam em
+    centavos e as datas em datetime64; gravar converte para o formato de
+    cada arquivo.
+    """
+    if not 0 <= duplicados <= 1 or not 0 <= divergencias <= 1:
+        raise ValueError("duplicados e divergencias precisam estar entre 0 e 1")
+    rng = np.random.default_rng(semente)
+    extratos, esperados, pesos_codigos = {}, [], {}
+    for operadora in operadoras:
+        extratos[operadora], lancamentos = gerar_operadora(rng, operadora, linhas, inicio, dias, duplicados, mapa)
+        esperados.append(lancamentos)
+        codigos, pesos = codigos_da_operadora(operadora, mapa)
+        for codigo, peso in zip(codigos, pesos):
+            pesos_codigos[codigo] = peso / len(operadoras)
+
+    lancamentos = pd.concat(esperados, ignore_index=True).sort_values('Dia', kind='stable', ignore_index=True)
+    totvs = divergir(rng, lancamentos, divergencias, dias, pesos_codigos, duplicados)
+    totvs = pd.DataFrame({
+        'TITULO': np.arange(1, len(totvs) + 1),
+        'DT. EMISSAO': np.datetime64(inicio, 'D') + totvs['Dia'].to_numpy().astype('timedelta64[D]'),
+        'CLIENTE': totvs['Codigo'].astype(np.int64),
+        'VALOR': totvs['Valor'],
+    })
+    return extratos, totvs
+
+
+def em_reais(df, colunas):
+    """Cópia com as colunas em centavos como float em reais"""
+    return df.assign(**{coluna: df[coluna] / 100 for coluna in colunas})
+
+
+def gravar_xlsx(caminho, df, formato_data, titulo=None):
+    """Grava o DataFrame na primeira aba, com a linha de título opcional acima do cabeçalho"""
+    linha_cabecalho = 0 if titulo is None else leitura.LINHA_CABECALHO_TOTVS
+    if len(df) > LINHAS_POR_ABA - linha_cabecalho:
+        raise ValueError(
+            f"{len(df)} linhas não cabem numa aba do Excel; use o formato csv ou parquet"
+        )
+    workbook = xlsxwriter.Workbook(caminho, {'constant_memory': True})
+    try:
+        worksheet = workbook.add_worksheet()
+        formatos = {
+            'data': workbook.add_format({'num_format': formato_data}),
+            'data_hora': workbook.add_format({'num_format': formato_data}),
+            'numero': None, 'texto': None,
+        }
+        if titulo is not None:
+            worksheet.write_string(0, 0, titulo)
+        for coluna, nome in enumerate(df.columns):
+            worksheet.write_string(linha_cabecalho, coluna, nome)
+
+        listas, formatos_colunas = [], []
+        for nome in df.columns:
+            tipo, valores = preparar_coluna(df[nome])
+            listas.append(valores)
+            formatos_colunas.append(formatos[tipo])
+        for linha, valores in enumerate(zip(*listas), linha_cabecalho + 1):
+            for coluna, valor in enumerate(valores):
+                if valor is not None:
+                    worksheet.write(linha, coluna, valor, formatos_colunas[coluna])
+    finally:
+        workbook.close()
+
+
+def gravar_tabela(caminho, df, formato, formato_data, formato_excel, titulo=None):
+    if formato == 'xlsx':
+        gravar_xlsx(caminho, df, formato_excel, titulo)
+    elif formato == 'parquet':
+        df.to_parquet(caminho, index=False)
+    else:
+        with open(caminho, 'w', encoding=leitura.ENCODINGS_CSV[0], newline='') as arquivo:
+            if titulo is not None:
+                arquivo.write(titulo + '\n')
+            df.to_csv(arquivo, sep=leitura.SEPARADOR_CSV, decimal=',', float_format='%.2f', index=False,
+                      date_format=formato_data)
+
+
+def gravar(pasta, extratos, totvs, formatos=('xlsx',)):
+    """Grava os extratos e o TOTVS de gerar na pasta; devolve a lista de caminhos
+
+    O Parquet não tem linha de título: a leitura só pula o título do TOTVS
+    em Excel e CSV.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    caminhos = []
+    for formato in formatos:
+        for operadora, extrato in extratos.items():
+            perfil = PERFIS[operadora]
+            caminho = os.path.join(pasta, f'operadora_{operadora}.{formato}')
+            gravar_tabela(caminho, em_reais(extrato, ['Valor bruto', 'Valor líquido']), formato,
+                          perfil['formato_data'], perfil['formato_excel'])
+            caminhos.append(caminho)
+        caminho = os.path.join(pasta, f'totvs.{formato}')
+        gravar_tabela(caminho, em_reais(totvs, ['VALOR']), formato, '%d/%m/%Y', 'DD/MM/YYYY',
+                      None if formato == 'parquet' else TITULO_TOTVS)
+        caminhos.append(caminho)
+    return caminhos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m conciliacao.sintetico',
+                                     description="Gera planilhas sintéticas da Operadora e do TOTVS")
+    parser.add_argument('pasta', help="pasta onde os arquivos são gravados")
+    parser.add_argument('--linhas', type=int, default=10_000, help="vendas de cada operadora (padrão: 10000)")
+    parser.add_argument('--operadoras', nargs='+', choices=sorted(PERFIS), default=['cielo'])
+    parser.add_argument('--formatos', nargs='+', choices=FORMATOS, default=['xlsx'])
+    parser.add_argument('--inicio', default='2024-01-01', help="primeiro dia das vendas (aaaa-mm-dd)")
+    parser.add_argument('--dias', type=int, default=30, help="dias de vendas a partir do início (padrão: 30)")
+    parser.add_argument('--duplicados', type=float, default=0.3,
+                        help="fração das vendas com valores redondos repetidos (padrão: 0.3)")
+    parser.add_argument('--divergencias', type=float, default=0.02,
+                        help="fração das vendas que diverge no TOTVS (padrão: 0.02)")
+    parser.add_argument('--semente', type=int, default=0)
+    args = parser.parse_args(argv)
+    if args.linhas < 1 or args.dias < 1:
+        parser.error("--linhas e --dias precisam ser positivos")
+    if not 0 <= args.duplicados <= 1 or not 0 <= args.divergencias <= 1:
+        parser.error("--duplicados e --divergencias precisam estar entre 0 e 1")
+    if 'xlsx' in args.formatos and args.linhas * len(args.operadoras) > LINHAS_POR_ABA - 1:
+        parser.error("o TOTVS não cabe numa aba do Excel; use --formatos csv ou parquet")
+
+    extratos, totvs = gerar(args.linhas, args.operadoras, args.inicio, args.dias, args.duplicados,
+                            args.divergencias, args.semente)
+    for caminho in gravar(args.pasta, extratos, totvs, args.formatos):
+        print(caminho)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
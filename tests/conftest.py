@@ -0,0 +1,89 @@
+"""Entradas sintéticas compartilhadas pelos testes dos motores."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from conciliacao import leitura
+
+DIA = 19723  # 01/01/2024
+BANDEIRAS = ['VISA', 'MASTERCARD', 'ELO']
+TIPOS = ['credito', 'debito']
+
+
+def normalizada(dias, bandeiras, tipos, valores):
+    """DataFrame como sai de leitura.normalizar_*: Data datetime64, categóricas e centavos"""
+    return pd.DataFrame({
+        'Data': pd.to_datetime(np.asarray(dias, dtype=np.int64), unit='D'),
+        'Bandeira': pd.Categorical(bandeiras),
+        'Tipo': pd.Categorical(tipos),
+        'Valor': np.asarray(valores, dtype=np.int64),
+    })
+
+
+def gerar_entradas(linhas=400, dias=5, semente=0):
+    """(TOTVS, Operadora) normalizados, com duplicados, sobras dos dois lados e valores trocados
+
+    Os valores saem de uma faixa curta para repetirem dentro do grupo, que é
+    onde a ordem de pareamento importa.
+    """
+    rng = np.random.default_rng(semente)
+    dias_op = DIA + rng.integers(0, dias, linhas)
+    bandeiras_op = rng.choice(BANDEIRAS, linhas)
+    tipos_op = rng.choice(TIPOS, linhas)
+    valores_op = rng.integers(1, 40, linhas) * 250
+
+    # O TOTVS perde umas vendas, ganha outras e tem alguns valores trocados
+    mantidas = rng.random(linhas) > 0.1
+    valores_totvs = valores_op[mantidas].copy()
+    trocados = rng.random(len(valores_totvs)) < 0.05
+    valores_totvs[trocados] += rng.integers(1, 100, trocados.sum())
+    extras = linhas // 10
+    totvs = normalizada(
+        np.concatenate([dias_op[mantidas], DIA + rng.integers(0, dias, extras)]),
+        np.concatenate([bandeiras_op[mantidas], rng.choice(BANDEIRAS, extras)]),
+        np.concatenate([tipos_op[mantidas], rng.choice(TIPOS, extras)]),
+        np.concatenate([valores_totvs, rng.integers(1, 40, extras) * 250]),
+    )
+    operadora = normalizada(dias_op, bandeiras_op, tipos_op, valores_op)
+    return totvs, operadora
+
+
+def alterar_entradas(totvs, operadora):
+    """Muda um valor de um grupo, tira outro grupo inteiro e acrescenta um dia novo"""
+    totvs = totvs.copy()
+    operadora = operadora.copy()
+    primeira = totvs.iloc[0]
+    mesmo_grupo = (
+        (totvs['Data'] == primeira['Data']) & (totvs['Bandeira'] == primeira['Bandeira'])
+        & (totvs['Tipo'] == primeira['Tipo'])
+    )
+    totvs.loc[mesmo_grupo.idxmax(), 'Valor'] += 1
+
+    def fora_do_grupo(df):
+        return ~((df['Data'] == pd.Timestamp(np.datetime64(DIA + 1, 'D')))
+                 & (df['Bandeira'] == 'ELO') & (df['Tipo'] == 'debito'))
+
+    novo_dia = normalizada([DIA + 30] * 3, ['VISA'] * 3, ['credito'] * 3, [1000, 2000, 3000])
+    totvs = pd.concat([totvs[fora_do_grupo(totvs)], novo_dia.iloc[:2]], ignore_index=True)
+    operadora = pd.concat([operadora[fora_do_grupo(operadora)], novo_dia], ignore_index=True)
+    for df in (totvs, operadora):
+        for coluna in ('Bandeira', 'Tipo'):
+            df[coluna] = df[coluna].astype(str).astype('category')
+    return totvs, operadora
+
+
+def finalizadas(totvs, operadora):
+    """As duas entradas no formato do motor, com as mesmas categorias"""
+    totvs, operadora = leitura.finalizar(totvs.copy()), leitura.finalizar(operadora.copy())
+    leitura.compartilhar_categorias([totvs, operadora])
+    return totvs, operadora
+
+
+@pytest.fixture
+def entradas():
+    return gerar_entradas()
+
+
+@pytest.fixture
+def entradas_alteradas(entradas):
+    return alterar_entradas(*entradas)
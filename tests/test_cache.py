@@ -0,0 +1,69 @@
+"""Gravação do cache quando outro processo grava a mesma chave ao mesmo tempo."""
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from conciliacao import cache, leitura
+
+
+@pytest.fixture
+def outro_processo_publica_antes(monkeypatch):
+    """Faz o os.replace encontrar o destino já gravado, como quando outro processo termina primeiro"""
+    replace = os.replace
+
+    def concorrente(origem, destino):
+        if not os.path.exists(destino):
+            shutil.copytree(origem, destino)
+        replace(origem, destino)
+
+    monkeypatch.setattr(os, 'replace', concorrente)
+
+
+def entrada():
+    return pd.DataFrame({
+        'Data': pd.to_datetime(['2024-01-01', '2024-01-02']),
+        'Bandeira': pd.Categorical(['VISA', 'ELO']),
+        'Tipo': pd.Categorical(['credito', 'debito']),
+        'Valor': [1000, 2500],
+    })
+
+
+def test_salvar_a_mesma_chave_duas_vezes(tmp_path):
+    cache.salvar('chave', entrada(), 'hash', pasta=tmp_path)
+    aberto = cache.carregar('chave', pasta=tmp_path)
+    cache.salvar('chave', entrada(), 'hash', pasta=tmp_path)
+    assert aberto['Valor'].tolist() == [1000, 2500]
+    assert cache.carregar('chave', pasta=tmp_path)['Valor'].tolist() == [1000, 2500]
+    assert os.listdir(tmp_path) == ['chave']
+
+
+def test_salvar_com_outro_processo_publicando_antes(tmp_path, outro_processo_publica_antes):
+    cache.salvar('chave', entrada(), 'hash', pasta=tmp_path)
+    assert cache.carregar('chave', pasta=tmp_path)['Valor'].tolist() == [1000, 2500]
+    assert os.listdir(tmp_path) == ['chave']
+
+
+def test_salvar_resultado_com_outro_processo_publicando_antes(tmp_path, outro_processo_publica_antes):
+    planilha = tmp_path / 'resultado.xlsx'
+    planilha.write_bytes(b'planilha')
+    pasta = tmp_path / 'resultados'
+    cache.salvar_resultado('chave', str(planilha), {'a_mais': 1}, ['hash'], pasta=pasta)
+    assert os.listdir(pasta) == ['chave']
+    copia = tmp_path / 'copia.xlsx'
+    assert cache.carregar_resultado('chave', str(copia), pasta=pasta)['a_mais'] == 1
+    assert copia.read_bytes() == b'planilha'
+
+
+def test_falha_ao_gravar_o_cache_nao_falha_a_leitura(tmp_path, monkeypatch):
+    arquivo = tmp_path / 'entrada.csv'
+    arquivo.write_text('qualquer conteúdo', encoding='utf-8')
+
+    def sem_espaco(*args, **kwargs):
+        raise OSError(28, 'No space left on device')
+
+    monkeypatch.setattr(cache, 'carregar', lambda chave: None)
+    monkeypatch.setattr(cache, 'salvar', sem_espaco)
+    df = leitura.ler_com_cache(str(arquivo), {}, True, entrada)
+    assert df['Valor'].tolist() == [1000, 2500]
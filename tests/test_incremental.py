@@ -0,0 +1,40 @@
+"""Comparação incremental contra a comparação inteira do motor."""
+import pandas as pd
+import pytest
+
+from conciliacao import calendario, incremental, motor
+from conftest import finalizadas
+
+
+def com_datas_formatadas(detalhe):
+    return detalhe.assign(Data=calendario.formatar_dias(detalhe['Data']))
+
+
+def conferir(base, totvs, operadora, layout):
+    """Roda o incremental sobre a base e confere detalhe e resumo com o motor; devolve o aviso"""
+    avisos = {}
+    detalhe = incremental.comparacao_detalhada(
+        base, 'teste', totvs, operadora, layout, avisar=lambda etapa, **dados: avisos.update(dados)
+    )
+    esperado = motor.gerar_comparacao_detalhada(totvs, operadora, layout)
+    pd.testing.assert_frame_equal(detalhe, esperado)
+    pd.testing.assert_frame_equal(
+        motor.gerar_resumo(totvs, operadora, com_datas_formatadas(detalhe), layout),
+        motor.gerar_resumo(totvs, operadora, com_datas_formatadas(esperado), layout),
+    )
+    return avisos
+
+
+@pytest.mark.parametrize('layout', [motor.LAYOUT_CIELO, motor.LAYOUT_PAGSEGURO], ids=['cielo', 'pagseguro'])
+def test_incremental_igual_ao_motor(tmp_path, entradas, entradas_alteradas, layout):
+    base = tmp_path / 'base.sqlite'
+    totvs, operadora = finalizadas(*entradas)
+    grupos = len(incremental.hashes_dos_grupos(totvs, operadora)[0])
+
+    assert conferir(base, totvs, operadora, layout) == {'recomparados': grupos, 'reaproveitados': 0}
+    assert conferir(base, totvs, operadora, layout) == {'recomparados': 0, 'reaproveitados': grupos}
+
+    # Um grupo com valor trocado, um grupo que some e um dia novo: recomparam
+    # só o trocado e o novo, e o que sumiu sai da base
+    totvs, operadora = finalizadas(*entradas_alteradas)
+    assert conferir(base, totvs, operadora, layout) == {'recomparados': 2, 'reaproveitados': grupos - 2}
@@ -0,0 +1,43 @@
+"""Processamento em lote com vários processos gravando o mesmo cache."""
+import os
+import shutil
+import subprocess
+import sys
+
+from conciliacao import sintetico
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def rodar_lote(manifesto, pasta_cache, processos):
+    env = dict(os.environ, COMPARADOR_CACHE=str(pasta_cache), PYTHONPATH=RAIZ)
+    return subprocess.run(
+        [sys.executable, '-m', 'conciliacao.lote', '--manifesto', str(manifesto), '--processos', str(processos),
+         '--entradas', 'omitir'],
+        env=env, capture_output=True, text=True, timeout=300
+    )
+
+
+def test_lojas_com_as_mesmas_entradas_e_cache_frio(tmp_path):
+    # Várias lojas com o mesmo extrato e o mesmo TOTVS: os processos gravam
+    # a mesma chave do cache de entradas e do de resultados ao mesmo tempo
+    extratos, totvs = sintetico.gerar(5000)
+    sintetico.gravar(tmp_path, extratos, totvs, ['csv'])
+    trabalhos = 6
+    manifesto = tmp_path / 'lojas.csv'
+    manifesto.write_text(
+        'operadora;totvs;saida\n'
+        + ''.join(f'operadora_cielo.csv;totvs.csv;loja{numero}.xlsx\n' for numero in range(trabalhos)),
+        encoding='utf-8'
+    )
+    pasta_cache = tmp_path / 'cache'
+
+    # Cache todo frio e, depois, só o de resultados frio
+    for _ in range(2):
+        execucao = rodar_lote(manifesto, pasta_cache, processos=2)
+        assert execucao.returncode == 0, execucao.stdout + execucao.stderr
+        assert f'{trabalhos} ok, 0 com erro' in execucao.stdout
+        for numero in range(trabalhos):
+            assert (tmp_path / f'loja{numero}.xlsx').stat().st_size > 0
+        assert not [nome for nome in os.listdir(pasta_cache) if nome.startswith('.tmp-')]
+        shutil.rmtree(pasta_cache / 'resultados')
@@ -0,0 +1,180 @@
+"""Passadas de pareamento sobre as sobras da comparação detalhada."""
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from conciliacao import motor
+
+DIA = 19723  # 01/01/2024
+
+
+def detalhe(linhas, layout=motor.LAYOUT_CIELO):
+    """Detalhe como o motor monta, a partir de (dia, bandeira, tipo, a_mais, centavos)"""
+    dias, bandeiras, tipos, a_mais, valores = zip(*linhas)
+    return motor.montar_detalhe(
+        pd.array(dias, dtype='Int32'),
+        np.array(bandeiras, dtype=object),
+        np.array(tipos, dtype=object),
+        np.array(a_mais, dtype=bool),
+        np.array(valores, dtype=np.int64),
+        layout
+    )
+
+
+def test_aproximados_sem_tolerancia_nem_janela_nao_pareia():
+    df = detalhe([(DIA, 'VISA', 'credito', True, 1001), (DIA, 'VISA', 'credito', False, 1000)])
+    restante, pares = motor.parear_aproximados(df)
+    assert len(restante) == 2
+    assert pares.empty
+
+
+def test_aproximados_pareia_dentro_da_tolerancia():
+    df = detalhe([
+        (DIA, 'VISA', 'credito', True, 1001),
+        (DIA, 'VISA', 'credito', False, 1000),
+        (DIA, 'ELO', 'debito', True, 2003),
+        (DIA, 'ELO', 'debito', False, 2000),
+    ])
+    restante, pares = motor.parear_aproximados(df, tolerancia_centavos=2)
+    assert pares[['Bandeira', 'Valor_Sistema', 'Valor_Operadora', 'Diferença_Valor']].values.tolist() == [
+        ['VISA', 1001, 1000, 1]
+    ]
+    assert restante['Bandeira'].tolist() == ['ELO', 'ELO']
+
+
+def test_aproximados_pareia_dentro_da_janela_de_dias():
+    df = detalhe([
+        (DIA + 1, 'VISA', 'credito', True, 1000),
+        (DIA, 'VISA', 'credito', False, 1000),
+        (DIA + 3, 'VISA', 'debito', True, 500),
+        (DIA, 'VISA', 'debito', False, 500),
+    ])
+    restante, pares = motor.parear_aproximados(df, janela_dias=1)
+    assert len(pares) == 1
+    assert pares.loc[0, 'Data_Sistema'] == DIA + 1
+    assert pares.loc[0, 'Data_Operadora'] == DIA
+    assert pares.loc[0, 'Diferença_Dias'] == 1
+    assert restante['Tipo'].tolist() == ['debito', 'debito']
+
+
+def test_aproximados_nao_pareia_bandeiras_diferentes():
+    df = detalhe([(DIA, 'VISA', 'credito', True, 1000), (DIA, 'ELO', 'credito', False, 1000)])
+    restante, pares = motor.parear_aproximados(df, tolerancia_centavos=5, janela_dias=2)
+    assert pares.empty
+    assert len(restante) == 2
+
+
+def test_aproximados_nao_reusa_linhas():
+    # Dois lançamentos disputam a mesma venda: fica o mais próximo, o outro
+    # sobra; no empate de distância vence a venda de valor maior
+    df = detalhe([
+        (DIA, 'VISA', 'credito', True, 1001),
+        (DIA, 'VISA', 'credito', True, 1000),
+        (DIA, 'VISA', 'credito', False, 1000),
+        (DIA, 'MASTERCARD', 'credito', True, 3000),
+        (DIA, 'MASTERCARD', 'credito', False, 3001),
+        (DIA, 'MASTERCARD', 'credito', False, 2999),
+    ])
+    restante, pares = motor.parear_aproximados(df, tolerancia_centavos=1, janela_dias=1)
+    assert len(pares) == 2
+    assert pares.loc[pares['Bandeira'] == 'VISA', 'Valor_Sistema'].tolist() == [1000]
+    assert sorted(restante['Valor_Sistema'] + restante['Valor_Operadora']) == [1001, 2999]
+    assert len(restante) + 2 * len(pares) == len(df)
+
+
+def menor_subconjunto_forca_bruta(valores, alvo):
+    """Quantidade de itens do menor subconjunto (2 ou mais) que soma alvo, ou None"""
+    for tamanho in range(2, len(valores) + 1):
+        for posicoes in itertools.combinations(range(len(valores)), tamanho):
+            if sum(valores[i] for i in posicoes) == alvo:
+                return tamanho
+    return None
+
+
+def conferir_subconjunto(valores, alvo):
+    valores = np.array(valores, dtype=np.int64)
+    escolhidas = motor.subconjunto_com_soma(valores, alvo)
+    esperado = menor_subconjunto_forca_bruta(list(valores), alvo)
+    if esperado is None:
+        assert escolhidas is None
+    else:
+        assert escolhidas is not None
+        assert len(set(escolhidas)) == len(escolhidas) == esperado
+        assert valores[escolhidas].sum() == alvo
+
+
+def test_subconjunto_com_valor_igual_ao_alvo():
+    # O 16 sozinho não serve (1 item), mas 13 + 3 sim
+    conferir_subconjunto([1, 24, 13, 3, 16], 16)
+    conferir_subconjunto([16, 13, 3, 1, 24], 16)
+
+
+def test_subconjunto_com_zeros():
+    conferir_subconjunto([0, 5], 5)
+    conferir_subconjunto([5, 0, 7], 5)
+    conferir_subconjunto([0, 0, 3], 0)
+
+
+def test_subconjunto_igual_a_forca_bruta():
+    rng = np.random.default_rng(0)
+    for _ in range(3000):
+        valores = rng.integers(0, 30, rng.integers(2, 11)).tolist()
+        conferir_subconjunto(valores, int(rng.integers(0, 60)))
+
+
+def test_somas_pareia_duas_e_tres_vendas():
+    df = detalhe([
+        (DIA, 'VISA', 'credito', True, 3000),
+        (DIA, 'VISA', 'credito', False, 1000),
+        (DIA, 'VISA', 'credito', False, 2000),
+        (DIA, 'ELO', 'debito', True, 4500),
+        (DIA, 'ELO', 'debito', False, 1000),
+        (DIA, 'ELO', 'debito', False, 700),
+        (DIA, 'ELO', 'debito', False, 1500),
+        (DIA, 'ELO', 'debito', False, 2000),
+    ])
+    restante, somas, pulados = motor.parear_somas(df)
+    assert pulados == 0
+    assert somas[['Bandeira', 'Soma', 'Lado', 'Valor_Sistema', 'Valor_Operadora']].values.tolist() == [
+        ['VISA', 'Soma 1', 'Sistema', 3000, 0],
+        ['VISA', 'Soma 1', 'Operadora', 0, 1000],
+        ['VISA', 'Soma 1', 'Operadora', 0, 2000],
+        ['ELO', 'Soma 2', 'Sistema', 4500, 0],
+        ['ELO', 'Soma 2', 'Operadora', 0, 1000],
+        ['ELO', 'Soma 2', 'Operadora', 0, 1500],
+        ['ELO', 'Soma 2', 'Operadora', 0, 2000],
+    ]
+    assert (somas['Data'] == DIA).all()
+    assert restante['Valor_Operadora'].tolist() == [700]
+
+
+def test_somas_pula_grupo_acima_de_max_itens():
+    df = detalhe([
+        (DIA, 'VISA', 'credito', True, 3000),
+        (DIA, 'VISA', 'credito', False, 1000),
+        (DIA, 'VISA', 'credito', False, 2000),
+        (DIA, 'VISA', 'credito', False, 500),
+        (DIA, 'ELO', 'credito', True, 300),
+        (DIA, 'ELO', 'credito', False, 100),
+        (DIA, 'ELO', 'credito', False, 200),
+    ])
+    restante, somas, pulados = motor.parear_somas(df, max_itens=2)
+    assert pulados == 1
+    assert somas['Bandeira'].unique().tolist() == ['ELO']
+    assert restante['Bandeira'].tolist() == ['VISA'] * 4
+
+
+def test_somas_sem_tempo_pula_tudo():
+    df = detalhe([
+        (DIA, 'VISA', 'credito', True, 3000),
+        (DIA, 'VISA', 'credito', False, 1000),
+        (DIA, 'VISA', 'credito', False, 2000),
+        (DIA + 1, 'VISA', 'credito', True, 300),
+        (DIA + 1, 'VISA', 'credito', False, 100),
+        (DIA + 1, 'VISA', 'credito', False, 200),
+    ])
+    restante, somas, pulados = motor.parear_somas(df, tempo_limite=0)
+    assert pulados == 2
+    assert somas.empty
+    assert len(restante) == len(df)
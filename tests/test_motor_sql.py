@@ -0,0 +1,45 @@
+"""Motor em DuckDB contra o motor em pandas."""
+import pandas as pd
+import pytest
+
+from conciliacao import calendario, motor
+from conftest import finalizadas
+
+pytest.importorskip('duckdb')
+
+from conciliacao import motor_sql  # noqa: E402
+
+
+def com_datas_formatadas(detalhe):
+    return detalhe.assign(Data=calendario.formatar_dias(detalhe['Data']))
+
+
+def conferir(pasta, totvs, operadora, layout):
+    """Confere detalhe, resumo e comparação resumida do DuckDB com os do motor"""
+    df_totvs, df_operadora = finalizadas(totvs, operadora)
+    esperado = motor.gerar_comparacao_detalhada(df_totvs, df_operadora, layout)
+    with motor_sql.ComparacaoSQL(pasta) as banco:
+        # Em dois blocos, como na leitura: a posição continua de um bloco para o outro
+        metade = len(totvs) // 2
+        banco.carregar('totvs', [totvs.iloc[:metade], totvs.iloc[metade:]])
+        banco.carregar('operadora', [operadora])
+        detalhe = banco.comparacao_detalhada(layout)
+        pd.testing.assert_frame_equal(detalhe, esperado)
+        pd.testing.assert_frame_equal(
+            banco.resumo(com_datas_formatadas(detalhe), layout),
+            motor.gerar_resumo(df_totvs, df_operadora, com_datas_formatadas(esperado), layout),
+        )
+        pd.testing.assert_frame_equal(
+            banco.comparacao_resumida(), motor.gerar_comparacao_resumida(df_totvs, df_operadora)
+        )
+        pd.testing.assert_frame_equal(banco.entrada('totvs'), df_totvs, check_categorical=False)
+
+
+@pytest.mark.parametrize('layout', [motor.LAYOUT_CIELO, motor.LAYOUT_PAGSEGURO], ids=['cielo', 'pagseguro'])
+def test_duckdb_igual_ao_motor(tmp_path, entradas, layout):
+    conferir(tmp_path, *entradas, layout)
+
+
+@pytest.mark.parametrize('layout', [motor.LAYOUT_CIELO, motor.LAYOUT_PAGSEGURO], ids=['cielo', 'pagseguro'])
+def test_duckdb_igual_ao_motor_com_grupo_alterado_e_removido(tmp_path, entradas_alteradas, layout):
+    conferir(tmp_path, *entradas_alteradas, layout)